@@ -0,0 +1,69 @@
+"""
+Fake yt-dlp, ffmpeg and ffprobe executables. They understand just enough of
+the command lines the handlers build: `--version`/`-version` probes, `-J`
+metadata, `-o -` (stream to stdout) and `-o PATH` / a trailing output path.
+Latency, output size and failure rate come from the environment so a
+benchmark can tune them per run.
+"""
+import os
+import stat
+import sys
+
+FAKE_YTDLP = '''#!{python}
+import json, os, random, sys, time
+
+args = sys.argv[1:]
+if "--version" in args:
+    print("2099.01.01-fake")
+    sys.exit(0)
+size = int(os.environ.get("FAKE_YTDLP_SIZE", str(2 * 1024 * 1024)))
+if "-J" in args:
+    time.sleep(float(os.environ.get("FAKE_YTDLP_PROBE_LATENCY", "0.2")))
+    print(json.dumps({"id": "fake", "duration": 30, "formats": [
+        {"format_id": "fake", "ext": "mp4", "height": 720, "filesize": size},
+    ]}))
+    sys.exit(0)
+time.sleep(float(os.environ.get("FAKE_YTDLP_LATENCY", "0.5")))
+if random.random() < float(os.environ.get("FAKE_YTDLP_FAIL_RATE", "0")):
+    print("ERROR: fake failure", file=sys.stderr)
+    sys.exit(1)
+output = args[args.index("-o") + 1] if "-o" in args else "-"
+out = sys.stdout.buffer if output == "-" else open(output, "wb")
+chunk = b"\\0" * 65536
+while size > 0:
+    out.write(chunk[:size])
+    size -= len(chunk)
+out.flush()
+'''
+
+FAKE_FFMPEG = '''#!{python}
+import os, sys, time
+
+args = sys.argv[1:]
+if "-version" in args:
+    print("ffmpeg version 99.0-fake")
+    sys.exit(0)
+time.sleep(float(os.environ.get("FAKE_FFMPEG_LATENCY", "1.0")))
+with open(args[-1], "wb") as out:
+    out.write(b"\\0" * int(os.environ.get("FAKE_FFMPEG_SIZE", str(1024 * 1024))))
+'''
+
+FAKE_FFPROBE = '''#!{python}
+import os, sys
+
+if "-version" in sys.argv[1:]:
+    print("ffprobe version 99.0-fake")
+    sys.exit(0)
+print(os.environ.get("FAKE_FFPROBE_DURATION", "30.0"))
+'''
+
+
+def install_fakes(bin_dir: str) -> str:
+    """Write fake yt-dlp, ffmpeg and ffprobe into `bin_dir`; returns a PATH with it first."""
+    os.makedirs(bin_dir, exist_ok=True)
+    for name, source in (("yt-dlp", FAKE_YTDLP), ("ffmpeg", FAKE_FFMPEG), ("ffprobe", FAKE_FFPROBE)):
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(source.replace("{python}", sys.executable))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return bin_dir + os.pathsep + os.environ.get("PATH", "")
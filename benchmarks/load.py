@@ -0,0 +1,216 @@
+"""
+End-to-end load benchmark. Pushes synthetic Telegram updates through
+main.handler against local stub upstreams and a fake yt-dlp/ffmpeg, then
+reports throughput, latency percentiles and peak RSS. No network needed.
+
+    python benchmarks/load.py --updates 200 --rate 20
+    python benchmarks/load.py --mix tiktok=3,instagram=1 --json > run.json
+
+An update's latency runs from the moment it is handed to main.handler to
+the moment the Telegram stub receives the deleteMessage call that ends a
+successful delivery. Updates without that call are counted as failed.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import StubConfig, serve  # noqa: E402
+from fakes import install_fakes  # noqa: E402
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+BOT_TOKEN = "123456:bench"
+
+URL_TEMPLATES = {
+    "tiktok": "https://www.tiktok.com/@bench/video/{n}",
+    "instagram": "https://www.instagram.com/reel/bench{n}/",
+    "twitter": "https://x.com/bench/status/{n}",
+    "facebook": "https://www.facebook.com/reel/{n}",
+}
+
+
+def parse_mix(value: str) -> list[tuple[str, int]]:
+    mix = []
+    for item in value.split(","):
+        platform, _, weight = item.partition("=")
+        if platform.strip() not in URL_TEMPLATES:
+            raise argparse.ArgumentTypeError(f"unknown platform {platform!r}")
+        mix.append((platform.strip(), int(weight or 1)))
+    return mix
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def make_update(n: int, chat_id: int, user_id: int, text: str, bot):
+    from telegram import Update
+
+    return Update.de_json({
+        "update_id": n,
+        "message": {
+            "message_id": n,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "group", "title": f"chat {chat_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "text": text,
+        },
+    }, bot)
+
+
+async def push_updates(args, bot, main) -> dict[str, float]:
+    """Feed updates to main.handler at the configured rate; returns start time per chat:message."""
+    platforms = [platform for platform, weight in args.mix for _ in range(weight)]
+    started = {}
+    interval = 1 / args.rate if args.rate else 0
+    t0 = time.monotonic()
+    for n in range(1, args.updates + 1):
+        if interval:
+            delay = t0 + (n - 1) * interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        platform = platforms[n % len(platforms)]
+        # A fraction of links repeat an earlier one, exercising the file_id cache and single-flight
+        video = n if n <= 1 or (n % 100) >= args.repeat_percent else 1
+        chat_id = -1000 - (n % args.chats)
+        update = make_update(n, chat_id, 1 + n % (args.chats * 3), URL_TEMPLATES[platform].format(n=video), bot)
+        started[f"{chat_id}:{n}"] = time.monotonic()
+        await main.handler(update, None)
+    return started
+
+
+async def run(args, urls: dict[str, str]) -> dict:
+    sys.path.insert(0, SRC_DIR)
+    import main
+    from telegram.ext import ApplicationBuilder
+
+    app = ApplicationBuilder().token(BOT_TOKEN).base_url(f"{urls['telegram']}/bot").build()
+    bot = app.bot
+    await bot.initialize()
+
+    wall_start = time.monotonic()
+    started = await push_updates(args, bot, main)
+    await main.scheduler.join()
+    wall = time.monotonic() - wall_start
+    self_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    from http_client import get_session
+    session = await get_session()
+    async with session.get(f"{urls['telegram']}/_bench/results") as resp:
+        stub = await resp.json()
+    await main.on_shutdown(None)
+    await bot.shutdown()
+
+    latencies = [stub["completions"][key] - t for key, t in started.items() if key in stub["completions"]]
+    return {
+        "updates": args.updates,
+        "delivered": len(latencies),
+        "failed": args.updates - len(latencies),
+        "wall_seconds": round(wall, 3),
+        "throughput_per_second": round(len(latencies) / wall, 2) if wall else None,
+        "latency_seconds": {
+            name: (round(value, 4) if value is not None else None)
+            for name, value in (
+                ("p50", percentile(latencies, 50)),
+                ("p95", percentile(latencies, 95)),
+                ("p99", percentile(latencies, 99)),
+                ("max", max(latencies) if latencies else None),
+            )
+        },
+        "uploads": stub["send_video"],
+        "uploaded_bytes": stub["uploaded_bytes"],
+        "peak_rss_kb": self_rss_kb,
+    }
+
+
+def print_report(report: dict) -> None:
+    latency = report["latency_seconds"]
+    print(f"updates:     {report['updates']} ({report['delivered']} delivered, {report['failed']} failed)")
+    print(f"wall time:   {report['wall_seconds']:.2f}s")
+    print(f"throughput:  {report['throughput_per_second']} updates/s")
+    print("latency:     " + "  ".join(
+        f"{name}={value:.3f}s" if value is not None else f"{name}=n/a" for name, value in latency.items()
+    ))
+    print(f"uploads:     {report['uploads']} ({report['uploaded_bytes'] / 1024 ** 2:.1f} MiB)")
+    print(f"peak RSS:    {report['peak_rss_kb'] / 1024:.1f} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=100, help="number of updates to push")
+    parser.add_argument("--rate", type=float, default=0, help="updates per second, 0 pushes them all at once")
+    parser.add_argument("--chats", type=int, default=10, help="number of distinct chats")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("tiktok=1,instagram=1,twitter=1,facebook=1"),
+                        help="platform weights, e.g. tiktok=3,instagram=1")
+    parser.add_argument("--repeat-percent", type=int, default=0, help="percent of links that repeat an earlier one")
+    parser.add_argument("--video-size", type=int, default=2 * 1024 * 1024, help="bytes served per video")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="tikwm/ReelSaver API latency")
+    parser.add_argument("--api-fail-rate", type=float, default=0.0, help="fraction of API calls that fail")
+    parser.add_argument("--cdn-latency", type=float, default=0.05, help="CDN time to first byte")
+    parser.add_argument("--upload-latency", type=float, default=0.1, help="extra sendVideo latency")
+    parser.add_argument("--ytdlp-latency", type=float, default=0.5, help="fake yt-dlp run time")
+    parser.add_argument("--ytdlp-fail-rate", type=float, default=0.0, help="fraction of fake yt-dlp runs that fail")
+    parser.add_argument("--ffmpeg-latency", type=float, default=1.0, help="fake ffmpeg run time")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        api_latency=args.api_latency,
+        api_fail_rate=args.api_fail_rate,
+        cdn_latency=args.cdn_latency,
+        video_size=args.video_size,
+        upload_latency=args.upload_latency,
+    )
+    # Stubs run in their own process so they don't count towards the bot's RSS or CPU
+    ctx = multiprocessing.get_context("spawn")
+    ready_recv, ready_send = ctx.Pipe(duplex=False)
+    stop_recv, stop_send = ctx.Pipe(duplex=False)
+    stubs = ctx.Process(target=serve, args=(config, ready_send, stop_recv), daemon=True)
+    stubs.start()
+    urls = ready_recv.recv()
+
+    with tempfile.TemporaryDirectory(prefix="bench-") as work_dir:
+        os.environ.update({
+            "TELEGRAM_TOKEN": BOT_TOKEN,
+            "PATH": install_fakes(os.path.join(work_dir, "bin")),
+            "TIKWM_API": f"{urls['tikwm']}/api/",
+            "REELSAVER_API": f"{urls['reelsaver']}/api/video",
+            "HTTP_WARMUP_URLS": "",
+            "INSTAGRAM_USE_DD_LINK": "0",
+            "METRICS_PORT": "0",
+            # Real yt-dlp extractors would go to the network; use the fake CLI instead
+            "YTDLP_POOL_WORKERS": "0",
+            "FILE_ID_CACHE_PATH": os.path.join(work_dir, "file_id_cache.sqlite3"),
+            "MEDIA_CACHE_DIR": os.path.join(work_dir, "media_cache"),
+            "CAPABILITY_CACHE_PATH": os.path.join(work_dir, "capabilities.json"),
+            "FAKE_YTDLP_LATENCY": str(args.ytdlp_latency),
+            "FAKE_YTDLP_FAIL_RATE": str(args.ytdlp_fail_rate),
+            "FAKE_YTDLP_SIZE": str(args.video_size),
+            "FAKE_FFMPEG_LATENCY": str(args.ffmpeg_latency),
+            "TMPDIR": work_dir,
+        })
+        os.environ.setdefault("SCHEDULER_MAX_QUEUE", str(max(args.updates, 100)))
+        try:
+            report = asyncio.run(run(args, urls))
+        finally:
+            stop_send.send(True)
+            stubs.join(timeout=5)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Local stand-ins for the upstreams the bot talks to: tikwm, the ReelSaver API,
+the media CDNs and the Telegram Bot API. Each runs on its own port so
+per-host connection limits behave like they do against the real services.
+"""
+import time
+import random
+import asyncio
+from dataclasses import dataclass
+from aiohttp import web
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class StubConfig:
+    api_latency: float = 0.05
+    api_fail_rate: float = 0.0
+    cdn_latency: float = 0.05
+    video_size: int = 2 * 1024 * 1024
+    upload_latency: float = 0.1
+
+
+def make_tikwm_app(config: StubConfig, cdn_url: str) -> web.Application:
+    async def api(request: web.Request) -> web.Response:
+        await asyncio.sleep(config.api_latency)
+        if random.random() < config.api_fail_rate:
+            return web.json_response({"code": -1, "msg": "Url parsing is failed!"})
+        video_id = request.query.get("url", "").rstrip("/").rsplit("/", 1)[-1]
+        return web.json_response({"code": 0, "data": {"play": f"{cdn_url}/video/tiktok-{video_id}.mp4"}})
+
+    app = web.Application()
+    app.router.add_get("/api/", api)
+    return app
+
+
+def make_reelsaver_app(config: StubConfig, cdn_url: str) -> web.Application:
+    async def api(request: web.Request) -> web.Response:
+        await asyncio.sleep(config.api_latency)
+        if random.random() < config.api_fail_rate:
+            return web.json_response({"status": "error", "message": "Could not fetch post"})
+        video_id = request.query.get("postUrl", "").rstrip("/").rsplit("/", 1)[-1]
+        return web.json_response({"status": "success", "data": {"videoUrl": f"{cdn_url}/video/ig-{video_id}.mp4"}})
+
+    app = web.Application()
+    app.router.add_get("/api/video", api)
+    return app
+
+
+def make_cdn_app(config: StubConfig) -> web.Application:
+    payload = b"\0" * CHUNK_SIZE
+
+    async def video(request: web.Request) -> web.StreamResponse:
+        await asyncio.sleep(config.cdn_latency)
+        resp = web.StreamResponse(headers={"Content-Type": "video/mp4"})
+        resp.content_length = config.video_size
+        await resp.prepare(request)
+        remaining = config.video_size
+        while remaining > 0:
+            chunk = payload[:min(CHUNK_SIZE, remaining)]
+            await resp.write(chunk)
+            remaining -= len(chunk)
+        await resp.write_eof()
+        return resp
+
+    app = web.Application()
+    app.router.add_get("/video/{name}", video)
+    return app
+
+
+def make_telegram_app(config: StubConfig) -> web.Application:
+    """
+    Bot API stub. Uploads are read in full, like the real server would.
+    deleteMessage is the last call of a successful delivery, so its
+    arrival time per (chat_id, message_id) is recorded as the completion time.
+    """
+    completions: dict[str, float] = {}
+    counters = {"uploaded_bytes": 0, "send_video": 0, "message_id": 1_000_000}
+
+    def message(chat_id, **extra) -> dict:
+        counters["message_id"] += 1
+        return {
+            "message_id": counters["message_id"],
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "group", "title": "bench"},
+            **extra,
+        }
+
+    async def method(request: web.Request) -> web.Response:
+        name = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = {}
+            post = await request.post()
+            for key, value in post.items():
+                if isinstance(value, web.FileField):
+                    counters["uploaded_bytes"] += len(value.file.read())
+                else:
+                    params[key] = value
+
+        if name == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif name == "sendVideo":
+            await asyncio.sleep(config.upload_latency)
+            counters["send_video"] += 1
+            video_id = f"file-{counters['send_video']}"
+            result = message(params["chat_id"], video={
+                "file_id": video_id, "file_unique_id": video_id, "width": 480, "height": 854, "duration": 10,
+            })
+        elif name == "sendMessage":
+            result = message(params["chat_id"], text=params.get("text", ""))
+        elif name == "deleteMessage":
+            completions[f"{params['chat_id']}:{params['message_id']}"] = time.monotonic()
+            result = True
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def results(request: web.Request) -> web.Response:
+        return web.json_response({"completions": completions, **counters})
+
+    app = web.Application(client_max_size=1024 ** 3)
+    app.router.add_post("/bot{token}/{method}", method)
+    app.router.add_get("/_bench/results", results)
+    return app
+
+
+async def _serve(config: StubConfig, ready, stop) -> None:
+    runners = []
+
+    async def start(app: web.Application) -> str:
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        runners.append(runner)
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    cdn = await start(make_cdn_app(config))
+    urls = {
+        "cdn": cdn,
+        "tikwm": await start(make_tikwm_app(config, cdn)),
+        "reelsaver": await start(make_reelsaver_app(config, cdn)),
+        "telegram": await start(make_telegram_app(config)),
+    }
+    ready.send(urls)
+    await asyncio.get_running_loop().run_in_executor(None, stop.recv)
+    for runner in runners:
+        await runner.cleanup()
+
+
+def serve(config: StubConfig, ready, stop) -> None:
+    """Process entry point: send the base URLs through `ready`, run until `stop` receives."""
+    asyncio.run(_serve(config, ready, stop))
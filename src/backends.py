@@ -0,0 +1,178 @@
+import os
+import time
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable
+from metrics import backend_attempt_seconds, download_bytes
+
+logger = logging.getLogger(__name__)
+
+BACKEND_STATS_WINDOW = int(os.getenv("BACKEND_STATS_WINDOW", "20"))
+BACKEND_FAILURE_THRESHOLD = int(os.getenv("BACKEND_FAILURE_THRESHOLD", "3"))
+BACKEND_COOLDOWN = float(os.getenv("BACKEND_COOLDOWN", "300"))
+
+# Prior for backends with little history: a backend declared at position i is
+# assumed to cost PRIOR_COST * (i + 1) seconds per success, weighted as
+# PRIOR_WEIGHT observations. Keeps the declared order until there is evidence.
+PRIOR_COST = 5.0
+PRIOR_WEIGHT = 2
+
+
+class BackendStats:
+    """Rolling success/latency statistics and circuit breaker for one backend."""
+
+    def __init__(self, window: int = BACKEND_STATS_WINDOW, failure_threshold: int = BACKEND_FAILURE_THRESHOLD,
+                 cooldown: float = BACKEND_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.results: deque[tuple[bool, float]] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._probing = False
+
+    @property
+    def success_rate(self) -> float | None:
+        if not self.results:
+            return None
+        return sum(1 for ok, _ in self.results if ok) / len(self.results)
+
+    @property
+    def avg_latency(self) -> float | None:
+        if not self.results:
+            return None
+        return sum(latency for _, latency in self.results) / len(self.results)
+
+    def cost(self, prior: float) -> float:
+        """Expected seconds spent per successful download, smoothed towards `prior`."""
+        spent = sum(latency for _, latency in self.results)
+        successes = sum(1 for ok, _ in self.results if ok)
+        return (spent + prior * PRIOR_WEIGHT) / (successes + PRIOR_WEIGHT)
+
+    def is_open(self, now: float) -> bool:
+        return self.consecutive_failures >= self.failure_threshold and (now < self.open_until or self._probing)
+
+    def available(self, now: float) -> bool:
+        """Whether `acquire` would let a call through right now, without taking the probe."""
+        if self.consecutive_failures < self.failure_threshold:
+            return True
+        return now >= self.open_until and not self._probing
+
+    def acquire(self, now: float) -> bool:
+        """Whether a call may go through; after the cooldown one probe call is let through."""
+        if not self.available(now):
+            return False
+        if self.consecutive_failures >= self.failure_threshold:
+            self._probing = True
+        return True
+
+    def release(self) -> None:
+        """Give up a probe without an outcome (the call was cancelled)."""
+        self._probing = False
+
+    def record(self, ok: bool, latency: float, now: float) -> None:
+        self.results.append((ok, latency))
+        self._probing = False
+        if ok:
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = now + self.cooldown
+
+
+class BackendRegistry:
+    """
+    Per-platform download backend statistics. Orders backends by expected cost
+    and skips backends whose circuit breaker is open.
+    """
+
+    def __init__(self, window: int = BACKEND_STATS_WINDOW, failure_threshold: int = BACKEND_FAILURE_THRESHOLD,
+                 cooldown: float = BACKEND_COOLDOWN, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self._stats: dict[tuple[str, str], BackendStats] = {}
+
+    def stats(self, platform: str, name: str) -> BackendStats:
+        key = (platform, name)
+        if key not in self._stats:
+            self._stats[key] = BackendStats(self.window, self.failure_threshold, self.cooldown)
+        return self._stats[key]
+
+    def clear(self) -> None:
+        """Forget all statistics and close every circuit."""
+        self._stats.clear()
+
+    def snapshot(self) -> dict[tuple[str, str], BackendStats]:
+        return dict(self._stats)
+
+    def arrange(self, platform: str, strategies: list) -> list:
+        """
+        Return `strategies` ((name, fn) pairs, in declared preference order)
+        sorted by expected cost, without those whose circuit is open. Each fn is
+        wrapped so its outcome and latency are recorded; a half-open backend's
+        probe is only taken when its fn actually starts, so strategies that
+        never run (another one won first) don't hold it. If every circuit is
+        open the declared order is kept, so a global outage still gets retried.
+        """
+        now = self.clock()
+        ranked = []
+        for index, (name, fn) in enumerate(strategies):
+            stats = self.stats(platform, name)
+            ranked.append((stats.cost(PRIOR_COST * (index + 1)), index, name, fn, stats))
+        ranked.sort(key=lambda item: (item[0], item[1]))
+
+        allowed = [item for item in ranked if item[4].available(now)]
+        forced = not allowed
+        if forced:
+            logger.warning("All %s backends are failing, trying them anyway", platform)
+            allowed = sorted(ranked, key=lambda item: item[1])
+        else:
+            skipped = [item[2] for item in ranked if item not in allowed]
+            if skipped:
+                logger.info("Skipping %s backends with open circuit: %s", platform, ", ".join(skipped))
+        return [(name, self._recorded(platform, name, stats, fn, acquire=not forced))
+                for _, _, name, fn, stats in allowed]
+
+    async def call(self, platform: str, name: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run a single backend call through its circuit breaker; returns None if the circuit is open."""
+        stats = self.stats(platform, name)
+        if not stats.acquire(self.clock()):
+            logger.info("Skipping %s backend %s: circuit open", platform, name)
+            return None
+        return await self._recorded(platform, name, stats, fn, acquire=False)()
+
+    def _recorded(self, platform: str, name: str, stats: BackendStats,
+                  fn: Callable[[], Awaitable[Any]], acquire: bool = True) -> Callable[[], Awaitable[Any]]:
+        async def run():
+            # The circuit may have opened, or another call taken the probe, since arrange()
+            if acquire and not stats.acquire(self.clock()):
+                logger.info("Skipping %s backend %s: circuit open", platform, name)
+                return None
+            start = self.clock()
+            try:
+                result = await fn()
+            except Exception:
+                latency = self.clock() - start
+                stats.record(False, latency, self.clock())
+                backend_attempt_seconds.observe(latency, platform=platform, backend=name, outcome="error")
+                raise
+            except BaseException:
+                # Cancelled (e.g. lost a hedged race): says nothing about backend health
+                stats.release()
+                backend_attempt_seconds.observe(self.clock() - start, platform=platform, backend=name,
+                                                outcome="cancelled")
+                raise
+            latency = self.clock() - start
+            stats.record(bool(result), latency, self.clock())
+            backend_attempt_seconds.observe(latency, platform=platform, backend=name,
+                                            outcome="success" if result else "failure")
+            size = getattr(result, "size", None)
+            if result and isinstance(size, int):
+                download_bytes.observe(size, platform=platform, backend=name)
+            return result
+        return run
+
+
+backend_registry = BackendRegistry()
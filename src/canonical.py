@@ -0,0 +1,181 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from urllib.parse import urlsplit, urlunsplit, parse_qs, urljoin
+
+from http_client import get_session, request_timeout
+
+logger = logging.getLogger(__name__)
+
+# Seconds a resolved short link (vm.tiktok.com, fb.watch, ...) is trusted
+SHORT_LINK_TTL = float(os.getenv("SHORT_LINK_TTL", str(24 * 3600)))
+SHORT_LINK_MAX_ENTRIES = int(os.getenv("SHORT_LINK_MAX_ENTRIES", "10000"))
+SHORT_LINK_TIMEOUT = 10
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a media URL for use as a cache key (host case, query, fragment, trailing slash)."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, "", ""))
+
+
+@dataclass(frozen=True)
+class CanonicalMedia:
+    platform: str
+    media_id: str
+    url: str
+
+    @property
+    def key(self) -> str:
+        """Stable identifier for caches and de-duplication, e.g. "instagram:C7xYz"."""
+        return f"{self.platform}:{self.media_id}"
+
+
+def _host(parts) -> str:
+    return parts.netloc.lower().split(":")[0].removeprefix("www.").removeprefix("m.").removeprefix("mobile.")
+
+
+def _tiktok(parts) -> CanonicalMedia | None:
+    match = re.match(r"/(?:@[^/]+/(?:video|photo)|v)/(\d+)", parts.path)
+    if not match:
+        return None
+    video_id = match.group(1)
+    # The @user part doesn't matter to TikTok; any handle resolves the video
+    return CanonicalMedia("tiktok", video_id, f"https://www.tiktok.com/@/video/{video_id}")
+
+
+def _instagram(parts) -> CanonicalMedia | None:
+    # /p/, /reel/, /reels/ and /tv/ are the same post; query strings (igsh, utm_*) are share tracking
+    match = re.match(r"/(?:[^/]+/)?(?:p|reels?|tv)/([A-Za-z0-9_-]+)", parts.path)
+    if not match or parts.path.startswith("/share/"):
+        return None
+    shortcode = match.group(1)
+    return CanonicalMedia("instagram", shortcode, f"https://www.instagram.com/p/{shortcode}/")
+
+
+def _twitter(parts) -> CanonicalMedia | None:
+    match = re.match(r"/(?:[^/]+|i/web)/status(?:es)?/(\d+)", parts.path)
+    if not match:
+        return None
+    tweet_id = match.group(1)
+    return CanonicalMedia("twitter", tweet_id, f"https://x.com/i/status/{tweet_id}")
+
+
+def _facebook(parts) -> CanonicalMedia | None:
+    match = re.match(r"/(?:reel|watch|[^/]+/videos)/(\d+)", parts.path)
+    video_id = match.group(1) if match else parse_qs(parts.query).get("v", [None])[0]
+    if not video_id or not video_id.isdigit():
+        return None
+    return CanonicalMedia("facebook", video_id, f"https://www.facebook.com/reel/{video_id}")
+
+
+CANONICALIZERS = {
+    "tiktok.com": _tiktok,
+    "instagram.com": _instagram,
+    "x.com": _twitter,
+    "twitter.com": _twitter,
+    "facebook.com": _facebook,
+}
+
+
+def is_short_link(url: str) -> bool:
+    """Links that only redirect to the real post and carry no media ID themselves."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().split(":")[0]
+    return (
+        host in ("vm.tiktok.com", "vt.tiktok.com", "fb.watch")
+        or (_host(parts) == "tiktok.com" and parts.path.startswith("/t/"))
+        or (_host(parts) == "instagram.com" and parts.path.startswith("/share/"))
+    )
+
+
+def canonicalize(url: str) -> CanonicalMedia | None:
+    """Platform, media ID and canonical URL of `url`, without any network access; None if unknown."""
+    parts = urlsplit(url.strip())
+    canonicalizer = CANONICALIZERS.get(_host(parts))
+    return canonicalizer(parts) if canonicalizer else None
+
+
+class ShortLinkResolver:
+    """
+    Resolves short links to the URL they redirect to with a single HEAD
+    request (redirects are not followed further). Results are cached for
+    `ttl` seconds and concurrent lookups of one link share the request.
+    """
+
+    def __init__(self, ttl: float = SHORT_LINK_TTL, max_entries: int = SHORT_LINK_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._cache: dict[str, tuple[float, str]] = {}
+        self._pending: dict[str, asyncio.Task] = {}
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def cached(self, url: str) -> str | None:
+        key = canonical_url(url)
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= self.clock():
+            del self._cache[key]
+            return None
+        return entry[1]
+
+    async def resolve(self, url: str) -> str | None:
+        """Where `url` redirects to, or None if it couldn't be resolved."""
+        resolved = self.cached(url)
+        if resolved is not None:
+            return resolved
+        key = canonical_url(url)
+        if key not in self._pending:
+            task = asyncio.ensure_future(self._head(url))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        resolved = await asyncio.shield(self._pending[key])
+        if resolved is not None:
+            if len(self._cache) >= self.max_entries:
+                # Dicts keep insertion order: drop the oldest resolution
+                self._cache.pop(next(iter(self._cache)))
+            self._cache[key] = (self.clock() + self.ttl, resolved)
+        return resolved
+
+    async def _head(self, url: str) -> str | None:
+        try:
+            session = await get_session()
+            async with session.head(url, allow_redirects=False, timeout=request_timeout(SHORT_LINK_TIMEOUT)) as resp:
+                location = resp.headers.get("Location")
+        except Exception as e:
+            logger.debug("Could not resolve short link %s: %s", url, e)
+            return None
+        if not location:
+            logger.debug("Short link %s did not redirect", url)
+            return None
+        return urljoin(url, location)
+
+
+short_links = ShortLinkResolver()
+
+
+def media_key(url: str) -> str:
+    """
+    Cache and de-duplication key for `url`: "platform:media_id" when the
+    platform is known, the canonical URL otherwise. Short links use their
+    cached resolution; call `resolve_media_key` first to fill it in.
+    """
+    target = short_links.cached(url) if is_short_link(url) else url
+    media = canonicalize(target or url)
+    return media.key if media else canonical_url(target or url)
+
+
+async def resolve_media_key(url: str) -> str:
+    """`media_key` after resolving `url` if it is a short link."""
+    if is_short_link(url):
+        await short_links.resolve(url)
+    return media_key(url)
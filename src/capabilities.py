@@ -0,0 +1,125 @@
+import os
+import json
+import shutil
+import asyncio
+import logging
+from downloader import executor
+
+logger = logging.getLogger(__name__)
+
+CAPABILITY_CACHE_PATH = os.getenv("CAPABILITY_CACHE_PATH", "capabilities.json")
+PROBE_TIMEOUT = 15
+
+# Binary -> arguments that make it print its version and exit 0
+PROBES = {
+    "yt-dlp": ["--version"],
+    "ffmpeg": ["-version"],
+    "ffprobe": ["-version"],
+}
+
+
+class Capabilities:
+    """
+    Availability of external tools, probed asynchronously. Results are kept
+    in a small JSON file keyed by the binary's resolved path and mtime, so a
+    restart with the same binaries doesn't run the probes again.
+    """
+
+    def __init__(self, path: str = CAPABILITY_CACHE_PATH, probes: dict[str, list[str]] | None = None):
+        self.path = path
+        self.probes = PROBES if probes is None else probes
+        self._results: dict[str, bool] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._disk: dict | None = None
+
+    def clear(self) -> None:
+        """Forget probe results; the cache file at `path` is read again on next use."""
+        self._results.clear()
+        self._tasks.clear()
+        self._disk = None
+
+    @staticmethod
+    def _fingerprint(binary: str) -> str | None:
+        path = shutil.which(binary)
+        if path is None:
+            return None
+        path = os.path.realpath(path)
+        return f"{path}:{os.stat(path).st_mtime_ns}"
+
+    def _load(self) -> dict:
+        if self._disk is None:
+            try:
+                with open(self.path) as f:
+                    self._disk = json.load(f)
+            except (OSError, ValueError):
+                self._disk = {}
+        return self._disk
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self._disk, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.debug("Could not write capability cache %s: %s", self.path, e)
+
+    def cached(self, binary: str) -> bool | None:
+        """Known availability of `binary` without running anything; None if it needs a probe."""
+        if binary in self._results:
+            return self._results[binary]
+        fingerprint = self._fingerprint(binary)
+        if fingerprint is None:
+            self._results[binary] = False
+            return False
+        entry = self._load().get(binary)
+        if entry and entry.get("fingerprint") == fingerprint:
+            self._results[binary] = entry["available"]
+            return entry["available"]
+        return None
+
+    async def available(self, binary: str) -> bool:
+        """Availability of `binary`, probing it (once, shared by concurrent callers) if needed."""
+        result = self.cached(binary)
+        if result is not None:
+            return result
+        if binary not in self._tasks:
+            self._tasks[binary] = asyncio.ensure_future(self._probe(binary))
+        return await asyncio.shield(self._tasks[binary])
+
+    async def _probe(self, binary: str) -> bool:
+        fingerprint = self._fingerprint(binary)
+        try:
+            process = await executor.spawn(
+                [binary, *self.probes.get(binary, ["--version"])],
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                ok = await asyncio.wait_for(process.wait(), PROBE_TIMEOUT) == 0
+            except asyncio.TimeoutError:
+                await executor._kill(process)
+                ok = False
+        except OSError as e:
+            logger.warning("%s is not available: %s", binary, e)
+            ok = False
+        logger.info("%s is %savailable", binary, "" if ok else "not ")
+        self._results[binary] = ok
+        if fingerprint is not None:
+            self._load()[binary] = {"fingerprint": fingerprint, "available": ok}
+            self._save()
+        return ok
+
+    def start(self) -> None:
+        """Probe every known binary in the background."""
+        for binary in self.probes:
+            if self.cached(binary) is None and binary not in self._tasks:
+                self._tasks[binary] = asyncio.ensure_future(self._probe(binary))
+
+    async def close(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+
+capabilities = Capabilities()
@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+
+logger = logging.getLogger(__name__)
+
+# Chats kept in memory; the least recently active chat is evicted beyond this.
+# An entry is a few hundred bytes, so the default stays around a few MiB.
+CHAT_STATE_MAX_CHATS = int(os.getenv("CHAT_STATE_MAX_CHATS", "10000"))
+# Chats idle for longer than this (seconds) are forgotten
+CHAT_STATE_TTL = float(os.getenv("CHAT_STATE_TTL", str(7 * 24 * 3600)))
+# Snapshot file; *.sqlite3/*.sqlite/*.db is written as SQLite, anything else as JSON. Empty disables.
+CHAT_STATE_SNAPSHOT_PATH = os.getenv("CHAT_STATE_SNAPSHOT_PATH", "")
+CHAT_STATE_SNAPSHOT_INTERVAL = float(os.getenv("CHAT_STATE_SNAPSHOT_INTERVAL", "60"))
+
+SQLITE_SUFFIXES = (".sqlite3", ".sqlite", ".db")
+
+
+@dataclass
+class ChatState:
+    last_user: int
+    streak: int
+    updated_at: float
+
+
+class ChatStateStore:
+    """
+    Per-chat posting streaks for randomize_status. Bounded by LRU and TTL
+    eviction, and optionally snapshotted to disk every
+    `snapshot_interval` seconds so streaks survive a restart.
+    """
+
+    def __init__(self, max_chats: int = CHAT_STATE_MAX_CHATS, ttl: float = CHAT_STATE_TTL,
+                 snapshot_path: str = CHAT_STATE_SNAPSHOT_PATH,
+                 snapshot_interval: float = CHAT_STATE_SNAPSHOT_INTERVAL, clock=time.time):
+        self.max_chats = max_chats
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.clock = clock
+        self._states: OrderedDict[int, ChatState] = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._dirty = False
+        self._snapshot_task = None
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, chat_id: int) -> ChatState | None:
+        state = self._states.get(chat_id)
+        if state is not None and self.clock() - state.updated_at > self.ttl:
+            del self._states[chat_id]
+            return None
+        return state
+
+    async def record_message(self, chat_id: int, user_id: int) -> int:
+        """Count a message from `user_id` in `chat_id`; returns the user's current streak."""
+        async with self._lock:
+            now = self.clock()
+            state = self.get(chat_id)
+            if state is None:
+                state = ChatState(last_user=user_id, streak=0, updated_at=now)
+                self._states[chat_id] = state
+            if state.last_user == user_id:
+                state.streak += 1
+            else:
+                state.last_user = user_id
+                state.streak = 1
+            state.updated_at = now
+            self._states.move_to_end(chat_id)
+            while len(self._states) > self.max_chats:
+                self._states.popitem(last=False)
+            self._dirty = True
+            return state.streak
+
+    def _expire(self) -> None:
+        cutoff = self.clock() - self.ttl
+        # Oldest first: stop at the first chat that is still fresh
+        while self._states:
+            chat_id, state = next(iter(self._states.items()))
+            if state.updated_at >= cutoff:
+                break
+            del self._states[chat_id]
+
+    @property
+    def _uses_sqlite(self) -> bool:
+        return self.snapshot_path.endswith(SQLITE_SUFFIXES)
+
+    def load(self) -> None:
+        """Restore a snapshot written by `snapshot`, skipping expired chats."""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            rows = self._read_sqlite() if self._uses_sqlite else self._read_json()
+        except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+            logger.warning("Could not load chat state snapshot %s: %s", self.snapshot_path, e)
+            return
+        cutoff = self.clock() - self.ttl
+        rows = sorted((row for row in rows if row[3] >= cutoff), key=lambda row: row[3])
+        self._states = OrderedDict(
+            (int(chat_id), ChatState(int(last_user), int(streak), float(updated_at)))
+            for chat_id, last_user, streak, updated_at in rows[-self.max_chats:]
+        )
+        logger.info("Restored streaks for %d chats", len(self._states))
+
+    def _read_json(self) -> list[tuple]:
+        with open(self.snapshot_path) as f:
+            data = json.load(f)
+        return [(chat_id, s["last_user"], s["streak"], s["updated_at"]) for chat_id, s in data.items()]
+
+    def _read_sqlite(self) -> list[tuple]:
+        conn = sqlite3.connect(self.snapshot_path)
+        try:
+            return conn.execute("SELECT chat_id, last_user, streak, updated_at FROM chat_states").fetchall()
+        finally:
+            conn.close()
+
+    async def snapshot(self) -> None:
+        """Write the current states to `snapshot_path` (in a thread, so the loop isn't blocked)."""
+        if not self.snapshot_path:
+            return
+        async with self._lock:
+            if not self._dirty:
+                return
+            self._expire()
+            states = {chat_id: asdict(state) for chat_id, state in self._states.items()}
+            self._dirty = False
+        write = self._write_sqlite if self._uses_sqlite else self._write_json
+        try:
+            await asyncio.to_thread(write, states)
+        except (OSError, sqlite3.Error) as e:
+            self._dirty = True
+            logger.warning("Could not write chat state snapshot %s: %s", self.snapshot_path, e)
+
+    def _write_json(self, states: dict) -> None:
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(states, f)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _write_sqlite(self, states: dict) -> None:
+        conn = sqlite3.connect(self.snapshot_path)
+        try:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS chat_states ("
+                    "chat_id INTEGER PRIMARY KEY, last_user INTEGER, streak INTEGER, updated_at REAL)"
+                )
+                conn.execute("DELETE FROM chat_states")
+                conn.executemany(
+                    "INSERT INTO chat_states VALUES (?, ?, ?, ?)",
+                    [(chat_id, s["last_user"], s["streak"], s["updated_at"]) for chat_id, s in states.items()],
+                )
+        finally:
+            conn.close()
+
+    async def _snapshot_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await self.snapshot()
+
+    def start(self) -> None:
+        """Load the last snapshot and start periodic snapshots."""
+        if not self.snapshot_path:
+            return
+        self.load()
+        self._snapshot_task = asyncio.ensure_future(self._snapshot_periodically())
+
+    async def close(self) -> None:
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            self._snapshot_task = None
+        await self.snapshot()
+
+
+chat_states = ChatStateStore()
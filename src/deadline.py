@@ -0,0 +1,69 @@
+import os
+import time
+import asyncio
+import contextvars
+
+# Seconds an update may take end to end (queueing, downloads, transcoding, upload); 0 disables
+UPDATE_DEADLINE = float(os.getenv("UPDATE_DEADLINE", "240"))
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    pass
+
+
+class Deadline:
+    """
+    The latency budget of one update. It is created when the update arrives
+    and made current for the job that serves it, so every subprocess, HTTP
+    request and upload started on its behalf caps its timeout with `budget()`.
+    """
+
+    def __init__(self, seconds: float = UPDATE_DEADLINE, clock=time.monotonic):
+        self.clock = clock
+        self.expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self.clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def clamp(self, timeout: float | None) -> float:
+        """`timeout` shortened to what is left of the budget; raises DeadlineExceeded once it is spent."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("update deadline exceeded")
+        return remaining if timeout is None else min(timeout, remaining)
+
+    async def run(self, coro):
+        """Await `coro` with this deadline current, cancelling it when the budget runs out."""
+        token = _current.set(self)
+        try:
+            return await asyncio.wait_for(coro, self.remaining())
+        except asyncio.TimeoutError as e:
+            if isinstance(e, DeadlineExceeded) or not self.expired:
+                raise
+            raise DeadlineExceeded("update deadline exceeded") from e
+        finally:
+            _current.reset(token)
+
+
+# Tasks copy the context they are created in, so hedged strategies and
+# single-flight tasks started by a job see its deadline too
+_current: contextvars.ContextVar[Deadline | None] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Deadline | None:
+    return _current.get()
+
+
+def budget(timeout: float | None) -> float | None:
+    """`timeout` capped by the current update's deadline, unchanged outside of one."""
+    deadline = _current.get()
+    return timeout if deadline is None else deadline.clamp(timeout)
+
+
+def new_deadline() -> Deadline | None:
+    """A deadline for an incoming update, or None when UPDATE_DEADLINE is 0."""
+    return Deadline(UPDATE_DEADLINE) if UPDATE_DEADLINE > 0 else None
@@ -0,0 +1,260 @@
+import os
+import signal
+import asyncio
+import logging
+import resource
+import subprocess
+from dataclasses import dataclass
+from deadline import budget
+from metrics import subprocess_cpu_seconds, subprocess_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "4"))
+DEFAULT_DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "120"))
+# Address space (RLIMIT_AS, bytes) and CPU seconds (RLIMIT_CPU) per child; 0 means unlimited
+SUBPROCESS_MAX_MEMORY = int(os.getenv("SUBPROCESS_MAX_MEMORY", str(4 * 1024 ** 3)))
+SUBPROCESS_MAX_CPU = int(os.getenv("SUBPROCESS_MAX_CPU", "600"))
+# Children run at this niceness so the bot's event loop keeps priority
+SUBPROCESS_NICE = int(os.getenv("SUBPROCESS_NICE", "10"))
+
+# SIGXCPU at the soft CPU limit, SIGKILL this many seconds later
+CPU_KILL_GRACE = 5
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    # CPU seconds and peak RSS in bytes of the child and the descendants it waited for
+    cpu_seconds: float | None = None
+    max_rss: int | None = None
+
+
+def resource_limiter(max_memory: int, max_cpu: int, nice: int):
+    """preexec_fn applying the limits in the child, or None if there is nothing to apply."""
+    if not (max_memory or max_cpu or nice):
+        return None
+    limits = []
+    # Never ask for more than the current hard limit; that would fail in the child
+    for name, soft, hard in ((resource.RLIMIT_AS, max_memory, max_memory),
+                             (resource.RLIMIT_CPU, max_cpu, max_cpu + CPU_KILL_GRACE)):
+        if not soft:
+            continue
+        current = resource.getrlimit(name)[1]
+        if current != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current), min(hard, current)
+        limits.append((name, (soft, hard)))
+
+    def apply() -> None:
+        # Runs between fork and exec: no imports, no locks
+        if nice:
+            os.nice(nice)
+        for name, values in limits:
+            resource.setrlimit(name, values)
+
+    return apply
+
+
+async def _wait4(pid: int) -> tuple[int, int, resource.struct_rusage]:
+    """Reap `pid` without blocking the loop, returning its status and resource usage."""
+    try:
+        pidfd = os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        # No pidfd (old kernel or not Linux): block a worker thread instead
+        return await asyncio.to_thread(os.wait4, pid, 0)
+    loop = asyncio.get_running_loop()
+    exited = loop.create_future()
+    loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await exited
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+    return os.wait4(pid, 0)
+
+
+class SupervisedProcess:
+    """
+    A child started by DownloadExecutor.spawn, with the `pid`, `stdout`,
+    `stderr`, `returncode`, `wait()` and `kill()` of an asyncio Process.
+    The supervisor reaps it itself with wait4, which is what provides its
+    CPU time and peak memory in `rusage`.
+    """
+
+    def __init__(self, popen: subprocess.Popen):
+        self.pid = popen.pid
+        self.stdout: asyncio.StreamReader | None = None
+        self.stderr: asyncio.StreamReader | None = None
+        self.returncode: int | None = None
+        self.rusage: resource.struct_rusage | None = None
+        self._popen = popen
+        self._transports: list[asyncio.ReadTransport] = []
+        self._waiter: asyncio.Future | None = None
+
+    async def _connect_pipes(self) -> None:
+        self.stdout = await self._connect(self._popen.stdout)
+        self.stderr = await self._connect(self._popen.stderr)
+
+    async def _connect(self, pipe) -> asyncio.StreamReader | None:
+        if pipe is None:
+            return None
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(loop=loop)
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader, loop=loop), pipe)
+        self._transports.append(transport)
+        return reader
+
+    async def wait(self) -> int:
+        if self._waiter is None:
+            self._waiter = asyncio.ensure_future(self._reap())
+        # A cancelled caller must not cancel the reaping itself
+        return await asyncio.shield(self._waiter)
+
+    async def _reap(self) -> int:
+        _, status, self.rusage = await _wait4(self.pid)
+        self.returncode = os.waitstatus_to_exitcode(status)
+        # Popen must not try to wait for a pid that no longer belongs to it
+        self._popen.returncode = self.returncode
+        return self.returncode
+
+    def kill(self) -> None:
+        """SIGKILL the child's whole process group, including anything it started."""
+        if self.returncode is not None:
+            return
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def close(self) -> None:
+        """Close the pipes, including ones left unread after a kill."""
+        for transport in self._transports:
+            transport.close()
+
+    @property
+    def cpu_seconds(self) -> float | None:
+        return None if self.rusage is None else self.rusage.ru_utime + self.rusage.ru_stime
+
+    @property
+    def max_rss(self) -> int | None:
+        # ru_maxrss is in kilobytes on Linux
+        return None if self.rusage is None else self.rusage.ru_maxrss * 1024
+
+
+class DownloadExecutor:
+    """
+    Supervises external download tools (yt-dlp, ffmpeg) run as subprocesses.
+    At most `max_concurrent` children run at once; the rest wait for a slot
+    without blocking the event loop. Each child starts in its own process
+    group with address-space and CPU limits and a lower priority, so a runaway
+    encode can't take the bot down with it; on timeout or cancellation the
+    whole group (including e.g. ffmpeg started by yt-dlp) is killed.
+    """
+
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_DOWNLOADS,
+                 default_timeout: float = DEFAULT_DOWNLOAD_TIMEOUT, max_memory: int = SUBPROCESS_MAX_MEMORY,
+                 max_cpu: int = SUBPROCESS_MAX_CPU, nice: int = SUBPROCESS_NICE):
+        self.max_concurrent = max_concurrent
+        self.default_timeout = default_timeout
+        self.max_memory = max_memory
+        self.max_cpu = max_cpu
+        self.nice = nice
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def spawn(self, cmd: list[str], stdout=subprocess.PIPE, stderr=subprocess.PIPE) -> SupervisedProcess:
+        """Start `cmd` in a new process group with this executor's resource limits (no slot is taken)."""
+        process = SupervisedProcess(subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=stderr,
+            start_new_session=True,
+            preexec_fn=resource_limiter(self.max_memory, self.max_cpu, self.nice),
+        ))
+        try:
+            await process._connect_pipes()
+        except BaseException:
+            await self._kill(process)
+            process.close()
+            raise
+        return process
+
+    async def run(self, cmd: list[str], timeout: float | None = None, stdout=None) -> ProcessResult:
+        """
+        Run `cmd` and return its exit code, captured output and resource usage.
+        If `stdout` is given (e.g. a MediaBuffer), the child's stdout is streamed
+        into it chunk by chunk instead of being collected in memory.
+        Raises asyncio.TimeoutError if the job exceeds `timeout` seconds or the
+        current update's deadline, whichever comes first.
+        The child's process group is killed and reaped on timeout, on
+        cancellation and on any other error (e.g. from the `stdout` sink).
+        """
+        async with self._semaphore:
+            # Time spent waiting for a slot counts against the update's deadline
+            timeout = budget(self.default_timeout if timeout is None else timeout)
+            process = await self.spawn(cmd)
+            outcome = "killed"
+            try:
+                if stdout is None:
+                    out, err = await asyncio.wait_for(self._communicate(process), timeout)
+                else:
+                    out, err = await asyncio.wait_for(self._stream(process, stdout), timeout)
+                outcome = "success" if process.returncode == 0 else "error"
+            except asyncio.TimeoutError:
+                logger.warning("%s timed out after %ss, killing process group %s", cmd[0], timeout, process.pid)
+                await self._kill(process)
+                raise
+            except asyncio.CancelledError:
+                logger.debug("%s cancelled, killing process group %s", cmd[0], process.pid)
+                await self._kill(process)
+                raise
+            except BaseException as e:
+                # E.g. the stdout sink failed (disk full): nobody reads the child any more
+                logger.warning("%s failed (%s), killing process group %s", cmd[0], e, process.pid)
+                await self._kill(process)
+                raise
+            finally:
+                process.close()
+                self._report(cmd[0], process, outcome)
+            return ProcessResult(process.returncode, out or b"", err or b"", process.cpu_seconds, process.max_rss)
+
+    async def _communicate(self, process: SupervisedProcess) -> tuple[bytes, bytes]:
+        out, err = await asyncio.gather(process.stdout.read(), process.stderr.read())
+        await process.wait()
+        return out, err
+
+    async def _stream(self, process: SupervisedProcess, sink) -> tuple[bytes, bytes]:
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+        try:
+            await sink.read_from(process.stdout)
+            err = await stderr_task
+        finally:
+            stderr_task.cancel()
+        await process.wait()
+        return b"", err
+
+    @staticmethod
+    def _report(tool: str, process: SupervisedProcess, outcome: str) -> None:
+        if process.rusage is None:
+            return
+        tool = os.path.basename(tool)
+        subprocess_cpu_seconds.observe(process.cpu_seconds, tool=tool, outcome=outcome)
+        subprocess_rss_bytes.observe(process.max_rss, tool=tool)
+        logger.debug("%s (pid %s) %s: %.2fs CPU, %.1f MiB peak RSS", tool, process.pid, outcome,
+                     process.cpu_seconds, process.max_rss / 1024 ** 2)
+
+    async def _kill(self, process: SupervisedProcess) -> None:
+        if process.returncode is not None:
+            return
+        process.kill()
+        await process.wait()
+
+
+executor = DownloadExecutor()
+
+
+async def run_ytdlp(args: list[str], timeout: float | None = None, stdout=None) -> ProcessResult:
+    """Run yt-dlp with `args` on the shared executor."""
+    return await executor.run(["yt-dlp", *args], timeout=timeout, stdout=stdout)
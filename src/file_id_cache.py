@@ -0,0 +1,111 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+
+from canonical import media_key
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_CACHE_PATH = os.getenv("FILE_ID_CACHE_PATH", "file_id_cache.sqlite3")
+FILE_ID_CACHE_TTL = float(os.getenv("FILE_ID_CACHE_TTL", str(30 * 24 * 3600)))
+FILE_ID_CACHE_MAX_ENTRIES = int(os.getenv("FILE_ID_CACHE_MAX_ENTRIES", "10000"))
+
+
+class FileIdCache:
+    """
+    Persistent map from media key (see canonical.media_key) to the Telegram file_id returned by
+    the first send_video, so repeated links can be re-sent without downloading.
+    Entries expire after `ttl` seconds; the least recently used entries are
+    evicted once more than `max_entries` are stored.
+    """
+
+    def __init__(self, path: str = FILE_ID_CACHE_PATH, ttl: float = FILE_ID_CACHE_TTL,
+                 max_entries: int = FILE_ID_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn = None
+        # Lookups and stores run in worker threads; one connection, one transaction at a time
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_ids ("
+                "url TEXT PRIMARY KEY, file_id TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS file_ids_last_used ON file_ids (last_used)")
+            self._conn.commit()
+        return self._conn
+
+    async def get(self, url: str) -> str | None:
+        try:
+            # Each hit commits its last-use time; keep that write off the event loop
+            return await asyncio.to_thread(self._get, media_key(url))
+        except sqlite3.Error as e:
+            logger.warning("file_id cache lookup failed: %s", e)
+            return None
+
+    def _get(self, key: str) -> str | None:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT file_id, created_at FROM file_ids WHERE url = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            file_id, created_at = row
+            now = time.time()
+            if now - created_at > self.ttl:
+                conn.execute("DELETE FROM file_ids WHERE url = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE file_ids SET last_used = ? WHERE url = ?", (now, key))
+            conn.commit()
+            return file_id
+
+    async def set(self, url: str, file_id: str) -> None:
+        try:
+            await asyncio.to_thread(self._set, media_key(url), file_id)
+        except sqlite3.Error as e:
+            logger.warning("file_id cache store failed: %s", e)
+
+    def _set(self, key: str, file_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO file_ids (url, file_id, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, file_id, now, now),
+            )
+            conn.execute(
+                "DELETE FROM file_ids WHERE url IN ("
+                "SELECT url FROM file_ids ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    async def delete(self, url: str) -> None:
+        try:
+            await asyncio.to_thread(self._delete, media_key(url))
+        except sqlite3.Error as e:
+            logger.warning("file_id cache delete failed: %s", e)
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM file_ids WHERE url = ?", (key,))
+            conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+file_id_cache = FileIdCache()
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+from downloader import run_ytdlp
+from ytdlp_pool import ytdlp_pool
+from transcoder import MAX_UPLOAD_SIZE
+from deadline import DeadlineExceeded, current_deadline
+
+logger = logging.getLogger(__name__)
+
+# Probe formats before downloading, 1 or 0; with 0 handlers use their fixed selectors
+FORMAT_PROBE = os.getenv("FORMAT_PROBE", "1") == "1"
+# Seconds extracted metadata is reused for retries and fallbacks of the same URL
+FORMAT_PROBE_TTL = float(os.getenv("FORMAT_PROBE_TTL", "600"))
+FORMAT_PROBE_MAX_ENTRIES = int(os.getenv("FORMAT_PROBE_MAX_ENTRIES", "1000"))
+FORMAT_PROBE_TIMEOUT = 30
+# Failed extractions are remembered for less time than successful ones
+NEGATIVE_TTL = 60
+
+# The only fields kept per format; full yt-dlp info dicts (fragments, headers) are large.
+# url and protocol let handlers hand a direct media URL to Telegram (see passthrough_url)
+FORMAT_FIELDS = ("format_id", "ext", "vcodec", "acodec", "height", "tbr", "filesize", "filesize_approx",
+                 "url", "protocol")
+
+
+def slim_info(info: dict) -> dict:
+    """Reduce a yt-dlp info dict to what format selection needs."""
+    formats = info.get("formats") or [info]
+    return {
+        "id": info.get("id"),
+        "duration": info.get("duration"),
+        "formats": [{key: f.get(key) for key in FORMAT_FIELDS} for f in formats if f.get("format_id")],
+    }
+
+
+def format_size(fmt: dict) -> int | None:
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    return int(size) if size else None
+
+
+def _has(codec: str | None) -> bool:
+    # Some extractors (TikTok, Instagram) leave codecs unset on muxed formats
+    return codec != "none"
+
+
+def _quality(fmt: dict) -> tuple:
+    return fmt.get("height") or 0, fmt.get("tbr") or 0
+
+
+def select_format(info: dict, max_size: int, muxed_only: bool = False) -> str | None:
+    """
+    yt-dlp format spec of the best variant whose known size fits `max_size`.
+    Video-only formats are paired with the largest audio that still fits,
+    unless `muxed_only` (e.g. when streaming to stdout, where yt-dlp can't
+    merge). If nothing fits, the smallest sized variant is returned so the
+    transcode has less to do; None if no format reports a size at all.
+    """
+    muxed, video, audio = [], [], []
+    for fmt in info.get("formats", []):
+        size = format_size(fmt)
+        if size is None:
+            continue
+        has_video, has_audio = _has(fmt.get("vcodec")), _has(fmt.get("acodec"))
+        if has_video and has_audio:
+            muxed.append((fmt, size))
+        elif has_video:
+            video.append((fmt, size))
+        elif has_audio:
+            audio.append((fmt, size))
+
+    # (quality, size, spec)
+    candidates = [(_quality(fmt), size, fmt["format_id"]) for fmt, size in muxed]
+    if not muxed_only:
+        audio.sort(key=lambda item: item[1], reverse=True)
+        for fmt, size in video:
+            best_audio = next((a for a in audio if size + a[1] <= max_size), audio[-1] if audio else None)
+            if best_audio is not None:
+                candidates.append((_quality(fmt), size + best_audio[1], f"{fmt['format_id']}+{best_audio[0]['format_id']}"))
+    if not candidates:
+        return None
+
+    fitting = [c for c in candidates if c[1] <= max_size]
+    if fitting:
+        return max(fitting, key=lambda c: (c[0], c[1]))[2]
+    return min(candidates, key=lambda c: c[1])[2]
+
+
+def passthrough_url(info: dict, max_size: int) -> str | None:
+    """
+    Direct URL of the best muxed mp4 variant whose known size fits `max_size`
+    and that is served over plain HTTP(S), i.e. a file Telegram can fetch by
+    URL itself. None if no variant qualifies.
+    """
+    candidates = [
+        fmt for fmt in info.get("formats", [])
+        if fmt.get("url") and fmt.get("protocol") in ("http", "https") and fmt.get("ext") == "mp4"
+        and _has(fmt.get("vcodec")) and _has(fmt.get("acodec"))
+        and (format_size(fmt) or max_size + 1) <= max_size
+    ]
+    return max(candidates, key=_quality)["url"] if candidates else None
+
+
+class FormatProbe:
+    """
+    Fetches format metadata for a URL before downloading (yt-dlp's info
+    JSON, through the warm pool or `yt-dlp -J`) and picks the best format
+    that fits the upload limit. Metadata is cached per URL, so retries and
+    fallback strategies don't run extraction again, and concurrent probes of
+    one URL share a single extraction.
+    """
+
+    def __init__(self, enabled: bool = FORMAT_PROBE, ttl: float = FORMAT_PROBE_TTL,
+                 max_entries: int = FORMAT_PROBE_MAX_ENTRIES, clock=time.monotonic):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._cache: OrderedDict[tuple, tuple[float, dict | None]] = OrderedDict()
+        self._pending: dict[tuple, asyncio.Task] = {}
+
+    async def metadata(self, url: str, cookiefile: str | None = None) -> dict | None:
+        """Slimmed yt-dlp info for `url`, or None if extraction failed."""
+        key = (url, cookiefile)
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry[0] > self.clock():
+                self._cache.move_to_end(key)
+                return entry[1]
+            del self._cache[key]
+        if key not in self._pending:
+            task = asyncio.ensure_future(self._extract(url, cookiefile))
+            self._pending[key] = task
+            task.add_done_callback(lambda t: self._store(key, t))
+        try:
+            return await asyncio.shield(self._pending[key])
+        except DeadlineExceeded:
+            deadline = current_deadline()
+            if deadline is not None and deadline.expired:
+                raise
+            # The update that started the extraction ran out of time; this one still has some
+            return await self.metadata(url, cookiefile)
+
+    def _store(self, key: tuple, task: asyncio.Task) -> None:
+        self._pending.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        info = task.result()
+        self._cache[key] = (self.clock() + (self.ttl if info is not None else NEGATIVE_TTL), info)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def _extract(self, url: str, cookiefile: str | None) -> dict | None:
+        try:
+            if ytdlp_pool.enabled:
+                options = {"cookiefile": cookiefile} if cookiefile else {}
+                return await ytdlp_pool.extract_info(url, options, timeout=FORMAT_PROBE_TIMEOUT)
+            args = ["-J", "--no-warnings", "--no-playlist"]
+            if cookiefile:
+                args += ["--cookies", cookiefile]
+            result = await run_ytdlp([*args, url], timeout=FORMAT_PROBE_TIMEOUT)
+            if result.returncode != 0:
+                logger.debug("yt-dlp -J failed for %s: %s", url, result.stderr.decode(errors="replace")[-300:])
+                return None
+            return slim_info(json.loads(result.stdout))
+        except (DeadlineExceeded, asyncio.CancelledError):
+            raise
+        except asyncio.TimeoutError as e:
+            deadline = current_deadline()
+            if deadline is not None and deadline.expired:
+                # Cut short by the update's budget, not the probe's own timeout: says nothing about
+                # the URL, so it must not be cached as a failure for other updates
+                raise DeadlineExceeded("update deadline exceeded") from e
+            logger.debug("Format probe timed out for %s", url)
+            return None
+        except (OSError, ValueError) as e:
+            logger.debug("Format probe failed for %s: %s", url, e)
+            return None
+
+    async def choose(self, url: str, max_size: int = MAX_UPLOAD_SIZE, muxed_only: bool = False,
+                     cookiefile: str | None = None) -> str | None:
+        """Probed format spec for `url` (see select_format); None if probing is disabled or found nothing usable."""
+        if not self.enabled:
+            return None
+        info = await self.metadata(url, cookiefile)
+        chosen = select_format(info, max_size, muxed_only) if info else None
+        if chosen is not None:
+            logger.debug("Pre-selected format %s for %s", chosen, url)
+        return chosen
+
+    async def selector(self, url: str, fallback: str = "best", muxed_only: bool = False) -> str:
+        """
+        yt-dlp `-f` value for `url`: the probed format, with `fallback` after it
+        in case that format disappears; just `fallback` if nothing was chosen.
+        """
+        chosen = await self.choose(url, muxed_only=muxed_only)
+        return f"{chosen}/{fallback}" if chosen else fallback
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+format_probe = FormatProbe()
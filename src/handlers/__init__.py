@@ -1,9 +1,218 @@
+import time
+import logging
 from abc import ABC, abstractmethod
 
+from telegram.error import BadRequest, TelegramError
+from utils import delete_message
+from file_id_cache import file_id_cache
+from canonical import resolve_media_key
+from media_cache import media_cache
+from single_flight import in_flight
+from deadline import current_deadline
+from metrics import upload_seconds
+from relay import MediaStream, relay_video
+from passthrough import passthrough
+from transcoder import fit_to_size, MAX_UPLOAD_SIZE
+
+logger = logging.getLogger(__name__)
+
+def _upload_timeouts() -> dict:
+    """Bot API read/write timeouts capped by the current update's deadline (PTB defaults outside of one)."""
+    deadline = current_deadline()
+    if deadline is None:
+        return {}
+    remaining = deadline.clamp(None)
+    return {"read_timeout": remaining, "write_timeout": remaining}
+
 class BaseHandler(ABC):
+    @property
+    def platform(self) -> str:
+        """Short platform name used for scheduling limits and logs, e.g. "tiktok"."""
+        return type(self).__name__.removesuffix("Handler").lower()
+
     def _format_caption(self, sender_name: str, link: str) -> str:
         return f"{sender_name}from {link}"
 
+    async def _send_cached_video(self, update, url: str, caption: str, **kwargs) -> bool:
+        """Re-send a previously uploaded video by its Telegram file_id. Returns True on a cache hit."""
+        file_id = await file_id_cache.get(url)
+        if not file_id:
+            return False
+        start = time.perf_counter()
+        try:
+            await update.message.chat.send_video(
+                video=file_id, caption=caption, parse_mode="HTML", **{**_upload_timeouts(), **kwargs}
+            )
+        except TelegramError as e:
+            upload_seconds.observe(time.perf_counter() - start, platform=self.platform, source="file_id", outcome="error")
+            logger.warning("Cached file_id for %s rejected, downloading again: %s", url, e)
+            await file_id_cache.delete(url)
+            return False
+        upload_seconds.observe(time.perf_counter() - start, platform=self.platform, source="file_id", outcome="success")
+        await delete_message(update)
+        return True
+
+    async def _direct_media_url(self, url: str) -> str | None:
+        """
+        A URL of the media behind `url` that Telegram can fetch itself, for
+        platforms whose CDNs allow it; None (the default) to always download.
+        """
+        return None
+
+    async def _send_direct(self, update, url: str, caption: str, **kwargs) -> bool:
+        """
+        Have Telegram fetch the video from its direct media URL, skipping our
+        download and upload. Returns False when there is no usable URL or Telegram
+        rejects it; the verdict is remembered per media domain (see passthrough).
+        """
+        if not passthrough.enabled:
+            return False
+        try:
+            media_url = await self._direct_media_url(url)
+        except Exception as e:
+            logger.debug("%s: no direct media URL for %s: %s", self.platform, url, e)
+            return False
+        if not media_url or not passthrough.allowed(media_url):
+            return False
+        start = time.perf_counter()
+        try:
+            sent = await update.message.chat.send_video(
+                video=media_url, caption=caption, parse_mode="HTML", **{**_upload_timeouts(), **kwargs}
+            )
+        except TelegramError as e:
+            upload_seconds.observe(time.perf_counter() - start, platform=self.platform, source="url", outcome="error")
+            # Only a rejected URL says something about the domain; timeouts and network errors don't
+            if isinstance(e, BadRequest):
+                passthrough.reject(media_url)
+            logger.info("%s: Telegram did not take %s by URL, downloading it: %s", self.platform, url, e)
+            return False
+        upload_seconds.observe(time.perf_counter() - start, platform=self.platform, source="url", outcome="success")
+        passthrough.accept(media_url)
+        await self._remember_file_id(url, sent)
+        await delete_message(update)
+        return True
+
+    async def _send_video(self, update, video, caption: str, url: str | None = None, **kwargs):
+        """Upload a video and remember its file_id under `url` for later re-sends."""
+        start = time.perf_counter()
+        try:
+            sent = await update.message.chat.send_video(
+                video=video, caption=caption, parse_mode="HTML", **{**_upload_timeouts(), **kwargs}
+            )
+        except Exception:
+            upload_seconds.observe(time.perf_counter() - start, platform=self.platform, source="upload", outcome="error")
+            raise
+        upload_seconds.observe(time.perf_counter() - start, platform=self.platform, source="upload", outcome="success")
+        await self._remember_file_id(url, sent)
+        return sent
+
+    @staticmethod
+    async def _remember_file_id(url: str | None, sent) -> None:
+        file_id = getattr(getattr(sent, "video", None), "file_id", None)
+        if url and isinstance(file_id, str):
+            await file_id_cache.set(url, file_id)
+
+    async def _relay_media(self, update, stream: MediaStream, caption: str, url: str, **kwargs) -> None:
+        """
+        Upload a MediaStream while it is still downloading. If the relayed upload
+        fails, the rest of the download is read and uploaded again from the buffer.
+        """
+        start = time.perf_counter()
+        try:
+            sent = await relay_video(
+                update.message.get_bot(), update.message.chat_id, stream, caption=caption, parse_mode="HTML", **kwargs
+            )
+        except Exception as e:
+            upload_seconds.observe(time.perf_counter() - start, platform=self.platform, source="relay", outcome="error")
+            logger.warning("%s: relayed upload of %s failed, uploading from the buffer: %s", self.platform, url, e)
+            buffer = await stream.finish()
+            await self._send_video(update, buffer.input_file(), caption, url=url, **kwargs)
+            return
+        upload_seconds.observe(time.perf_counter() - start, platform=self.platform, source="relay", outcome="success")
+        await self._remember_file_id(url, sent)
+
+    async def _send_media(self, update, media, caption: str, url: str, cache: bool = True, **kwargs) -> bool:
+        """
+        Upload a downloaded MediaBuffer/MediaFile, release it and delete the original
+        message. Media over the upload limit is first re-encoded to fit. Unless
+        `cache` is False, what was downloaded is kept in the media cache once the
+        upload is done (or has failed, so a retry doesn't download again); the
+        copy and hash stay off the path to the chat.
+        A MediaStream (always under the limit) is relayed while it downloads.
+        """
+        if isinstance(media, MediaStream):
+            with media:
+                await self._upload_then_cache(
+                    update, media, url, cache, self._relay_media(update, media, caption, url, **kwargs)
+                )
+            return True
+        if len(media) > MAX_UPLOAD_SIZE:
+            with media:
+                logger.info("%s: %d bytes is over the upload limit, transcoding", self.platform, len(media))
+                media = await fit_to_size(media, MAX_UPLOAD_SIZE, platform=self.platform)
+            if media is None:
+                logger.warning("%s: could not fit %s under the upload limit", self.platform, url)
+                return False
+        with media:
+            await self._upload_then_cache(
+                update, media, url, cache, self._send_video(update, media.input_file(), caption, url=url, **kwargs)
+            )
+        return True
+
+    async def _upload_then_cache(self, update, media, url: str, cache: bool, upload) -> None:
+        """
+        Await `upload`, delete the original message, then (if `cache`) store
+        `media` in the media cache. A failed upload is cached too before the
+        error propagates. `media` must stay open until this returns.
+        """
+        try:
+            await upload
+        except Exception:
+            if cache:
+                await self._store(url, media)
+            raise
+        await delete_message(update)
+        if cache:
+            await self._store(url, media)
+
+    @staticmethod
+    async def _store(url: str, media) -> None:
+        if isinstance(media, MediaStream):
+            # Only a relay whose download finished has the whole video to keep
+            if not media.complete:
+                return
+            media = media.buffer
+        await media_cache.put(url, media)
+
+    async def _handle_once(self, update, url: str, caption: str, download_and_send, **kwargs) -> None:
+        """
+        Deliver `url` to the chat, downloading it at most once across concurrent updates.
+        Telegram's file_id cache, the on-disk media cache and a direct media URL
+        Telegram fetches itself are tried before `download_and_send`, which performs
+        the download and upload for this update and returns True on success; updates
+        that joined an in-flight run re-send the resulting upload by file_id instead
+        of fetching the media again.
+        """
+        # Resolves short links once, so every alias of a video shares the caches below
+        key = await resolve_media_key(url)
+        if await self._send_cached_video(update, url, caption, **kwargs):
+            return
+
+        async def deliver() -> bool:
+            cached = await media_cache.get(url)
+            if cached is not None:
+                logger.info("%s: sending %s from the media cache", self.platform, url)
+                return await self._send_media(update, cached, caption, url, cache=False, **kwargs)
+            if await self._send_direct(update, url, caption, **kwargs):
+                return True
+            return await download_and_send()
+
+        sent, shared = await in_flight.do(key, deliver)
+        if not shared:
+            return
+        if not sent or not await self._send_cached_video(update, url, caption, **kwargs):
+            logger.warning("Shared download of %s produced nothing to re-send", url)
+
     @abstractmethod
     def can_handle(self, message: str) -> bool:
         pass
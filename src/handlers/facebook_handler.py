@@ -1,16 +1,24 @@
-import io
-import subprocess
-import tempfile
+import re
 import os
 import logging
 
 from telegram import Update
-from utils import delete_message
+from downloader import run_ytdlp
+from ytdlp_pool import ytdlp_pool
+from format_probe import format_probe
+from scratch import scratch_space
+from media_buffer import MediaBuffer, MediaFile
+from strategies import run_strategies
 from . import BaseHandler
 
 logger = logging.getLogger(__name__)
 
+# Regex to extract Facebook reel / fb.watch URLs from a message
+FACEBOOK_URL_PATTERN = re.compile(r"https://(?:www\.facebook\.com/reel/|fb\.watch/)[^\s]+")
+
 class FacebookHandler(BaseHandler):
+    URL_PATTERN = FACEBOOK_URL_PATTERN
+
     def __init__(self):
         self.FACEBOOK_LINKS = ["https://www.facebook.com/reel/", "https://fb.watch/"]
 
@@ -20,53 +28,62 @@ class FacebookHandler(BaseHandler):
     async def handle(self, update: Update, message: str, sender_name: str) -> None:
         try:
             fb_link = f'<a href="{message}">📘 Facebook</a>'
+            caption = self._format_caption(sender_name, fb_link)
 
-            # Try to download using yt-dlp directly to memory
-            try:
-                process = subprocess.run(
-                    ["yt-dlp", "-o", "-", "--format", "best", message],
-                    capture_output=True,
-                    check=False
-                )
+            await self._handle_once(
+                update, message, caption, lambda: self._download_and_send(update, message, caption)
+            )
 
-                if process.stdout and len(process.stdout) > 0:
-                    video_bytes = io.BytesIO(process.stdout)
-                    video_bytes.seek(0)
+        except Exception as e:
+            pass
 
-                    await update.message.chat.send_video(
-                        video=video_bytes,
-                        caption=self._format_caption(sender_name, fb_link),
-                        parse_mode="HTML"
-                    )
-                    await delete_message(update)
-                    return
-            except Exception:
-                pass
+    async def _download_and_send(self, update: Update, message: str, caption: str) -> bool:
+        result = await run_strategies([
+            ("yt-dlp", lambda: self._download_via_ytdlp(message)),
+            ("yt-dlp-file", lambda: self._download_via_ytdlp_file(message)),
+        ], platform=self.platform)
+        if result is None:
+            return False
+        _, media = result
+        return await self._send_media(update, media, caption, message)
 
-            # Try to download using temporary file
-            try:
-                temp_dir = tempfile.mkdtemp()
-                output_path = os.path.join(temp_dir, "facebook_video.mp4")
-
-                process = subprocess.run(
-                    ["yt-dlp", "-o", output_path, "--format", "best", message],
-                    capture_output=True,
-                    text=True,
-                    check=False
-                )
+    async def _download_via_ytdlp(self, message: str) -> MediaBuffer | None:
+        # Stream yt-dlp output into a memory-bounded buffer
+        buffer = MediaBuffer()
+        try:
+            # Streaming to stdout can't merge, so only muxed formats qualify
+            fmt = await format_probe.selector(message, muxed_only=True)
+            await run_ytdlp(["-o", "-", "--format", fmt, message], stdout=buffer)
+            if buffer:
+                return buffer
+        except Exception:
+            pass
+        except BaseException:
+            buffer.close()
+            raise
+        buffer.close()
+        return None
 
-                if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                    with open(output_path, "rb") as video_file:
-                        await update.message.chat.send_video(
-                            video=video_file,
-                            caption=self._format_caption(sender_name, fb_link),
-                            parse_mode="HTML"
-                        )
-                        await delete_message(update)
-                        os.remove(output_path)
-                        return
+    async def _download_via_ytdlp_file(self, message: str) -> MediaFile | None:
+        fmt = await format_probe.selector(message, muxed_only=True)
+        if ytdlp_pool.enabled:
+            # Warm in-process yt-dlp, no CLI start-up per attempt
+            try:
+                return await ytdlp_pool.download(message, {"format": fmt})
             except Exception:
-                pass
+                return None
+        # Download to a temporary file
+        scratch = await scratch_space.acquire("facebook-")
+        output_path = os.path.join(scratch.path, "facebook_video.mp4")
+        try:
+            await run_ytdlp(["-o", output_path, "--format", fmt, message])
 
-        except Exception as e:
+            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                return MediaFile(output_path, cleanup_dir=scratch)
+        except Exception:
             pass
+        except BaseException:
+            scratch.close()
+            raise
+        scratch.close()
+        return None
@@ -1,30 +1,37 @@
-import io
 import os
 import re
-import tempfile
+import importlib.util
+import shutil
 from urllib.parse import quote
-import subprocess
 import logging
 from pathlib import Path
-import aiohttp
 import asyncio
 import random
 from telegram import Update
 from utils import delete_message
+from downloader import run_ytdlp
+from ytdlp_pool import ytdlp_pool
+from format_probe import format_probe
+from capabilities import capabilities
+from http_client import get_session, request_timeout
+from scratch import scratch_space, ScratchDir
+from media_buffer import MediaBuffer, MediaFile
+from relay import MediaStream, fetch_media
+from strategies import run_strategies
+from backends import backend_registry
+from rate_limiter import rate_limiter
+from transcoder import MAX_UPLOAD_SIZE
 from . import BaseHandler
 
 INSTAGRAM_COOKIES_FILE = os.getenv("INSTAGRAM_COOKIES_FILE")
 
-try:
-    import instaloader
-
-    INSTALOADER_AVAILABLE = True
-except ImportError:
-    INSTALOADER_AVAILABLE = False
+# instaloader is optional and slow to import; it is only imported when actually used
+INSTALOADER_AVAILABLE = importlib.util.find_spec("instaloader") is not None
 
 logger = logging.getLogger(__name__)
 
-USE_DD_LINK = False  # DD Instagram service is down
+# ddinstagram is tried as a last resort; its circuit breaker skips it while the service is down
+USE_DD_LINK = os.getenv("INSTAGRAM_USE_DD_LINK", "1") == "1"
 # USE_YD = False
 
 # Regex to extract Instagram URL from message (reel/reels/p)
@@ -32,10 +39,12 @@ INSTAGRAM_URL_PATTERN = re.compile(
     r"https?://(?:www\.)?instagram\.com/(?:p|reel|reels)/[^\s]+", re.IGNORECASE
 )
 
-REELSAVER_API = "https://reelsaver.vercel.app/api/video"
+REELSAVER_API = os.getenv("REELSAVER_API", "https://reelsaver.vercel.app/api/video")
 
 
 class InstagramHandler(BaseHandler):
+    URL_PATTERN = INSTAGRAM_URL_PATTERN
+
     def __init__(self):
         logger.info("Initializing InstagramHandler")
         self.INSTAGRAM_LINKS = [
@@ -44,29 +53,10 @@ class InstagramHandler(BaseHandler):
             "instagram.com/p/",
         ]
 
-        # Check if yt-dlp is available
-        try:
-            logger.debug("Checking if yt-dlp is available")
-            subprocess.run(
-                ["yt-dlp", "--version"], capture_output=True, text=True, check=True
-            )
-            self.yt_dlp_available = True
-            logger.info("yt-dlp is available")
-        except (subprocess.SubprocessError, FileNotFoundError) as e:
-            self.yt_dlp_available = False
-            logger.warning(f"yt-dlp is not available: {str(e)}")
-
-        # Check if ffmpeg is available (still needed as fallback)
-        try:
-            logger.debug("Checking if ffmpeg is available")
-            subprocess.run(
-                ["ffmpeg", "-version"], capture_output=True, text=True, check=True
-            )
-            self.ffmpeg_available = True
-            logger.info("ffmpeg is available")
-        except (subprocess.SubprocessError, FileNotFoundError) as e:
-            self.ffmpeg_available = False
-            logger.warning(f"ffmpeg is not available: {str(e)}")
+        # Tool availability comes from the on-disk probe cache; unknown tools are
+        # probed in the background at startup, or on first use (see _probe_tools)
+        self.yt_dlp_available = capabilities.cached("yt-dlp")
+        self.ffmpeg_available = capabilities.cached("ffmpeg")
 
         self.USER_AGENTS = [
             "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1",
@@ -76,16 +66,19 @@ class InstagramHandler(BaseHandler):
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:104.0) Gecko/20100101 Firefox/104.0",
         ]
 
-        # Max file size for Telegram (8MB to be safe)
-        self.MAX_FILE_SIZE_KB = 50000
+        # Max file size for Telegram before transcoding kicks in
+        self.MAX_FILE_SIZE_KB = MAX_UPLOAD_SIZE // 1024
         logger.debug(f"Max file size set to {self.MAX_FILE_SIZE_KB}KB")
 
-        # Session for reusing connections and cookies
-        self.session = None
-
         # Instaloader instance (reuse to maintain session)
         self._instaloader_instance = None
-        self._last_request_time = 0
+
+    async def _probe_tools(self) -> None:
+        """Resolve tool availability that wasn't known from the probe cache at construction."""
+        if self.yt_dlp_available is None:
+            self.yt_dlp_available = ytdlp_pool.enabled or await capabilities.available("yt-dlp")
+        if self.ffmpeg_available is None:
+            self.ffmpeg_available = await capabilities.available("ffmpeg")
 
     def can_handle(self, message: str) -> bool:
         return any(link in message for link in self.INSTAGRAM_LINKS)
@@ -99,22 +92,19 @@ class InstagramHandler(BaseHandler):
         return random.choice(self.USER_AGENTS)
 
     async def get_session(self):
-        if self.session is None or self.session.closed:
-            timeout = aiohttp.ClientTimeout(total=30)
-            self.session = aiohttp.ClientSession(
-                timeout=timeout, cookie_jar=aiohttp.CookieJar()
-            )
-        return self.session
+        """Shared application-wide session (see http_client)."""
+        return await get_session()
 
     async def download_with_retry(self, url, max_retries=3):
         """Download with exponential backoff retry logic"""
         for attempt in range(max_retries):
             try:
-                await asyncio.sleep(random.uniform(1, 3))  # Random delay
+                await rate_limiter.acquire(url)
                 session = await self.get_session()
                 headers = {"User-Agent": self.get_random_user_agent()}
 
-                async with session.get(url, headers=headers) as resp:
+                async with session.get(url, headers=headers, timeout=request_timeout()) as resp:
+                    rate_limiter.report(url, resp.status, resp.headers.get("Retry-After"))
                     if resp.status == 200:
                         return await resp.text()
                     else:
@@ -131,17 +121,15 @@ class InstagramHandler(BaseHandler):
         return None
 
     async def is_dd_link_working(self, dd_link: str) -> bool:
-        if not USE_DD_LINK:
-            return False
-
         logger.debug(f"Checking if DD link is working: {dd_link}")
         try:
-            await asyncio.sleep(random.uniform(0.5, 1.5))  # Random delay
+            await rate_limiter.acquire(dd_link)
             session = await self.get_session()
             headers = {"User-Agent": self.get_random_user_agent()}
 
             logger.debug(f"Sending GET request to {dd_link}")
-            async with session.get(dd_link, timeout=10, headers=headers) as resp:
+            async with session.get(dd_link, timeout=request_timeout(10), headers=headers) as resp:
+                rate_limiter.report(dd_link, resp.status, resp.headers.get("Retry-After"))
                 if resp.status != 200:
                     logger.warning(f"DD link returned non-200 status: {resp.status}")
                     return False
@@ -151,16 +139,16 @@ class InstagramHandler(BaseHandler):
             logger.error(f"Error checking DD link: {str(e)}")
             return False
 
-    async def _download_via_reelsaver(self, url: str) -> bytes | None:
-        """Get video URL from ReelSaver API, download with browser User-Agent, return bytes."""
+    async def _download_via_reelsaver(self, url: str) -> MediaBuffer | MediaStream | None:
+        """Get video URL from ReelSaver API and fetch it with browser User-Agent (see relay.fetch_media)."""
         try:
             api_url = f"{REELSAVER_API}?postUrl={quote(url, safe='')}"
             headers = {"User-Agent": self.get_random_user_agent()}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    api_url, headers=headers, timeout=30
-                ) as response:
-                    data = await response.json()
+            session = await self.get_session()
+            await rate_limiter.acquire(api_url)
+            async with session.get(api_url, headers=headers, timeout=request_timeout(30)) as response:
+                rate_limiter.report(api_url, response.status, response.headers.get("Retry-After"))
+                data = await response.json()
             if data.get("status") != "success" or not data.get("data", {}).get(
                 "videoUrl"
             ):
@@ -172,12 +160,7 @@ class InstagramHandler(BaseHandler):
                 return None
             video_url = data["data"]["videoUrl"]
             headers["Referer"] = "https://www.instagram.com/"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(video_url, headers=headers, timeout=60) as resp:
-                    if resp.status != 200:
-                        logger.warning("Instagram CDN returned status %s", resp.status)
-                        return None
-                    return await resp.read()
+            return await fetch_media(video_url, headers, "Instagram CDN")
         except Exception as e:
             logger.warning("Instagram ReelSaver download failed: %s", e, exc_info=True)
             return None
@@ -190,259 +173,222 @@ class InstagramHandler(BaseHandler):
 
         logger.info("Instagram: processing %s", url)
         instagram_link = f'<a href="{url}">📸 Instagram</a>'
+        caption = self._format_caption(sender_name, instagram_link)
 
         try:
-            # 1. Try ReelSaver API first (free, no login, similar to tikwm for TikTok)
-            video_bytes = await self._download_via_reelsaver(url)
-            if video_bytes:
-                logger.info(
-                    "Instagram: ReelSaver success, sending video (%d bytes)",
-                    len(video_bytes),
-                )
-                video_io = io.BytesIO(video_bytes)
-                video_io.seek(0)
-                await update.message.chat.send_video(
-                    video=video_io,
-                    caption=self._format_caption(sender_name, instagram_link),
+            await self._handle_once(
+                update,
+                url,
+                caption,
+                lambda: self._download_and_send(update, url, sender_name, caption),
+                supports_streaming=True,
+            )
+        except Exception as e:
+            logger.error("Instagram handler exception: %s", e, exc_info=True)
+            # Don't send any error message to Telegram, just log it
+
+    async def _download_and_send(
+        self, update: Update, url: str, sender_name: str, caption: str
+    ) -> bool:
+        strategies = [
+            # ReelSaver API (free, no login, similar to tikwm for TikTok)
+            ("reelsaver", lambda: self._download_via_reelsaver(url)),
+        ]
+        await self._probe_tools()
+        if self.yt_dlp_available and self.ffmpeg_available:
+            # yt-dlp fallback (may require cookies for some posts)
+            strategies.append(("yt-dlp", lambda: self._download_via_ytdlp(url)))
+        else:
+            logger.warning("Instagram: yt-dlp/ffmpeg not available for fallback")
+
+        result = await run_strategies(strategies, platform=self.platform)
+        if result is not None:
+            name, media = result
+            logger.info(
+                "Instagram: %s success, sending video (%d bytes)", name, media.size
+            )
+            return await self._send_media(
+                update, media, caption, url, supports_streaming=True
+            )
+
+        # Last resort: ddinstagram link (if enabled and its circuit is closed)
+        if USE_DD_LINK:
+            dd_message = url.replace("instagram", "ddinstagram")
+            if await backend_registry.call(
+                self.platform, "ddinstagram", lambda: self.is_dd_link_working(dd_message)
+            ):
+                message_text = f"{dd_message}\n\n{sender_name}from 📸 Instagram"
+                await update.message.chat.send_message(
+                    text=message_text,
                     parse_mode="HTML",
-                    supports_streaming=True,
+                    disable_web_page_preview=False,
                 )
                 await delete_message(update)
-                return
-
-            logger.info("Instagram: ReelSaver failed, trying yt-dlp fallback")
-
-            # 2. Try ddinstagram link (if enabled)
-            if USE_DD_LINK:
-                dd_message = url.replace("instagram", "ddinstagram")
-                if await self.is_dd_link_working(dd_message):
-                    message_text = f"{dd_message}\n\n{sender_name}from 📸 Instagram"
-                    await update.message.chat.send_message(
-                        text=message_text,
-                        parse_mode="HTML",
-                        disable_web_page_preview=False,
-                    )
-                    await delete_message(update)
-                    return
-
-            # 3. Try yt-dlp fallback (may require cookies for some posts)
-            instagram_id_match = re.search(r"/(?:p|reels?)/([^/?]+)", url)
-            instagram_id = instagram_id_match.group(1) if instagram_id_match else "post"
+                return True
 
-            if not self.yt_dlp_available or not self.ffmpeg_available:
-                logger.warning("Instagram: yt-dlp/ffmpeg not available for fallback")
-                return
+        logger.warning("Instagram: all download methods failed for %s", url)
+        return False
 
-            # Try to download the video with yt-dlp
-            try:
-                logger.debug("Creating temporary directory for downloads")
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    logger.debug(f"Temp directory created: {temp_dir}")
-                    # Define format preferences in order - these are yt-dlp format selectors
-                    format_preferences = [
-                        # Try 720p video with audio (approx HD)
-                        "bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best[height<=720]",
-                        # Fallback to best format
-                        "best",
-                    ]
-
-                    # Try each format preference in order
-                    for i, format_selector in enumerate(format_preferences):
-                        output_path = (
-                            Path(temp_dir) / f"instagram_{instagram_id}_{i}.mp4"
-                        )
-                        logger.info(
-                            f"Attempting format {i + 1}/{len(format_preferences)}: {format_selector}"
-                        )
+    async def _download_via_ytdlp(self, url: str) -> MediaFile | None:
+        """Download with yt-dlp, trying format preferences in order and compressing if needed."""
+        instagram_id_match = re.search(r"/(?:p|reels?)/([^/?]+)", url)
+        instagram_id = instagram_id_match.group(1) if instagram_id_match else "post"
 
-                        # Add random delay before download attempt
-                        await asyncio.sleep(random.uniform(1, 3))
-
-                        download_cmd = [
-                            "yt-dlp",
-                            "--no-warnings",
-                            "--no-check-certificate",
-                            "--user-agent",
-                            self.get_random_user_agent(),
-                        ]
-                        if INSTAGRAM_COOKIES_FILE and os.path.isfile(
-                            INSTAGRAM_COOKIES_FILE
-                        ):
-                            download_cmd.extend(["--cookies", INSTAGRAM_COOKIES_FILE])
-                            logger.info(
-                                "Instagram: using cookies from %s",
-                                INSTAGRAM_COOKIES_FILE,
-                            )
-                        elif INSTAGRAM_COOKIES_FILE:
-                            logger.warning(
-                                "Instagram: INSTAGRAM_COOKIES_FILE set but file not found: %s",
-                                INSTAGRAM_COOKIES_FILE,
-                            )
-                        download_cmd.extend(
-                            [
-                                "--sleep-interval",
-                                "3",
-                                "--max-sleep-interval",
-                                "8",
-                                "--sleep-requests",
-                                "2",
-                                "--retries",
-                                "3",
-                                "--fragment-retries",
-                                "3",
-                                "-f",
-                                format_selector,
-                                "--merge-output-format",
-                                "mp4",
-                                "-o",
-                                str(output_path),
-                                url,
-                            ]
-                        )
-
-                        logger.debug(
-                            f"Running download command: {' '.join(download_cmd)}"
-                        )
-                        # Run the download command
-                        download_process = subprocess.run(
-                            download_cmd, capture_output=True, text=True
-                        )
+        scratch = await scratch_space.acquire("instagram-")
+        logger.debug(f"Scratch directory created: {scratch.path}")
+        try:
+            media = await self._download_formats(url, scratch, instagram_id)
+        except Exception as e:
+            logger.error("Instagram yt-dlp exception: %s", e, exc_info=True)
+            media = None
+        except BaseException:
+            scratch.close()
+            raise
+        if media is None:
+            scratch.close()
+        return media
+
+    async def _download_formats(
+        self, url: str, scratch: ScratchDir, instagram_id: str
+    ) -> MediaFile | None:
+        # Define format preferences in order - these are yt-dlp format selectors
+        format_preferences = [
+            # Try 720p video with audio (approx HD)
+            "bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best[height<=720]",
+            # Fallback to best format
+            "best",
+        ]
+        cookiefile = INSTAGRAM_COOKIES_FILE if INSTAGRAM_COOKIES_FILE and os.path.isfile(INSTAGRAM_COOKIES_FILE) else None
+        chosen = await format_probe.choose(url, cookiefile=cookiefile)
+        if chosen:
+            # The probe already knows which format fits; keep `best` only in case it disappeared
+            format_preferences = [f"{chosen}/best"]
+
+        # Try each format preference in order
+        for i, format_selector in enumerate(format_preferences):
+            output_path = Path(scratch.path) / f"instagram_{instagram_id}_{i}.mp4"
+            logger.info(
+                f"Attempting format {i + 1}/{len(format_preferences)}: {format_selector}"
+            )
 
-                        # Check if download succeeded
-                        if download_process.returncode == 0 and output_path.exists():
-                            logger.info(f"Download succeeded with format {i + 1}")
-                            # Check file size
-                            file_size_kb = os.path.getsize(output_path) / 1024
-                            logger.debug(f"File size: {file_size_kb:.2f}KB")
-
-                            # If file is small enough, send it to Telegram
-                            if file_size_kb <= self.MAX_FILE_SIZE_KB:
-                                logger.info(
-                                    f"File size {file_size_kb:.2f}KB is within limit, sending to Telegram"
-                                )
-                                await update.message.chat.send_video(
-                                    video=open(output_path, "rb"),
-                                    caption=self._format_caption(
-                                        sender_name, instagram_link
-                                    ),
-                                    parse_mode="HTML",
-                                    supports_streaming=True,
-                                )
-                                await delete_message(update)
-                                logger.debug("Video sent and original message deleted")
-                                return
-                            # If this is the last format option and still too large, try to compress it
-                            elif i == len(format_preferences) - 1:
-                                logger.info(
-                                    f"File too large ({file_size_kb:.2f}KB), trying compression"
-                                )
-                                compressed_path = await self.compress_video(
-                                    output_path, temp_dir, instagram_id
-                                )
-
-                                if compressed_path and os.path.exists(compressed_path):
-                                    compressed_size_kb = (
-                                        os.path.getsize(compressed_path) / 1024
-                                    )
-                                    logger.info(
-                                        f"Compression resulted in file size: {compressed_size_kb:.2f}KB"
-                                    )
-
-                                    if compressed_size_kb <= self.MAX_FILE_SIZE_KB:
-                                        logger.info(
-                                            "Compressed file is within size limit, sending to Telegram"
-                                        )
-                                        await update.message.chat.send_video(
-                                            video=open(compressed_path, "rb"),
-                                            caption=self._format_caption(
-                                                sender_name, instagram_link
-                                            ),
-                                            parse_mode="HTML",
-                                            supports_streaming=True,
-                                        )
-                                        await delete_message(update)
-                                        logger.debug(
-                                            "Compressed video sent and original deleted"
-                                        )
-                                        return
-                                    else:
-                                        logger.warning(
-                                            f"Compressed file still too large: {compressed_size_kb:.2f}KB"
-                                        )
-                                else:
-                                    logger.error("Compression failed")
-                    else:
-                        stderr = (download_process.stderr or "").strip()
-                        # Log last 300 chars (yt-dlp puts the actual error at the end)
-                        stderr_preview = stderr[-300:] if len(stderr) > 300 else stderr
-                        logger.warning(
-                            "Instagram yt-dlp format %s failed (returncode=%s): %s",
-                            i + 1,
-                            download_process.returncode,
-                            stderr_preview or "no output",
-                        )
+            # Paced with every other request to Instagram; no wait while there is capacity
+            await rate_limiter.acquire(url)
 
-            except Exception as e:
-                logger.error("Instagram yt-dlp exception: %s", e, exc_info=True)
+            # Check if download succeeded
+            if await self._fetch_format(url, format_selector, output_path, i, scratch):
+                logger.info(f"Download succeeded with format {i + 1}")
+                # Check file size
+                file_size_kb = os.path.getsize(output_path) / 1024
+                logger.debug(f"File size: {file_size_kb:.2f}KB")
 
-            logger.warning("Instagram: all download methods failed for %s", url)
-        except Exception as e:
-            logger.error("Instagram handler exception: %s", e, exc_info=True)
-            # Don't send any error message to Telegram, just log it
+                # If file is small enough, send it to Telegram
+                if file_size_kb <= self.MAX_FILE_SIZE_KB:
+                    logger.info(
+                        f"File size {file_size_kb:.2f}KB is within limit, sending to Telegram"
+                    )
+                    return MediaFile(output_path, cleanup_dir=scratch)
+                # The last format is handed over even if too large; _send_media transcodes it to fit
+                elif i == len(format_preferences) - 1:
+                    logger.info(
+                        f"File too large ({file_size_kb:.2f}KB), it will be transcoded"
+                    )
+                    return MediaFile(output_path, cleanup_dir=scratch)
+        return None
 
-    async def compress_video(self, input_path, temp_dir, instagram_id):
-        """Fallback compression using FFmpeg if direct download is too large"""
-        logger.info(f"Compressing video: {input_path}")
-        try:
-            compressed_path = (
-                Path(temp_dir) / f"instagram_compressed_{instagram_id}.mp4"
+    async def _fetch_format(
+        self, url: str, format_selector: str, output_path: Path, i: int, scratch: ScratchDir
+    ) -> bool:
+        """Download one format preference to `output_path` in `scratch`. Returns True if the file exists."""
+        if ytdlp_pool.enabled:
+            # Warm in-process yt-dlp; same options as the CLI command below, in the directory already held
+            media = await ytdlp_pool.download(url, self._ytdlp_options(format_selector), scratch=scratch)
+            if media is None:
+                return False
+            # Move it next to the other attempts so the caller owns cleanup like with the CLI
+            shutil.move(media.path, output_path)
+            media.close()
+            return True
+
+        download_cmd = [
+            "--no-warnings",
+            "--no-check-certificate",
+            "--user-agent",
+            self.get_random_user_agent(),
+        ]
+        if INSTAGRAM_COOKIES_FILE and os.path.isfile(INSTAGRAM_COOKIES_FILE):
+            download_cmd.extend(["--cookies", INSTAGRAM_COOKIES_FILE])
+            logger.info(
+                "Instagram: using cookies from %s",
+                INSTAGRAM_COOKIES_FILE,
             )
-            logger.debug(f"Compressed path will be: {compressed_path}")
-
-            # Compression settings for smaller file size
-            ffmpeg_cmd = [
-                "ffmpeg",
-                "-i",
-                str(input_path),
-                "-vf",
-                "scale=480:-2",  # 480p resolution
-                "-c:v",
-                "libx264",
-                "-preset",
-                "faster",
-                "-crf",
-                "28",  # Lower but still acceptable quality
-                "-maxrate",
-                "800k",
-                "-bufsize",
-                "1200k",
-                "-movflags",
-                "+faststart",
-                "-c:a",
-                "aac",
-                "-b:a",
-                "64k",
-                "-y",
-                str(compressed_path),
-            ]
-
-            logger.debug(f"FFmpeg command: {' '.join(ffmpeg_cmd)}")
-            compression_process = subprocess.run(
-                ffmpeg_cmd, capture_output=True, text=True
+        elif INSTAGRAM_COOKIES_FILE:
+            logger.warning(
+                "Instagram: INSTAGRAM_COOKIES_FILE set but file not found: %s",
+                INSTAGRAM_COOKIES_FILE,
             )
-
-            if compression_process.returncode != 0:
-                logger.error(f"FFmpeg compression failed: {compression_process.stderr}")
-                return None
-
-            return compressed_path
-        except Exception as e:
-            logger.error(f"Exception in compress_video: {str(e)}", exc_info=True)
-            return None
+        download_cmd.extend(
+            [
+                "--sleep-interval",
+                "3",
+                "--max-sleep-interval",
+                "8",
+                "--sleep-requests",
+                "2",
+                "--retries",
+                "3",
+                "--fragment-retries",
+                "3",
+                "-f",
+                format_selector,
+                "--merge-output-format",
+                "mp4",
+                "-o",
+                str(output_path),
+                url,
+            ]
+        )
+
+        logger.debug(f"Running download command: yt-dlp {' '.join(download_cmd)}")
+        # Run the download command
+        download_process = await run_ytdlp(download_cmd)
+
+        if download_process.returncode == 0 and output_path.exists():
+            return True
+        stderr = download_process.stderr.decode(errors="replace").strip()
+        if "HTTP Error 429" in stderr or "rate-limit" in stderr:
+            rate_limiter.report(url, 429)
+        # Log last 300 chars (yt-dlp puts the actual error at the end)
+        stderr_preview = stderr[-300:] if len(stderr) > 300 else stderr
+        logger.warning(
+            "Instagram yt-dlp format %s failed (returncode=%s): %s",
+            i + 1,
+            download_process.returncode,
+            stderr_preview or "no output",
+        )
+        return False
+
+    def _ytdlp_options(self, format_selector: str) -> dict:
+        """YoutubeDL API equivalent of the yt-dlp CLI flags used for Instagram."""
+        options = {
+            "nocheckcertificate": True,
+            "http_headers": {"User-Agent": self.get_random_user_agent()},
+            "sleep_interval": 3,
+            "max_sleep_interval": 8,
+            "sleep_interval_requests": 2,
+            "retries": 3,
+            "fragment_retries": 3,
+            "format": format_selector,
+            "merge_output_format": "mp4",
+        }
+        if INSTAGRAM_COOKIES_FILE and os.path.isfile(INSTAGRAM_COOKIES_FILE):
+            options["cookiefile"] = INSTAGRAM_COOKIES_FILE
+        return options
 
     def get_instaloader_instance(self, temp_dir):
         """Get or create instaloader instance with session reuse."""
         if self._instaloader_instance is None:
+            import instaloader
+
             self._instaloader_instance = instaloader.Instaloader(
                 dirname_pattern=temp_dir,
                 filename_pattern="instagram_{shortcode}",
@@ -465,19 +411,10 @@ class InstagramHandler(BaseHandler):
         logger.info("Attempting download with instaloader")
 
         try:
-            # Rate limiting - wait at least 10 seconds between requests
-            import time
-
-            current_time = time.time()
-            time_since_last = current_time - self._last_request_time
-            if time_since_last < 10:
-                wait_time = 10 - time_since_last
-                logger.info(f"Rate limiting: waiting {wait_time:.1f} seconds")
-                await asyncio.sleep(wait_time)
-
-            self._last_request_time = time.time()
+            await rate_limiter.acquire(message)
 
-            with tempfile.TemporaryDirectory() as temp_dir:
+            with await scratch_space.acquire("instaloader-") as scratch:
+                temp_dir = scratch.path
                 # Get reusable instaloader instance
                 L = self.get_instaloader_instance(temp_dir)
 
@@ -489,10 +426,9 @@ class InstagramHandler(BaseHandler):
                 shortcode = shortcode_match.group(1)
                 logger.info(f"Downloading shortcode: {shortcode}")
 
-                # Add additional delay before request
-                await asyncio.sleep(random.uniform(2, 5))
-
                 # Download the post
+                import instaloader
+
                 post = instaloader.Post.from_shortcode(L.context, shortcode)
                 L.download_post(post, target=temp_dir)
 
@@ -506,29 +442,23 @@ class InstagramHandler(BaseHandler):
                 file_size_kb = os.path.getsize(video_path) / 1024
                 logger.info(f"Instaloader downloaded video: {file_size_kb:.2f}KB")
 
-                # Check file size and send
-                if file_size_kb <= self.MAX_FILE_SIZE_KB:
-                    await update.message.chat.send_video(
-                        video=open(video_path, "rb"),
-                        caption=self._format_caption(sender_name, instagram_link),
-                        parse_mode="HTML",
-                        supports_streaming=True,
-                    )
-                    await delete_message(update)
+                # Oversized videos are transcoded to fit by _send_media
+                sent = await self._send_media(
+                    update,
+                    MediaFile(video_path, cleanup_dir=scratch),
+                    self._format_caption(sender_name, instagram_link),
+                    url=message,
+                    supports_streaming=True,
+                )
+                if sent:
                     logger.info("Video sent successfully via instaloader")
-                    return True
-                else:
-                    logger.warning(f"Instaloader video too large: {file_size_kb:.2f}KB")
-                    return False
+                return sent
 
         except Exception as e:
             logger.error(f"Instaloader download failed: {str(e)}")
+            if type(e).__name__ == "TooManyRequestsException":
+                rate_limiter.report(message, 429)
             # Reset instance on failure to get fresh session
             self._instaloader_instance = None
             return False
 
-    async def cleanup(self):
-        """Cleanup session resources"""
-        if self.session and not self.session.closed:
-            await self.session.close()
-            self.session = None
@@ -1,13 +1,19 @@
-import io
 import os
 import re
-import subprocess
-import tempfile
-import aiohttp
+import asyncio
 import logging
 
 from telegram import Update
-from utils import delete_message
+from downloader import run_ytdlp
+from ytdlp_pool import ytdlp_pool
+from format_probe import format_probe
+from transcoder import MAX_UPLOAD_SIZE
+from http_client import get_session, request_timeout
+from rate_limiter import rate_limiter
+from scratch import scratch_space
+from media_buffer import MediaBuffer, MediaFile
+from relay import MediaStream, fetch_media
+from strategies import run_strategies
 from . import BaseHandler
 
 logger = logging.getLogger(__name__)
@@ -18,10 +24,14 @@ TIKTOK_URL_PATTERN = re.compile(
     re.IGNORECASE
 )
 
+TIKWM_API = os.getenv("TIKWM_API", "https://tikwm.com/api/")
+
 USER_AGENT = "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1"
 
 
 class TikTokHandler(BaseHandler):
+    URL_PATTERN = TIKTOK_URL_PATTERN
+
     def __init__(self):
         self.TIKTOK_LINKS = ["https://www.tiktok.com/", "https://vm.tiktok.com/", "https://vt.tiktok.com/"]
 
@@ -33,46 +43,76 @@ class TikTokHandler(BaseHandler):
         match = TIKTOK_URL_PATTERN.search(message)
         return match.group(0).rstrip(".,;:!?)") if match else None
 
-    async def _download_via_api(self, url: str) -> bytes | None:
-        """Get video URL from tikwm API, download with browser User-Agent, return bytes."""
+    @staticmethod
+    def _pick_play_url(data: dict) -> str:
+        """The HD variant from tikwm's response if its reported size fits the upload limit, else the SD one."""
+        hd_size = data.get("hd_size") or 0
+        if data.get("hdplay") and 0 < hd_size <= MAX_UPLOAD_SIZE:
+            return data["hdplay"]
+        return data["play"]
+
+    async def _download_via_api(self, url: str) -> MediaBuffer | MediaStream | None:
+        """Get video URL from tikwm API and fetch it with browser User-Agent (see relay.fetch_media)."""
         try:
-            api_url = "https://tikwm.com/api/"
             params = {"url": url}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(api_url, params=params, timeout=15) as response:
-                    data = await response.json()
+            session = await get_session()
+            await rate_limiter.acquire(TIKWM_API)
+            async with session.get(TIKWM_API, params=params, timeout=request_timeout(15)) as response:
+                rate_limiter.report(TIKWM_API, response.status, response.headers.get("Retry-After"))
+                data = await response.json()
 
             if data.get("code") != 0 or not data.get("data", {}).get("play"):
                 logger.debug("tikwm API returned no play URL: %s", data.get("msg", data))
                 return None
 
-            video_url = data["data"]["play"]
+            video_url = self._pick_play_url(data["data"])
             headers = {"User-Agent": USER_AGENT, "Referer": "https://www.tiktok.com/"}
-            async with aiohttp.ClientSession() as session:
-                async with session.get(video_url, headers=headers, timeout=30) as resp:
-                    if resp.status != 200:
-                        logger.warning("TikTok CDN returned status %s", resp.status)
-                        return None
-                    return await resp.read()
+            return await fetch_media(video_url, headers, "TikTok CDN")
         except Exception as e:
             logger.warning("API download failed: %s", e)
             return None
 
-    def _download_via_ytdlp(self, url: str) -> bytes | None:
-        """Download video using yt-dlp, return bytes or None."""
+    async def _download_via_ytdlp(self, url: str) -> MediaBuffer | None:
+        """Stream video from yt-dlp stdout into a MediaBuffer, return it or None."""
+        buffer = MediaBuffer()
         try:
-            process = subprocess.run(
-                ["yt-dlp", "-o", "-", "--format", "best", url],
-                capture_output=True,
-                timeout=60,
-                check=False,
-            )
-            if process.stdout and len(process.stdout) > 0:
-                return process.stdout
-        except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+            # Streaming to stdout can't merge, so only muxed formats qualify
+            fmt = await format_probe.selector(url, muxed_only=True)
+            await run_ytdlp(["-o", "-", "--format", fmt, url], timeout=60, stdout=buffer)
+            if buffer:
+                return buffer
+        except (asyncio.TimeoutError, FileNotFoundError) as e:
             logger.debug("yt-dlp fallback: %s", e)
         except Exception as e:
             logger.warning("yt-dlp download failed: %s", e)
+        except BaseException:
+            buffer.close()
+            raise
+        buffer.close()
+        return None
+
+    async def _download_via_ytdlp_file(self, url: str) -> MediaFile | None:
+        """Download video with yt-dlp to a temp file (for large videos), return it or None."""
+        fmt = await format_probe.selector(url, muxed_only=True)
+        if ytdlp_pool.enabled:
+            # Warm in-process yt-dlp, no CLI start-up per attempt
+            try:
+                return await ytdlp_pool.download(url, {"format": fmt}, timeout=90)
+            except Exception as e:
+                logger.warning("yt-dlp temp file fallback failed: %s", e)
+                return None
+        scratch = await scratch_space.acquire("tiktok-")
+        output_path = os.path.join(scratch.path, "tiktok_video.mp4")
+        try:
+            await run_ytdlp(["-o", output_path, "--format", fmt, url], timeout=90)
+            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                return MediaFile(output_path, cleanup_dir=scratch)
+        except Exception as e:
+            logger.warning("yt-dlp temp file fallback failed: %s", e)
+        except BaseException:
+            scratch.close()
+            raise
+        scratch.close()
         return None
 
     async def handle(self, update: Update, message: str, sender_name: str) -> None:
@@ -82,63 +122,22 @@ class TikTokHandler(BaseHandler):
             return
 
         tiktok_link = f'<a href="{url}">🎵 TikTok</a>'
+        caption = self._format_caption(sender_name, tiktok_link)
 
         try:
-            # 1. Try tikwm API + download (Telegram can't fetch TikTok CDN URLs directly)
-            video_bytes = await self._download_via_api(url)
-            if video_bytes:
-                video_io = io.BytesIO(video_bytes)
-                video_io.seek(0)
-                await update.message.chat.send_video(
-                    video=video_io,
-                    caption=self._format_caption(sender_name, tiktok_link),
-                    parse_mode="HTML",
-                )
-                await delete_message(update)
-                return
-
-            # 2. Fallback: yt-dlp
-            video_bytes = self._download_via_ytdlp(url)
-            if video_bytes:
-                video_io = io.BytesIO(video_bytes)
-                video_io.seek(0)
-                await update.message.chat.send_video(
-                    video=video_io,
-                    caption=self._format_caption(sender_name, tiktok_link),
-                    parse_mode="HTML",
-                )
-                await delete_message(update)
-                return
-
-            # 3. Last resort: yt-dlp to temp file (for large videos)
-            output_path = None
-            try:
-                temp_dir = tempfile.mkdtemp()
-                output_path = os.path.join(temp_dir, "tiktok_video.mp4")
-                subprocess.run(
-                    ["yt-dlp", "-o", output_path, "--format", "best", url],
-                    capture_output=True,
-                    text=True,
-                    timeout=90,
-                    check=False,
-                )
-                if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                    with open(output_path, "rb") as f:
-                        await update.message.chat.send_video(
-                            video=f,
-                            caption=self._format_caption(sender_name, tiktok_link),
-                            parse_mode="HTML",
-                        )
-                    await delete_message(update)
-                    return
-            except Exception as e:
-                logger.warning("yt-dlp temp file fallback failed: %s", e)
-            finally:
-                if output_path and os.path.exists(output_path):
-                    try:
-                        os.remove(output_path)
-                    except OSError:
-                        pass
-
+            await self._handle_once(update, url, caption, lambda: self._download_and_send(update, url, caption))
         except Exception as e:
             logger.error("TikTok handler failed: %s", e, exc_info=True)
+
+    async def _download_and_send(self, update: Update, url: str, caption: str) -> bool:
+        result = await run_strategies([
+            # tikwm API + download (Telegram can't fetch TikTok CDN URLs directly)
+            ("tikwm", lambda: self._download_via_api(url)),
+            ("yt-dlp", lambda: self._download_via_ytdlp(url)),
+            # yt-dlp to temp file (for large videos)
+            ("yt-dlp-file", lambda: self._download_via_ytdlp_file(url)),
+        ], platform=self.platform)
+        if result is None:
+            return False
+        _, media = result
+        return await self._send_media(update, media, caption, url)
@@ -0,0 +1,95 @@
+import os
+import asyncio
+import logging
+import aiohttp
+from deadline import budget
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 30
+
+# Hosts to open TLS connections to at startup (comma separated, empty disables warm-up)
+HTTP_WARMUP_URLS = [
+    url.strip()
+    for url in os.getenv("HTTP_WARMUP_URLS", "https://tikwm.com/,https://reelsaver.vercel.app/").split(",")
+    if url.strip()
+]
+
+
+class HttpClient:
+    """
+    Application-wide aiohttp session with a tuned connection pool: per-host
+    connection limits, DNS cache and keep-alive, so handlers stop paying TCP and
+    TLS handshakes on every video. Started and closed with the PTB Application.
+    """
+
+    def __init__(self, limit: int = HTTP_POOL_LIMIT, limit_per_host: int = HTTP_POOL_LIMIT_PER_HOST,
+                 dns_cache_ttl: int = HTTP_DNS_CACHE_TTL, keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+                 warmup_urls: list[str] | None = None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.warmup_urls = HTTP_WARMUP_URLS if warmup_urls is None else warmup_urls
+        self._session = None
+        self._warmup_task = None
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, cookie_jar=aiohttp.CookieJar())
+
+    async def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    async def start(self, warm_up: bool = True) -> None:
+        await self.session()
+        if warm_up and self.warmup_urls:
+            # Warm-up runs in the background so it never delays startup
+            self._warmup_task = asyncio.ensure_future(self.warm_up(self.warmup_urls))
+
+    async def warm_up(self, urls: list[str]) -> None:
+        """Open pooled keep-alive connections to `urls` ahead of the first real request."""
+        session = await self.session()
+
+        async def touch(url):
+            try:
+                async with session.head(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                    logger.debug("Warmed up connection to %s (status %s)", url, resp.status)
+            except Exception as e:
+                logger.debug("Warm-up of %s failed: %s", url, e)
+
+        await asyncio.gather(*(touch(url) for url in urls))
+
+    async def close(self) -> None:
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+            self._warmup_task = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+http_client = HttpClient()
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the shared application-wide aiohttp session."""
+    return await http_client.session()
+
+
+def request_timeout(total: float | None = None) -> aiohttp.ClientTimeout:
+    """Timeout for one request (including reading the body): `total` seconds, capped by the update's deadline."""
+    return aiohttp.ClientTimeout(total=budget(total), sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
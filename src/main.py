@@ -1,6 +1,17 @@
 import os
+import asyncio
 from dotenv import load_dotenv
 from utils import randomize_status, load_handlers
+from http_client import http_client
+from ytdlp_pool import ytdlp_pool
+from capabilities import capabilities
+from chat_state import chat_states
+from scratch import scratch_space
+from router import Router
+from scheduler import scheduler, QueueFullError
+from deadline import Deadline, new_deadline
+from webhook import run_webhook
+from metrics import metrics_server, dispatch_seconds, url_extraction_seconds, updates_total, jobs_total
 import logging
 
 from telegram import Update
@@ -19,37 +30,94 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 TOKEN = os.getenv('TELEGRAM_TOKEN')
+# "polling" (default) or "webhook"
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+# Number of updates processed concurrently in webhook mode
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+# Construct handlers on first use instead of at import time ("0" to build them eagerly)
+LAZY_HANDLERS = os.getenv('LAZY_HANDLERS', '1') == '1'
 
 if not TOKEN:
     raise ValueError("TELEGRAM_TOKEN environment variable is not set")
 
-# Initialize all handlers
-all_handlers = load_handlers()
+# Initialize all handlers and the URL router built from their patterns
+all_handlers = load_handlers(lazy=LAZY_HANDLERS)
+router = Router(all_handlers)
 
 async def handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message is None or update.message.text is None:
         return
 
+    # The update's latency budget, shared by every job it starts
+    deadline = new_deadline()
+    with dispatch_seconds.time():
+        await dispatch(update, deadline)
+
+async def dispatch(update: Update, deadline: Deadline | None = None) -> None:
     message = update.message.text
+    # Single pass over the message; plain chat without links stops here
+    with url_extraction_seconds.time():
+        routes = router.route(message)
+    updates_total.inc(routed="true" if routes else "false")
+    if not routes:
+        return
+
     sender = update.message.from_user
     chat_id = update.message.chat_id
     user_prefix = await randomize_status(sender, chat_id)
 
     try:
-        # Try to handle the message with each handler
-        for handler_instance in all_handlers:
-            if handler_instance.can_handle(message):
-                await handler_instance.handle(update, message, user_prefix)
-                return
+        # Downloads run on the job scheduler so this update callback returns immediately
+        for handler_instance, url in routes:
+            platform = getattr(handler_instance, "platform", type(handler_instance).__name__)
+            scheduler.submit(
+                chat_id,
+                platform,
+                lambda h=handler_instance, u=url: h.handle(update, u, user_prefix),
+                deadline=deadline,
+            )
+            jobs_total.inc(platform=platform, outcome="queued")
 
+    except QueueFullError as e:
+        jobs_total.inc(platform=platform, outcome="rejected")
+        logger.warning(f"Dropping {url} from chat {chat_id}: {e}")
     except Exception as e:
         logger.error(f"Error processing message: {e}", exc_info=True)
 
+async def on_startup(app) -> None:
+    # Open the shared HTTP connection pool (and warm up upstream connections)
+    await http_client.start()
+    # Pre-warm the in-process yt-dlp workers
+    await ytdlp_pool.start()
+    # Probe yt-dlp/ffmpeg in the background (skipped when cached on disk)
+    capabilities.start()
+    # Remove scratch directories left by crashed runs in the background
+    scratch_space.start()
+    # Restore user streaks and snapshot them periodically (if CHAT_STATE_SNAPSHOT_PATH is set)
+    chat_states.start()
+    # Local /metrics endpoint for Prometheus
+    await metrics_server.start()
+
+async def on_shutdown(app) -> None:
+    await scheduler.stop()
+    await http_client.close()
+    await ytdlp_pool.close()
+    await capabilities.close()
+    await scratch_space.close()
+    await chat_states.close()
+    await metrics_server.stop()
+
 def main():
     # Initialize and run the bot
-    app = ApplicationBuilder().token(TOKEN).build()
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handler))
-    app.run_polling()
+    builder = ApplicationBuilder().token(TOKEN).post_init(on_startup).post_shutdown(on_shutdown)
+    if BOT_MODE == 'webhook':
+        app = builder.concurrent_updates(CONCURRENT_UPDATES).build()
+        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handler))
+        asyncio.run(run_webhook(app))
+    else:
+        app = builder.build()
+        app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handler))
+        app.run_polling()
 
 if __name__ == '__main__':
     main()
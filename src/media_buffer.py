@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import logging
+
+from telegram import InputFile
+
+logger = logging.getLogger(__name__)
+
+MEDIA_BUFFER_MAX_MEMORY = int(os.getenv("MEDIA_BUFFER_MAX_MEMORY", str(8 * 1024 * 1024)))
+MEDIA_CHUNK_SIZE = 64 * 1024
+
+
+class MediaBuffer:
+    """
+    Downloaded media held in a SpooledTemporaryFile: kept in memory up to
+    `max_memory` bytes and transparently spilled to disk above that, so a few
+    concurrent large downloads don't blow up RSS.
+    """
+
+    def __init__(self, max_memory: int = MEDIA_BUFFER_MAX_MEMORY):
+        self.max_memory = max_memory
+        self.size = 0
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_memory: int = MEDIA_BUFFER_MAX_MEMORY) -> "MediaBuffer":
+        buffer = cls(max_memory=max_memory)
+        buffer.write(data)
+        return buffer
+
+    @property
+    def on_disk(self) -> bool:
+        return self._file._rolled
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    async def read_from(self, reader, chunk_size: int = MEDIA_CHUNK_SIZE) -> int:
+        """
+        Stream chunks from `reader` (an asyncio or aiohttp StreamReader, anything
+        with an async `read(n)`) into the buffer until EOF. Returns bytes written.
+        """
+        written = 0
+        while True:
+            chunk = await reader.read(chunk_size)
+            if not chunk:
+                return written
+            self.write(chunk)
+            written += len(chunk)
+
+    def getvalue(self) -> bytes:
+        self._file.seek(0)
+        return self._file.read()
+
+    def save_to(self, path: str) -> None:
+        """Copy the buffer's contents to a file at `path` without loading it all into memory."""
+        self._file.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(self._file, f, MEDIA_CHUNK_SIZE)
+
+    def input_file(self, filename: str = "video.mp4") -> InputFile:
+        """
+        Wrap the buffer for send_video. The file handle is handed to the HTTP
+        client as-is, so the upload streams from the buffer without another copy.
+        """
+        self._file.seek(0)
+        return InputFile(self._file, filename=filename, read_file_handle=False)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __enter__(self) -> "MediaBuffer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class MediaFile:
+    """
+    Downloaded media already on disk (e.g. written by yt-dlp -o). Same interface
+    as MediaBuffer; closing it deletes the file and, if given, its scratch directory
+    (a path or a scratch.ScratchDir).
+    With `delete_on_close=False` (a shared file, e.g. in the media cache) the file
+    is opened right away and left in place; the open handle keeps it readable
+    even if another process removes it.
+    """
+
+    def __init__(self, path: str, cleanup_dir=None, delete_on_close: bool = True):
+        self.path = str(path)
+        self.cleanup_dir = cleanup_dir
+        self.delete_on_close = delete_on_close
+        self._handle = None if delete_on_close else open(self.path, "rb")
+        self.size = os.fstat(self._handle.fileno()).st_size if self._handle else os.path.getsize(self.path)
+
+    def input_file(self, filename: str = "video.mp4") -> InputFile:
+        if self._handle is None:
+            self._handle = open(self.path, "rb")
+        self._handle.seek(0)
+        return InputFile(self._handle, filename=filename, read_file_handle=False)
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        if not self.delete_on_close:
+            return
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        if isinstance(self.cleanup_dir, str):
+            shutil.rmtree(self.cleanup_dir, ignore_errors=True)
+        elif self.cleanup_dir is not None:
+            # A ScratchDir: removing it also returns its share of the scratch quota
+            self.cleanup_dir.close()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __enter__(self) -> "MediaFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,188 @@
+import os
+import time
+import uuid
+import shutil
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+
+from canonical import media_key
+from media_buffer import MediaFile, MEDIA_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Directory holding cached media; empty disables the cache
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "media_cache")
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(1024 ** 3)))
+# Unfinished writes older than this (seconds) are from a crashed process
+STALE_TMP_AGE = 3600
+SQLITE_TIMEOUT = 10
+
+
+class MediaCache:
+    """
+    Downloaded media on disk, so a failed upload or another deployment on
+    the same host doesn't fetch the same video again.
+
+    Files are stored once per content hash under `blobs/`; an SQLite index
+    maps media keys (see canonical.media_key) to hashes and tracks sizes and last use. The least
+    recently used blobs are evicted once the total exceeds `max_bytes`.
+    Blobs are written to `tmp/` and renamed into place, so readers never see
+    a partial file, and the index runs in WAL mode so several processes can
+    share the directory.
+    """
+
+    def __init__(self, root: str = MEDIA_CACHE_DIR, max_bytes: int = MEDIA_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._conn = None
+        # get() and put() run in worker threads; one connection, one transaction at a time
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root) and self.max_bytes > 0
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", f"{digest}.mp4")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.join(self.root, "blobs"), exist_ok=True)
+            os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+            self._sweep_tmp()
+            conn = sqlite3.connect(os.path.join(self.root, "index.sqlite3"), timeout=SQLITE_TIMEOUT,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "hash TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, hash TEXT NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def _sweep_tmp(self) -> None:
+        cutoff = time.time() - STALE_TMP_AGE
+        tmp_dir = os.path.join(self.root, "tmp")
+        for name in os.listdir(tmp_dir):
+            path = os.path.join(tmp_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    async def get(self, url: str) -> MediaFile | None:
+        """Cached media for `url` as a MediaFile that leaves the blob in place when closed."""
+        if not self.enabled:
+            return None
+        try:
+            # The index lock may be held by a put() in a worker thread; don't wait for it on the loop
+            return await asyncio.to_thread(self._get, media_key(url))
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Media cache lookup failed: %s", e)
+            return None
+
+    def _get(self, key: str) -> MediaFile | None:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT hash FROM urls WHERE url = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            try:
+                media = MediaFile(self._blob_path(row[0]), delete_on_close=False)
+            except OSError:
+                # Evicted by another process (or deleted by hand) since the index was read
+                conn.execute("DELETE FROM urls WHERE url = ?", (key,))
+                return None
+            conn.execute("UPDATE blobs SET last_used = ? WHERE hash = ?", (time.time(), row[0]))
+        return media
+
+    async def put(self, url: str, media) -> None:
+        """Store `media` (a MediaBuffer or MediaFile) for `url`; it stays open and owned by the caller."""
+        if not self.enabled or not media or len(media) > self.max_bytes:
+            return
+        try:
+            await asyncio.to_thread(self._put, media_key(url), media)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Media cache store failed for %s: %s", url, e)
+
+    def _put(self, key: str, media) -> None:
+        with self._lock:
+            conn = self._connect()
+        tmp_path = os.path.join(self.root, "tmp", f"{os.getpid()}-{uuid.uuid4().hex}")
+        try:
+            self._write_tmp(media, tmp_path)
+            digest = _sha256(tmp_path)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                # BEGIN IMMEDIATE takes the write lock, so placing the blob and evicting
+                # are serialized with other processes sharing the directory
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    os.replace(tmp_path, self._blob_path(digest))
+                    conn.execute("INSERT OR REPLACE INTO blobs (hash, size, last_used) VALUES (?, ?, ?)",
+                                 (digest, size, time.time()))
+                    conn.execute("INSERT OR REPLACE INTO urls (url, hash) VALUES (?, ?)", (key, digest))
+                    self._evict(conn)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def _write_tmp(media, tmp_path: str) -> None:
+        path = getattr(media, "path", None)
+        if path is None:
+            media.save_to(tmp_path)
+            return
+        try:
+            # Same filesystem: share the inode instead of copying the bytes
+            os.link(path, tmp_path)
+        except OSError:
+            shutil.copyfile(path, tmp_path)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        evicted = 0
+        for digest, size in conn.execute("SELECT hash, size FROM blobs ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+            conn.execute("DELETE FROM urls WHERE hash = ?", (digest,))
+            try:
+                # Readers that already opened the blob keep their handle
+                os.remove(self._blob_path(digest))
+            except OSError:
+                pass
+            total -= size
+            evicted += 1
+        if evicted:
+            logger.debug("Evicted %d cached videos", evicted)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(MEDIA_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+media_cache = MediaCache()
@@ -0,0 +1,210 @@
+import os
+import time
+import logging
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+# 0 disables the /metrics endpoint; metrics are still collected
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 10 * 1024 ** 2, 20 * 1024 ** 2, 50 * 1024 ** 2)
+MEMORY_BUCKETS = tuple(mib * 1024 ** 2 for mib in (16, 32, 64, 128, 256, 512, 1024, 2048, 4096))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for key in sorted(self._values):
+            lines.extend(self._render_series(list(zip(self.labelnames, key)), self._values[key]))
+        return lines
+
+    @abstractmethod
+    def _render_series(self, labels: list, value) -> list[str]:
+        pass
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _render_series(self, labels, value):
+        return [f"{self.name}_total{_format_labels(labels)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            # per-bucket (non-cumulative) counts, sum
+            series = self._values[key] = [[0] * len(self.buckets), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the `with` body (works around awaits too)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def sum(self, **labels) -> float:
+        series = self._values.get(self._key(labels))
+        return series[1] if series else 0.0
+
+    def _render_series(self, labels, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds counters and histograms and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+updates_total = registry.counter(
+    "bot_updates", "Incoming messages, by whether they contained a supported link", ("routed",))
+dispatch_seconds = registry.histogram(
+    "bot_dispatch_seconds", "Time spent in the update callback before jobs are queued")
+url_extraction_seconds = registry.histogram(
+    "bot_url_extraction_seconds", "Time spent routing a message to handlers")
+jobs_total = registry.counter(
+    "bot_jobs", "Links submitted to the job scheduler", ("platform", "outcome"))
+backend_attempt_seconds = registry.histogram(
+    "bot_backend_attempt_seconds", "Duration of each download backend attempt",
+    ("platform", "backend", "outcome"))
+download_bytes = registry.histogram(
+    "bot_download_bytes", "Size of successful downloads", ("platform", "backend"), buckets=SIZE_BUCKETS)
+transcode_seconds = registry.histogram(
+    "bot_transcode_seconds", "Duration of ffmpeg transcodes", ("platform", "outcome"))
+subprocess_cpu_seconds = registry.histogram(
+    "bot_subprocess_cpu_seconds", "CPU time of external tools (yt-dlp, ffmpeg) and their children",
+    ("tool", "outcome"))
+subprocess_rss_bytes = registry.histogram(
+    "bot_subprocess_rss_bytes", "Peak resident memory of external tools and their children", ("tool",),
+    buckets=MEMORY_BUCKETS)
+upload_seconds = registry.histogram(
+    "bot_upload_seconds", "Duration of send_video calls; source is upload, relay, url or file_id",
+    ("platform", "source", "outcome"))
+delete_message_seconds = registry.histogram(
+    "bot_delete_message_seconds", "Duration of deleting the original message", ("outcome",))
+
+
+class MetricsServer:
+    """Serves the registry on GET /metrics for a local Prometheus scraper."""
+
+    def __init__(self, metrics: MetricsRegistry = registry, listen: str = METRICS_LISTEN, port: int = METRICS_PORT):
+        self.metrics = metrics
+        self.listen = listen
+        self.port = port
+        self._runner = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        return app
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.metrics.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self) -> None:
+        if not self.port:
+            return
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info("Metrics available on http://%s:%s/metrics", self.listen, self.port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics_server = MetricsServer()
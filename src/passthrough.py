@@ -0,0 +1,71 @@
+import os
+import time
+import logging
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Let Telegram fetch media by URL when a handler can resolve a direct link, `1` or `0`
+PASSTHROUGH = os.getenv("PASSTHROUGH", "1") == "1"
+# Telegram fetches videos sent by URL only up to this size
+PASSTHROUGH_MAX_SIZE = int(os.getenv("PASSTHROUGH_MAX_SIZE", str(20 * 1024 ** 2)))
+# Seconds a domain whose URL Telegram rejected is skipped before it is tried again
+PASSTHROUGH_RETRY_AFTER = float(os.getenv("PASSTHROUGH_RETRY_AFTER", str(24 * 3600)))
+
+
+def media_domain(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+class PassthroughDomains:
+    """
+    Remembers per media domain whether Telegram's servers can fetch its URLs.
+    Unknown domains are tried. A domain becomes safe once Telegram accepts one
+    of its URLs; a rejection makes a safe domain unknown again (the URL itself
+    may have been the problem) and an unknown one unsafe for `retry_after`
+    seconds, during which its media is downloaded and uploaded as usual.
+    """
+
+    def __init__(self, enabled: bool = PASSTHROUGH, retry_after: float = PASSTHROUGH_RETRY_AFTER,
+                 clock=time.monotonic):
+        self.enabled = enabled
+        self.retry_after = retry_after
+        self.clock = clock
+        self._safe: set[str] = set()
+        self._rejected: dict[str, float] = {}
+
+    def allowed(self, url: str) -> bool:
+        """Whether to offer `url` to Telegram rather than downloading it."""
+        if not self.enabled:
+            return False
+        domain = media_domain(url)
+        until = self._rejected.get(domain)
+        if until is None:
+            return True
+        if until > self.clock():
+            return False
+        del self._rejected[domain]
+        return True
+
+    def accept(self, url: str) -> None:
+        domain = media_domain(url)
+        if domain not in self._safe:
+            logger.info("Telegram fetched media from %s; sending its URLs directly", domain)
+        self._safe.add(domain)
+        self._rejected.pop(domain, None)
+
+    def reject(self, url: str) -> None:
+        domain = media_domain(url)
+        if domain in self._safe:
+            self._safe.discard(domain)
+            return
+        logger.info("Telegram could not fetch media from %s; downloading from it for the next %.0fs",
+                    domain, self.retry_after)
+        self._rejected[domain] = self.clock() + self.retry_after
+
+    def clear(self) -> None:
+        self._safe.clear()
+        self._rejected.clear()
+
+
+passthrough = PassthroughDomains()
@@ -0,0 +1,153 @@
+import os
+import time
+import asyncio
+import logging
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# host=requests_per_second[/burst], comma separated; a host also covers its subdomains.
+# Hosts without an entry are not limited.
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS",
+    "instagram.com=0.5/3,ddinstagram.com=1/3,tikwm.com=1/2,reelsaver.vercel.app=1/3",
+)
+# First pause after a 429/403 from a limited host; doubles while they keep coming
+RATE_LIMIT_BACKOFF = float(os.getenv("RATE_LIMIT_BACKOFF", "30"))
+RATE_LIMIT_MAX_BACKOFF = float(os.getenv("RATE_LIMIT_MAX_BACKOFF", "600"))
+
+THROTTLED_STATUSES = (403, 429)
+
+
+def parse_rate_limits(value: str) -> dict[str, tuple[float, float]]:
+    """Parse "instagram.com=0.5/3,tikwm.com=1" into {host: (rate, burst)}; burst defaults to 1."""
+    limits = {}
+    for item in value.split(","):
+        host, sep, spec = item.strip().partition("=")
+        if not sep:
+            continue
+        rate, _, burst = spec.partition("/")
+        try:
+            limits[host.strip().lower()] = (float(rate), float(burst or 1))
+        except ValueError:
+            logger.warning("Ignoring invalid rate limit %r", item)
+    return limits
+
+
+class TokenBucket:
+    """
+    `rate` requests per second with bursts of up to `burst`. A request that
+    finds a token goes straight through; the rest wait in FIFO order. After
+    a 429/403 the bucket is paused, with exponential backoff.
+    """
+
+    def __init__(self, rate: float, burst: float, backoff: float = RATE_LIMIT_BACKOFF,
+                 max_backoff: float = RATE_LIMIT_MAX_BACKOFF, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.strikes = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a request could go through, 0 if one can go now."""
+        now = self.clock()
+        self._refill(now)
+        pause = max(0.0, self.paused_until - now)
+        if self.tokens >= 1:
+            return pause
+        return max(pause, (1 - self.tokens) / self.rate)
+
+    async def acquire(self) -> float:
+        """Take a token, waiting if needed; returns the seconds waited."""
+        waited = 0.0
+        # The lock queues waiters, so the earliest caller gets the next token
+        async with self._lock:
+            while (delay := self.delay()) > 0:
+                await asyncio.sleep(delay)
+                waited += delay
+            self.tokens -= 1
+        return waited
+
+    def throttled(self, retry_after: float | None = None) -> float:
+        """Upstream pushed back: pause the bucket and return the pause in seconds."""
+        self.strikes += 1
+        pause = min(self.backoff * 2 ** (self.strikes - 1), self.max_backoff)
+        if retry_after is not None:
+            pause = min(max(pause, retry_after), self.max_backoff)
+        self.paused_until = max(self.paused_until, self.clock() + pause)
+        self.tokens = 0.0
+        return pause
+
+    def succeeded(self) -> None:
+        self.strikes = 0
+
+
+class RateLimiter:
+    """
+    Per-host token buckets shared by every handler, so concurrent downloads
+    from one upstream are paced together instead of each sleeping on its own.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, float]] | None = None, clock=time.monotonic):
+        self.limits = parse_rate_limits(RATE_LIMITS) if limits is None else limits
+        self.clock = clock
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def clear(self) -> None:
+        """Forget all buckets (and backoffs); every host starts with a full burst again."""
+        self._buckets.clear()
+
+    def _host(self, url: str) -> str | None:
+        """The configured host that `url` (or a bare host name) falls under."""
+        host = (urlsplit(url).hostname if "//" in url else url).lower()
+        while host:
+            if host in self.limits:
+                return host
+            _, _, host = host.partition(".")
+        return None
+
+    def bucket(self, url: str) -> TokenBucket | None:
+        host = self._host(url)
+        if host is None:
+            return None
+        if host not in self._buckets:
+            rate, burst = self.limits[host]
+            self._buckets[host] = TokenBucket(rate, burst, clock=self.clock)
+        return self._buckets[host]
+
+    async def acquire(self, url: str) -> None:
+        """Wait for permission to send a request to `url`'s host (immediately if it has capacity)."""
+        bucket = self.bucket(url)
+        if bucket is None:
+            return
+        waited = await bucket.acquire()
+        if waited:
+            logger.debug("Rate limited %s for %.2fs", url, waited)
+
+    def report(self, url: str, status: int, retry_after: str | None = None) -> None:
+        """Feed back an upstream response status; 429/403 pause the host."""
+        bucket = self.bucket(url)
+        if bucket is None:
+            return
+        if status in THROTTLED_STATUSES:
+            try:
+                seconds = float(retry_after) if retry_after else None
+            except ValueError:
+                seconds = None
+            pause = bucket.throttled(seconds)
+            logger.warning("%s answered %s, pausing requests to it for %.0fs", url, status, pause)
+        elif status < 400:
+            bucket.succeeded()
+
+
+rate_limiter = RateLimiter()
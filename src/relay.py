@@ -0,0 +1,159 @@
+import os
+import asyncio
+import logging
+import aiohttp
+from aiohttp.payload import AsyncIterablePayload
+
+from telegram import Message
+from telegram.error import TelegramError
+from http_client import get_session, request_timeout
+from media_buffer import MediaBuffer, MEDIA_CHUNK_SIZE
+from transcoder import MAX_UPLOAD_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Upload CDN downloads to Telegram while they are still arriving, `1` or `0`
+RELAY = os.getenv("RELAY", "1") == "1"
+# Chunks (64 KiB each) the download may run ahead of the upload before it is paused
+RELAY_BUFFER_CHUNKS = int(os.getenv("RELAY_BUFFER_CHUNKS", "16"))
+
+
+class MediaStream:
+    """
+    A CDN download that hasn't been read yet: the open response of a video
+    whose Content-Length is known and fits the upload limit. `_send_media`
+    relays its body into the upload as it arrives. Everything relayed is also
+    kept in `buffer`, which feeds the media cache and a buffered retry if the
+    relayed upload fails. Closing it releases the connection and the buffer.
+    """
+
+    def __init__(self, response: aiohttp.ClientResponse, size: int):
+        self.response = response
+        self.size = size
+        self.buffer = MediaBuffer()
+
+    @property
+    def complete(self) -> bool:
+        return self.buffer.size == self.size
+
+    async def _pump(self, queue: asyncio.Queue) -> None:
+        """Copy the body into `buffer` and `queue`; ends with None, or the error that stopped it."""
+        try:
+            while chunk := await self.response.content.read(MEDIA_CHUNK_SIZE):
+                self.buffer.write(chunk)
+                # Blocks while the upload is behind: the backpressure on the download
+                await queue.put(chunk)
+            if not self.complete:
+                raise IOError(f"download ended after {self.buffer.size} of {self.size} bytes")
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(None)
+
+    async def finish(self) -> MediaBuffer:
+        """Read whatever the relay left unread, so `buffer` holds the whole video."""
+        await self.buffer.read_from(self.response.content)
+        if not self.complete:
+            raise IOError(f"download ended after {self.buffer.size} of {self.size} bytes")
+        return self.buffer
+
+    def close(self) -> None:
+        self.response.release()
+        self.buffer.close()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __enter__(self) -> "MediaStream":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _RelayPayload(AsyncIterablePayload):
+    """A streamed part whose size is known, so the upload is sent with a Content-Length."""
+
+    def __init__(self, chunks, size: int, **kwargs):
+        super().__init__(chunks, **kwargs)
+        self._declared_size = size
+
+    @property
+    def size(self) -> int:
+        return self._declared_size
+
+
+async def fetch_media(url: str, headers: dict, source: str,
+                      max_size: int = MAX_UPLOAD_SIZE) -> MediaBuffer | MediaStream | None:
+    """
+    GET a video from a CDN. When relaying is on and the response announces a
+    size that fits `max_size`, the unread response is returned as a
+    MediaStream; otherwise the body is read into a MediaBuffer.
+    Returns None if `source` (named in logs) answers with an error status.
+    """
+    session = await get_session()
+    # Without a total timeout: a relayed body is read for as long as the upload takes
+    response = await session.get(url, headers=headers, timeout=request_timeout())
+    try:
+        if response.status != 200:
+            logger.warning("%s returned status %s", source, response.status)
+            return None
+        size = response.content_length
+        if RELAY and size and size <= max_size:
+            stream = MediaStream(response, size)
+            response = None
+            return stream
+        buffer = MediaBuffer()
+        try:
+            await buffer.read_from(response.content)
+        except BaseException:
+            buffer.close()
+            raise
+        return buffer
+    finally:
+        if response is not None:
+            response.release()
+
+
+def _form_value(value) -> str:
+    # The Bot API takes form fields as JSON scalars
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+async def relay_video(bot, chat_id, stream: MediaStream, filename: str = "video.mp4", **fields) -> Message:
+    """
+    sendVideo with the body of `stream` copied into the multipart upload while
+    it downloads. At most RELAY_BUFFER_CHUNKS chunks are held between the two.
+    `fields` are further sendVideo parameters (caption, parse_mode, ...).
+    Raises TelegramError if the Bot API rejects the upload.
+    """
+    queue = asyncio.Queue(RELAY_BUFFER_CHUNKS)
+    pump = asyncio.ensure_future(stream._pump(queue))
+
+    async def chunks():
+        while (chunk := await queue.get()) is not None:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    with aiohttp.MultipartWriter("form-data") as form:
+        for name, value in {"chat_id": chat_id, **fields}.items():
+            if value is not None:
+                form.append(_form_value(value)).set_content_disposition("form-data", name=name)
+        video = form.append_payload(_RelayPayload(chunks(), stream.size, content_type="video/mp4"))
+        video.set_content_disposition("form-data", name="video", filename=filename)
+    try:
+        session = await get_session()
+        async with session.post(f"{bot.base_url}/sendVideo", data=form, timeout=request_timeout()) as response:
+            data = await response.json(content_type=None)
+    finally:
+        pump.cancel()
+        await asyncio.gather(pump, return_exceptions=True)
+    if not data.get("ok"):
+        raise TelegramError(data.get("description") or f"sendVideo failed with status {response.status}")
+    return Message.de_json(data["result"], bot)
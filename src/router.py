@@ -0,0 +1,55 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Characters trimmed from the end of a matched URL (sentence punctuation, closing parens)
+TRAILING_PUNCTUATION = ".,;:!?)"
+
+
+class Router:
+    """
+    Dispatch table built once from the URL patterns handlers declare in
+    `URL_PATTERN`. All patterns are merged into one compiled regex, so routing
+    a message is a single scan regardless of how many platforms are loaded.
+    Handlers without a URL_PATTERN are still consulted through can_handle().
+    """
+
+    def __init__(self, handlers: list):
+        self.handlers = list(handlers)
+        self._by_group = {}
+        self._fallback = []
+        alternatives = []
+        for handler in self.handlers:
+            pattern = getattr(handler, "URL_PATTERN", None)
+            if isinstance(pattern, str):
+                pattern = re.compile(pattern)
+            if not isinstance(pattern, re.Pattern):
+                self._fallback.append(handler)
+                continue
+            group = f"h{len(alternatives)}"
+            flags = "i" if pattern.flags & re.IGNORECASE else ""
+            alternatives.append(f"(?P<{group}>(?{flags}:{pattern.pattern}))" if flags
+                                else f"(?P<{group}>{pattern.pattern})")
+            self._by_group[group] = handler
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    def route(self, message: str) -> list[tuple[object, str]]:
+        """Return every (handler, url) pair found in `message`, in order of appearance."""
+        if not message or "://" not in message:
+            return []
+
+        routes = []
+        seen = set()
+        if self._pattern is not None:
+            for match in self._pattern.finditer(message):
+                url = match.group(0).rstrip(TRAILING_PUNCTUATION)
+                if url in seen:
+                    continue
+                seen.add(url)
+                routes.append((self._by_group[match.lastgroup], url))
+
+        for handler in self._fallback:
+            if handler.can_handle(message):
+                routes.append((handler, message))
+        return routes
@@ -0,0 +1,205 @@
+import os
+import asyncio
+import itertools
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+from deadline import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "8"))
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "100"))
+SCHEDULER_OVERFLOW = os.getenv("SCHEDULER_OVERFLOW", "reject")
+# Per-platform concurrency caps, e.g. "instagram=2,tiktok=4"
+SCHEDULER_PLATFORM_LIMITS = os.getenv("SCHEDULER_PLATFORM_LIMITS", "")
+
+OVERFLOW_POLICIES = ("reject", "drop_oldest")
+
+_job_sequence = itertools.count()
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def parse_platform_limits(spec: str) -> dict[str, int]:
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            platform, limit = item.split("=", 1)
+            limits[platform.strip()] = int(limit)
+    return limits
+
+
+@dataclass
+class Job:
+    chat_id: int
+    platform: str
+    fn: Callable[[], Awaitable[None]]
+    deadline: Deadline | None = None
+    seq: int = field(default_factory=lambda: next(_job_sequence))
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+class JobScheduler:
+    """
+    Bounded job queue between main.handler and the platform handlers.
+    At most `workers` jobs run at once, each platform is additionally capped by
+    `platform_limits`, and queued jobs are taken round-robin across chats so
+    one chat pasting many links can't starve the others. When `max_queue` jobs
+    are waiting, new jobs are rejected or the oldest waiting job is dropped,
+    depending on `overflow`.
+    """
+
+    def __init__(self, workers: int = SCHEDULER_WORKERS, platform_limits: dict[str, int] | None = None,
+                 max_queue: int = SCHEDULER_MAX_QUEUE, overflow: str = SCHEDULER_OVERFLOW):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.workers = workers
+        self.platform_limits = (
+            parse_platform_limits(SCHEDULER_PLATFORM_LIMITS) if platform_limits is None else platform_limits
+        )
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self._queues: dict[int, deque[Job]] = {}
+        self._queued = 0
+        self._running: dict[asyncio.Task, Job] = {}
+        self._running_by_platform: dict[str, int] = {}
+        self._running_by_chat: dict[int, int] = {}
+        # When each chat with queued or running jobs was last served
+        self._served: dict[int, int] = {}
+        self._serve_counter = itertools.count()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def submit(self, chat_id: int, platform: str, fn: Callable[[], Awaitable[None]],
+               deadline: Deadline | None = None) -> asyncio.Future:
+        """
+        Queue `fn` for `chat_id` and return a future resolved when it finishes.
+        With a `deadline`, `fn` runs with it as the current deadline and is
+        cancelled when it expires; a job whose deadline passed while it was
+        queued is dropped without running.
+        Raises QueueFullError when the queue is full and the policy is "reject".
+        """
+        if self._queued >= self.max_queue:
+            if self.overflow == "reject":
+                raise QueueFullError(f"Job queue is full ({self.max_queue} waiting)")
+            self._drop_oldest()
+
+        job = Job(chat_id, platform, fn, deadline)
+        self._queues.setdefault(chat_id, deque()).append(job)
+        self._queued += 1
+        self._idle.clear()
+        self._dispatch()
+        return job.future
+
+    async def join(self) -> None:
+        """Wait until no jobs are queued or running."""
+        await self._idle.wait()
+
+    async def stop(self) -> None:
+        """Drop queued jobs and cancel running ones."""
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()
+        self._queued = 0
+        self._served.clear()
+        tasks = list(self._running)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._idle.set()
+
+    def _drop_oldest(self) -> None:
+        oldest = min(
+            (queue[0] for queue in self._queues.values() if queue),
+            key=lambda job: job.seq,
+        )
+        self._remove(oldest)
+        oldest.future.cancel()
+        logger.warning("Job queue full, dropped oldest job for chat %s", oldest.chat_id)
+
+    def _remove(self, job: Job) -> None:
+        queue = self._queues[job.chat_id]
+        queue.remove(job)
+        if not queue:
+            del self._queues[job.chat_id]
+            if job.chat_id not in self._running_by_chat:
+                self._served.pop(job.chat_id, None)
+        self._queued -= 1
+
+    def _has_capacity(self, platform: str) -> bool:
+        limit = self.platform_limits.get(platform)
+        return limit is None or self._running_by_platform.get(platform, 0) < limit
+
+    def _pick(self) -> Job | None:
+        # Round-robin: the chat served longest ago (or never) goes first
+        for chat_id in sorted(self._queues, key=lambda c: self._served.get(c, -1)):
+            for job in self._queues[chat_id]:
+                if self._has_capacity(job.platform):
+                    self._remove(job)
+                    self._served[chat_id] = next(self._serve_counter)
+                    return job
+        return None
+
+    def _dispatch(self) -> None:
+        while len(self._running) < self.workers:
+            job = self._pick()
+            if job is None:
+                break
+            self._running_by_platform[job.platform] = self._running_by_platform.get(job.platform, 0) + 1
+            self._running_by_chat[job.chat_id] = self._running_by_chat.get(job.chat_id, 0) + 1
+            task = asyncio.ensure_future(self._run(job))
+            self._running[task] = job
+            task.add_done_callback(self._on_done)
+        if not self._running and not self._queued:
+            self._idle.set()
+
+    async def _run(self, job: Job) -> None:
+        try:
+            if job.deadline is None:
+                await job.fn()
+            elif job.deadline.expired:
+                logger.warning("Job for chat %s (%s) expired while queued", job.chat_id, job.platform)
+                job.future.set_result(False)
+                return
+            else:
+                await job.deadline.run(job.fn())
+        except DeadlineExceeded:
+            logger.warning("Job for chat %s (%s) ran out of time and was cancelled", job.chat_id, job.platform)
+            if not job.future.done():
+                job.future.set_result(False)
+            return
+        except Exception as e:
+            logger.error("Job for chat %s (%s) failed: %s", job.chat_id, job.platform, e, exc_info=True)
+            if not job.future.done():
+                job.future.set_result(False)
+            return
+        if not job.future.done():
+            job.future.set_result(True)
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        job = self._running.pop(task)
+        self._running_by_platform[job.platform] -= 1
+        self._running_by_chat[job.chat_id] -= 1
+        if not self._running_by_chat[job.chat_id]:
+            del self._running_by_chat[job.chat_id]
+            if job.chat_id not in self._queues:
+                self._served.pop(job.chat_id, None)
+        if task.cancelled() and not job.future.done():
+            job.future.cancel()
+        self._dispatch()
+
+
+scheduler = JobScheduler()
@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Root of per-job scratch directories; point it at a tmpfs (e.g. /dev/shm/bot-scratch) to keep them in RAM
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "bot-scratch"))
+# Bytes of scratch space jobs may reserve in total; 0 means unlimited
+SCRATCH_QUOTA = int(os.getenv("SCRATCH_QUOTA", str(2 * 1024 ** 3)))
+# Bytes reserved for each job's directory (a download, or a transcode's input and output)
+SCRATCH_JOB_RESERVE = int(os.getenv("SCRATCH_JOB_RESERVE", str(128 * 1024 ** 2)))
+
+# <prefix><owner pid>-<mkdtemp suffix>
+_OWNER_PATTERN = re.compile(r"(\d+)-\w+$")
+# Seconds file timestamps may lag time.time() (coarse filesystem clocks; 2s on FAT)
+_MTIME_SLACK = 2.0
+
+
+def _running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ScratchDir:
+    """A job's private directory; `close()` removes it and returns its reservation to the quota."""
+
+    def __init__(self, space: "ScratchSpace", path: str, reserved: int):
+        self.space = space
+        self.path = path
+        self.reserved = reserved
+        self.closed = False
+
+    def grow(self, extra: int) -> None:
+        """
+        Change this directory's reservation by `extra` bytes (negative gives it
+        back). Never waits: the job already holds a place in the quota, and
+        waiting for more while holding it could deadlock with other such jobs.
+        """
+        self.space._grow(self, extra)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.space._release(self)
+
+    def __enter__(self) -> "ScratchDir":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ScratchSpace:
+    """
+    Hands out per-job scratch directories under `root`. Each job reserves
+    `reserve` bytes of `quota` when its directory is created; once the quota
+    is taken, further jobs wait (in arrival order) until a directory is
+    closed. A single job is always let in, even if it alone exceeds the quota.
+
+    Directory names carry the creating process's PID, so `sweep()` removes
+    what crashed processes left behind without touching directories of other
+    live processes sharing the root.
+    """
+
+    def __init__(self, root: str = SCRATCH_DIR, quota: int = SCRATCH_QUOTA, reserve: int = SCRATCH_JOB_RESERVE):
+        self.root = root
+        self.quota = quota
+        self.reserve = reserve
+        self.reserved = 0
+        self._live: set[ScratchDir] = set()
+        self._waiters: deque[asyncio.Future] = deque()
+        self._sweep_task = None
+        # Directories of this PID older than this are from an earlier process (e.g. PID 1 in a restarted container)
+        self._started = time.time()
+
+    def _fits(self, reserve: int) -> bool:
+        return not self.quota or not self._live or self.reserved + reserve <= self.quota
+
+    def _wake(self) -> None:
+        if self._waiters and not self._waiters[0].done():
+            self._waiters[0].set_result(None)
+
+    async def acquire(self, prefix: str = "job-", reserve: int | None = None) -> ScratchDir:
+        """A new empty directory for one job, waiting for quota if necessary. Close it when done."""
+        reserve = self.reserve if reserve is None else reserve
+        if self._waiters or not self._fits(reserve):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                while True:
+                    await waiter
+                    if self._fits(reserve):
+                        break
+                    # Still first in line: wait for the next release
+                    waiter = asyncio.get_running_loop().create_future()
+                    self._waiters[0] = waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                # Whether this job got in or gave up, the next one may fit now
+                self._wake()
+        os.makedirs(self.root, exist_ok=True)
+        path = tempfile.mkdtemp(prefix=f"{prefix}{os.getpid()}-", dir=self.root)
+        scratch = ScratchDir(self, path, reserve)
+        self._live.add(scratch)
+        self.reserved += reserve
+        return scratch
+
+    def _release(self, scratch: ScratchDir) -> None:
+        if scratch in self._live:
+            self._live.remove(scratch)
+            self.reserved -= scratch.reserved
+            self._wake()
+
+    def _grow(self, scratch: ScratchDir, extra: int) -> None:
+        if scratch in self._live:
+            scratch.reserved += extra
+            self.reserved += extra
+            if extra < 0:
+                self._wake()
+
+    def reset(self) -> None:
+        """Forget every reservation and waiter; directories already handed out are left on disk."""
+        self.reserved = 0
+        self._live = set()
+        self._waiters = deque()
+
+    def sweep(self) -> int:
+        """Remove directories whose creating process is gone; returns how many were removed."""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return 0
+        live = {scratch.path for scratch in self._live}
+        removed = 0
+        for name in names:
+            path = os.path.join(self.root, name)
+            match = _OWNER_PATTERN.search(name)
+            if match is None or path in live:
+                continue
+            pid = int(match.group(1))
+            try:
+                if pid == os.getpid():
+                    if os.stat(path).st_mtime >= self._started - _MTIME_SLACK:
+                        continue
+                elif _running(pid):
+                    continue
+            except OSError:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        if removed:
+            logger.info("Removed %d orphaned scratch directories from %s", removed, self.root)
+        return removed
+
+    def start(self) -> None:
+        """Sweep orphans in the background, so startup isn't delayed by deleting them."""
+        self._sweep_task = asyncio.ensure_future(asyncio.to_thread(self.sweep))
+
+    async def close(self) -> None:
+        if self._sweep_task is not None:
+            await asyncio.gather(self._sweep_task, return_exceptions=True)
+            self._sweep_task = None
+
+
+scratch_space = ScratchSpace()
@@ -0,0 +1,47 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    In-flight request registry: concurrent calls with the same key share one
+    invocation of the work function and all receive its result (or exception).
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._tasks
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        """
+        Run `fn` for `key` unless a run is already in progress, in which case
+        wait for that one. Returns (result, shared) where `shared` is True for
+        callers that joined another caller's run.
+        """
+        while True:
+            task = self._tasks.get(key)
+            if task is None:
+                task = asyncio.ensure_future(fn())
+                self._tasks[key] = task
+                task.add_done_callback(lambda t: self._forget(key, t))
+                return await task, False
+
+            logger.debug("Joining in-flight request for %s", key)
+            # asyncio.wait does not propagate the leader's cancellation to us
+            await asyncio.wait({task})
+            if task.cancelled():
+                # The leader went away; retry so one of the waiters takes over
+                continue
+            return task.result(), True
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+
+in_flight = SingleFlight()
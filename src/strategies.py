@@ -0,0 +1,83 @@
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+from backends import backend_registry
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a download strategy before starting the next one in parallel.
+# 0 runs all strategies at once; "inf" restores strictly sequential fallbacks.
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "5"))
+
+Strategy = tuple[str, Callable[[], Awaitable[Any]]]
+
+
+def _discard(result: Any) -> None:
+    close = getattr(result, "close", None)
+    if close is not None:
+        close()
+
+
+async def run_strategies(strategies: list[Strategy], hedge_delay: float = HEDGE_DELAY,
+                         platform: str | None = None) -> tuple[str, Any] | None:
+    """
+    Run download strategies in order with hedging and return (name, result) of
+    the first one that produces a truthy result, or None if all of them fail.
+
+    The next strategy starts as soon as the running ones have all failed, or
+    after `hedge_delay` seconds if they are still running. Once a winner is
+    found the remaining strategies are cancelled (killing any yt-dlp children),
+    and results that finished in the same instant are closed.
+
+    With `platform` set, strategies are reordered and filtered by the backend
+    registry (rolling stats and circuit breakers) and their outcomes recorded.
+    """
+    if platform is not None:
+        strategies = backend_registry.arrange(platform, strategies)
+    pending: dict[asyncio.Task, str] = {}
+    remaining = list(strategies)
+    winner = None
+
+    def start_next() -> None:
+        name, fn = remaining.pop(0)
+        logger.debug("Starting download strategy %s", name)
+        pending[asyncio.ensure_future(fn())] = name
+
+    try:
+        while remaining or pending:
+            if remaining and not pending:
+                start_next()
+            timeout = hedge_delay if remaining else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # Hedge: the running strategies are slow, start the next one alongside
+                start_next()
+                continue
+
+            for task in done:
+                name = pending.pop(task)
+                if task.cancelled():
+                    continue
+                if task.exception() is not None:
+                    logger.warning("Download strategy %s failed: %s", name, task.exception())
+                    continue
+                result = task.result()
+                if not result:
+                    logger.debug("Download strategy %s returned nothing", name)
+                elif winner is None:
+                    winner = (name, result)
+                else:
+                    _discard(result)
+            if winner is not None:
+                logger.info("Download strategy %s won", winner[0])
+                return winner
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            for result in results:
+                if result and not isinstance(result, BaseException):
+                    _discard(result)
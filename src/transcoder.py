@@ -0,0 +1,134 @@
+import os
+import time
+import asyncio
+import logging
+
+from downloader import executor
+from media_buffer import MediaFile
+from scratch import scratch_space, ScratchDir
+from metrics import transcode_seconds
+
+logger = logging.getLogger(__name__)
+
+# Largest video the bot uploads as-is (Telegram's bot API limit is 50 MB)
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(50_000 * 1024)))
+# ffmpeg threads per transcode; concurrent transcodes share the download executor's slots
+TRANSCODE_THREADS = int(os.getenv("TRANSCODE_THREADS", "2"))
+TRANSCODE_TIMEOUT = float(os.getenv("TRANSCODE_TIMEOUT", "300"))
+
+AUDIO_BITRATE = 64_000
+MIN_VIDEO_BITRATE = 100_000
+# Share of the target size reserved for container overhead and encoder overshoot
+SIZE_MARGIN = 0.92
+# (minimum video bitrate, output height): the resolution a bitrate can carry decently
+HEIGHT_LADDER = ((2_500_000, 1080), (1_200_000, 720), (600_000, 480), (0, 360))
+
+
+async def probe_duration(path: str) -> float | None:
+    """Duration of a media file in seconds, read with ffprobe."""
+    result = await executor.run([
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", path,
+    ], timeout=30)
+    try:
+        duration = float(result.stdout.strip())
+    except ValueError:
+        logger.warning("ffprobe returned no duration for %s: %s", path, result.stderr.decode(errors="replace")[-300:])
+        return None
+    return duration if duration > 0 else None
+
+
+def video_bitrate_for(duration: float, target_size: int, audio_bitrate: int = AUDIO_BITRATE) -> int | None:
+    """Video bitrate (bits/s) that makes `duration` seconds fit in `target_size` bytes, or None if it can't."""
+    bitrate = int(target_size * 8 * SIZE_MARGIN / duration) - audio_bitrate
+    return bitrate if bitrate >= MIN_VIDEO_BITRATE else None
+
+
+def height_for(video_bitrate: int) -> int:
+    return next(height for minimum, height in HEIGHT_LADDER if video_bitrate >= minimum)
+
+
+def ffmpeg_command(input_path: str, output_path: str, video_bitrate: int,
+                   threads: int = TRANSCODE_THREADS) -> list[str]:
+    kbps = video_bitrate // 1000
+    return [
+        "ffmpeg", "-y", "-threads", str(threads), "-i", input_path,
+        # Never upscale: min() keeps smaller inputs at their own height
+        "-vf", f"scale=-2:'min({height_for(video_bitrate)},ih)'",
+        "-c:v", "libx264", "-preset", "veryfast", "-threads", str(threads),
+        "-b:v", f"{kbps}k", "-maxrate", f"{kbps}k", "-bufsize", f"{kbps * 2}k",
+        "-c:a", "aac", "-b:a", f"{AUDIO_BITRATE // 1000}k",
+        "-movflags", "+faststart",
+        output_path,
+    ]
+
+
+async def fit_to_size(media, target_size: int = MAX_UPLOAD_SIZE, platform: str = "unknown") -> MediaFile | None:
+    """
+    Re-encode `media` (a MediaBuffer or MediaFile) once, at the bitrate that
+    makes it fit in `target_size` bytes. Returns a new MediaFile, or None if
+    the video is too long to fit or ffprobe/ffmpeg fail. `media` is left
+    open; the caller still owns it. A MediaFile in a job scratch directory is
+    transcoded in that directory, which then passes to the returned file.
+    """
+    held = getattr(media, "cleanup_dir", None)
+    if isinstance(held, ScratchDir) and not held.closed:
+        # The job already holds this directory's reservation; waiting on the
+        # quota for a second one while holding it could deadlock
+        scratch, owned = held, False
+        scratch.grow(target_size)
+    else:
+        # Room for the spilled input and the output
+        scratch, owned = await scratch_space.acquire("transcode-", reserve=len(media) + target_size), True
+    work_dir = scratch.path
+    output_path = os.path.join(work_dir, "output.mp4")
+    try:
+        input_path = getattr(media, "path", None)
+        if input_path is None:
+            # In-memory download: ffmpeg needs a seekable file (mp4 index may be at the end)
+            input_path = os.path.join(work_dir, "input.mp4")
+            await asyncio.to_thread(media.save_to, input_path)
+
+        duration = await probe_duration(input_path)
+        if duration is None:
+            return _discard(scratch, owned, output_path, target_size)
+        video_bitrate = video_bitrate_for(duration, target_size)
+        if video_bitrate is None:
+            logger.warning("%.0fs video can't fit in %d bytes, not transcoding", duration, target_size)
+            return _discard(scratch, owned, output_path, target_size)
+
+        logger.info("Transcoding %d bytes (%.1fs) at %dk to fit %d bytes",
+                    len(media), duration, video_bitrate // 1000, target_size)
+        start = time.perf_counter()
+        result = await executor.run(ffmpeg_command(input_path, output_path, video_bitrate), timeout=TRANSCODE_TIMEOUT)
+        ok = result.returncode == 0 and os.path.exists(output_path)
+        transcode_seconds.observe(time.perf_counter() - start, platform=platform,
+                                  outcome="success" if ok else "failure")
+        if not ok:
+            logger.error("ffmpeg transcode failed: %s", result.stderr.decode(errors="replace")[-300:])
+            return _discard(scratch, owned, output_path, target_size)
+        if os.path.getsize(output_path) > target_size:
+            logger.warning("Transcoded video is still %d bytes (target %d)", os.path.getsize(output_path), target_size)
+            return _discard(scratch, owned, output_path, target_size)
+        if owned and input_path.startswith(work_dir):
+            os.remove(input_path)
+        if not owned:
+            # The directory now belongs to the output; closing the input only removes its own file
+            media.cleanup_dir = None
+        return MediaFile(output_path, cleanup_dir=scratch)
+    except BaseException:
+        _discard(scratch, owned, output_path, target_size)
+        raise
+
+
+def _discard(scratch: ScratchDir, owned: bool, output_path: str, target_size: int) -> None:
+    if owned:
+        scratch.close()
+        return None
+    # Borrowed from the input: drop what the transcode added and give back its extra reservation
+    try:
+        os.remove(output_path)
+    except OSError:
+        pass
+    scratch.grow(-target_size)
+    return None
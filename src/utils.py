@@ -1,48 +1,64 @@
+import time
 import random
 import importlib
 import pkgutil
 import inspect
 from telegram import Update, User
+from metrics import delete_message_seconds
+from chat_state import chat_states
 
 async def delete_message(update: Update) -> None:
+    start = time.perf_counter()
     try:
         await update.message.delete()
     except Exception as e:
+        delete_message_seconds.observe(time.perf_counter() - start, outcome="error")
         print(f"Failed to delete message: {e}")
+    else:
+        delete_message_seconds.observe(time.perf_counter() - start, outcome="success")
 
 async def randomize_status(user: User, chat_id: int) -> str:
-    # Initialize chat states if not exists
-    if not hasattr(randomize_status, "_chat_states"):
-        randomize_status._chat_states = {}
-
-    # Initialize or get chat state for current chat
-    if chat_id not in randomize_status._chat_states:
-        randomize_status._chat_states[chat_id] = {
-            "last_user": user.id,
-            "streak": 0
-        }
-
-    chat_state = randomize_status._chat_states[chat_id]
-
-    # Update streak counter
-    if user.id == chat_state["last_user"]:
-        chat_state["streak"] += 1
-    else:
-        chat_state["last_user"] = user.id
-        chat_state["streak"] = 1
+    # Per-chat streaks live in the bounded chat state store
+    streak = await chat_states.record_message(chat_id, user.id)
 
     # Determine status based on streak
-    if chat_state["streak"] >= 3:
+    if streak >= 3:
         status = "🌈 GAY SPAMMER 💦💦💦\n"
     else:
         status = random.choice(["👑 NICE GUY 👑", "😎 CHILL GUY 🚬", "COOL DUDE 🤘", "FUNNY DUDE 🤣"])
 
     return f"by <a href=\"tg://user?id={user.id}\">{user.full_name}</a> {status}\n"
 
-def load_handlers():
+class LazyHandler:
+    """
+    Stands in for a handler until it is first used. Only the class is needed
+    up front (for URL_PATTERN and the platform name); the instance, and
+    whatever its constructor does, is created on the first real call.
+    """
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.URL_PATTERN = getattr(cls, "URL_PATTERN", None)
+        self._instance = None
+
+    @property
+    def platform(self) -> str:
+        return self.cls.__name__.removesuffix("Handler").lower()
+
+    @property
+    def instance(self):
+        if self._instance is None:
+            self._instance = self.cls()
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self.instance, name)
+
+
+def load_handlers(lazy: bool = False):
     """
     Automatically discovers and loads all handler classes from the handlers directory.
-    Returns a list of instantiated handler objects.
+    Returns a list of instantiated handler objects, or LazyHandler proxies if `lazy`.
     """
     handlers = []
     handlers_package = "handlers"
@@ -58,7 +74,7 @@ def load_handlers():
         # Find all classes in the module that end with 'Handler'
         for name, obj in inspect.getmembers(module):
             if inspect.isclass(obj) and name.endswith('Handler') and obj.__module__ != 'handlers':
-                # Instantiate the handler and add it to the list
-                handlers.append(obj())
+                # Instantiate the handler (or defer that) and add it to the list
+                handlers.append(LazyHandler(obj) if lazy else obj())
     
     return handlers
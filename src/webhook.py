@@ -0,0 +1,99 @@
+import os
+import json
+import signal
+import asyncio
+import logging
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+# Public URL the reverse proxy forwards to us, e.g. https://bot.example.com
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Minimal aiohttp server receiving Telegram updates on a secret path and
+    feeding them into the PTB application's update queue. Meant to sit behind
+    a reverse proxy that terminates TLS.
+    """
+
+    def __init__(self, bot, update_queue: asyncio.Queue, listen: str = WEBHOOK_LISTEN,
+                 port: int = WEBHOOK_PORT, path: str = WEBHOOK_PATH,
+                 secret_token: str | None = WEBHOOK_SECRET_TOKEN):
+        self.bot = bot
+        self.update_queue = update_queue
+        self.listen = listen
+        self.port = port
+        self.path = "/" + path.strip("/")
+        self.secret_token = secret_token
+        self._runner = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_update)
+        return app
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        if self.secret_token and request.headers.get(SECRET_TOKEN_HEADER) != self.secret_token:
+            logger.warning("Webhook request with invalid secret token from %s", request.remote)
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.bot)
+        except (json.JSONDecodeError, ValueError, TypeError, KeyError) as e:
+            logger.warning("Invalid webhook payload: %s", e)
+            return web.Response(status=400)
+        await self.update_queue.put(update)
+        return web.Response()
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        logger.info("Webhook server listening on %s:%s%s", self.listen, self.port, self.path)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def run_webhook(app, server: WebhookServer | None = None, webhook_url: str | None = WEBHOOK_URL) -> None:
+    """
+    Run the PTB application fed by a WebhookServer until SIGINT/SIGTERM.
+    Mirrors Application.run_polling: calls post_init/post_shutdown hooks and,
+    if `webhook_url` is set, registers the webhook with Telegram.
+    """
+    server = server or WebhookServer(app.bot, app.update_queue)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        await server.start()
+        if webhook_url:
+            await app.bot.set_webhook(
+                url=webhook_url.rstrip("/") + server.path,
+                secret_token=server.secret_token,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            await app.stop()
+            if app.post_shutdown:
+                await app.post_shutdown(app)
@@ -0,0 +1,296 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from deadline import budget
+from downloader import DEFAULT_DOWNLOAD_TIMEOUT, SUBPROCESS_MAX_MEMORY, SUBPROCESS_NICE, resource_limiter
+from media_buffer import MediaFile
+from scratch import scratch_space, ScratchDir
+
+logger = logging.getLogger(__name__)
+
+# Long-lived worker processes with yt_dlp imported; 0 disables the pool (CLI is used instead)
+YTDLP_POOL_WORKERS = int(os.getenv("YTDLP_POOL_WORKERS", "2"))
+# Jobs a worker runs before it is replaced, bounding leaks in extractors
+YTDLP_POOL_MAX_JOBS = int(os.getenv("YTDLP_POOL_MAX_JOBS", "50"))
+# Seconds a worker gets to notice a cancel/timeout before the whole pool is restarted
+KILL_GRACE = 10.0
+
+CANCEL_FLAG = ".cancel"
+
+
+def _warm_up() -> None:
+    """Worker initializer: pay for importing yt-dlp and its extractors once per process."""
+    # Same memory cap and priority as CLI children; no CPU limit, workers are long-lived
+    limit = resource_limiter(SUBPROCESS_MAX_MEMORY, 0, SUBPROCESS_NICE)
+    if limit is not None:
+        limit()
+    import yt_dlp
+    from yt_dlp.extractor import import_extractors
+
+    import_extractors()
+    yt_dlp.YoutubeDL({"quiet": True})
+
+
+class _SilentLogger:
+    """YoutubeDL logger that drops output; errors are returned to the caller instead."""
+
+    def debug(self, msg: str) -> None:
+        pass
+
+    warning = error = debug
+
+
+def _discard(cleanup: ScratchDir | str) -> None:
+    """Remove a job's own scratch directory, or its subdirectory of the caller's."""
+    if isinstance(cleanup, str):
+        shutil.rmtree(cleanup, ignore_errors=True)
+    else:
+        cleanup.close()
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _download_job(url: str, options: dict, output_dir: str, timeout: float) -> dict:
+    """
+    Runs in a worker: download `url` into `output_dir` with the YoutubeDL API.
+    Returns {"path": ...} or {"error": ...}; yt-dlp exceptions don't always
+    survive pickling, so they are flattened to strings here.
+    """
+    import yt_dlp
+    from yt_dlp.utils import DownloadCancelled
+
+    deadline = time.monotonic() + timeout
+    cancel_flag = os.path.join(output_dir, CANCEL_FLAG)
+
+    def check(_status) -> None:
+        if time.monotonic() > deadline:
+            raise DownloadCancelled(f"timed out after {timeout}s")
+        if os.path.exists(cancel_flag):
+            raise DownloadCancelled("cancelled")
+
+    params = {
+        "quiet": True,
+        "no_warnings": True,
+        "noprogress": True,
+        "logger": _SilentLogger(),
+        "outtmpl": os.path.join(output_dir, "%(id)s.%(ext)s"),
+        "socket_timeout": min(timeout, 30),
+        "progress_hooks": [check],
+        "postprocessor_hooks": [check],
+        **options,
+    }
+    try:
+        with yt_dlp.YoutubeDL(params) as ydl:
+            info = ydl.extract_info(url, download=True)
+            downloads = info.get("requested_downloads") or []
+            path = downloads[0].get("filepath") if downloads else ydl.prepare_filename(info)
+    except BaseException as e:
+        return {"error": f"{type(e).__name__}: {e}", "timed_out": time.monotonic() > deadline}
+    if not path or not os.path.isfile(path):
+        return {"error": "yt-dlp produced no file"}
+    return {"path": path}
+
+
+def _extract_job(url: str, options: dict, timeout: float) -> dict | None:
+    """Runs in a worker: extract metadata for `url` without downloading; None on failure."""
+    import yt_dlp
+    from format_probe import slim_info
+
+    params = {
+        "quiet": True,
+        "no_warnings": True,
+        "logger": _SilentLogger(),
+        "noplaylist": True,
+        "socket_timeout": min(timeout, 30),
+        **options,
+    }
+    try:
+        with yt_dlp.YoutubeDL(params) as ydl:
+            return slim_info(ydl.sanitize_info(ydl.extract_info(url, download=False)))
+    except BaseException:
+        return None
+
+
+class YtdlpPool:
+    """
+    Runs yt-dlp through its Python API in a pool of pre-warmed worker
+    processes, so a download doesn't pay for interpreter start-up and
+    extractor imports. Workers are recycled after `max_jobs_per_worker` jobs.
+
+    Timeouts and cancellation are cooperative: a flag file in the job's output
+    directory is checked from yt-dlp's progress hooks. A worker that doesn't
+    stop within KILL_GRACE seconds gets the whole pool restarted.
+    """
+
+    def __init__(self, workers: int = YTDLP_POOL_WORKERS, max_jobs_per_worker: int = YTDLP_POOL_MAX_JOBS,
+                 default_timeout: float = DEFAULT_DOWNLOAD_TIMEOUT):
+        self.workers = workers
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.default_timeout = default_timeout
+        self._pool: ProcessPoolExecutor | None = None
+        self._semaphore = asyncio.Semaphore(max(workers, 1))
+        self._reapers: set[asyncio.Task] = set()
+        self._warmup_task = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0 and importlib.util.find_spec("yt_dlp") is not None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_up,
+                max_tasks_per_child=self.max_jobs_per_worker,
+            )
+        return self._pool
+
+    async def start(self) -> None:
+        if self.enabled:
+            # Workers import yt-dlp in the background so startup isn't delayed
+            self._warmup_task = asyncio.ensure_future(self.warm_up())
+
+    async def warm_up(self) -> None:
+        """Spawn all workers now rather than on the first download."""
+        pool = self._get_pool()
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(pool, _ping) for _ in range(self.workers)))
+            logger.info("yt-dlp pool ready with %s workers", self.workers)
+        except BrokenProcessPool as e:
+            logger.warning("yt-dlp pool failed to start: %s", e)
+            self._reset(pool)
+
+    async def download(self, url: str, options: dict | None = None, timeout: float | None = None,
+                       scratch: ScratchDir | None = None) -> MediaFile | None:
+        """
+        Download `url` with YoutubeDL `options` into a fresh scratch directory.
+        Returns the file as a MediaFile (which removes the directory when closed),
+        or None if yt-dlp failed. Raises asyncio.TimeoutError after `timeout` seconds
+        or when the current update's deadline runs out.
+        A caller that already holds `scratch` gets a subdirectory of it instead:
+        waiting for a second reservation while holding one can deadlock.
+        """
+        if scratch is None:
+            # Scratch quota first: a job waiting for disk space shouldn't hold a worker
+            cleanup = await scratch_space.acquire("ytdlp-")
+            output_dir = cleanup.path
+        else:
+            cleanup = output_dir = tempfile.mkdtemp(prefix="ytdlp-", dir=scratch.path)
+        try:
+            await self._semaphore.acquire()
+        except BaseException:
+            _discard(cleanup)
+            raise
+        try:
+            timeout = budget(self.default_timeout if timeout is None else timeout)
+            pool = self._get_pool()
+            future = asyncio.get_running_loop().run_in_executor(
+                pool, _download_job, url, options or {}, output_dir, timeout
+            )
+        except BaseException:
+            self._semaphore.release()
+            _discard(cleanup)
+            raise
+
+        try:
+            # The worker enforces `timeout` itself; the grace covers a worker stuck outside hooks
+            result = await asyncio.wait_for(asyncio.shield(future), timeout + KILL_GRACE)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._abandon(pool, future, output_dir, cleanup)
+            raise
+        except BrokenProcessPool as e:
+            logger.warning("yt-dlp pool broke while downloading %s: %s", url, e)
+            self._reset(pool)
+            self._semaphore.release()
+            _discard(cleanup)
+            return None
+
+        self._semaphore.release()
+        if "error" in result:
+            _discard(cleanup)
+            if result.get("timed_out"):
+                raise asyncio.TimeoutError(result["error"])
+            logger.warning("yt-dlp failed for %s: %s", url, result["error"])
+            return None
+        return MediaFile(result["path"], cleanup_dir=cleanup)
+
+    async def extract_info(self, url: str, options: dict | None = None, timeout: float | None = None) -> dict | None:
+        """
+        Format metadata for `url` (see format_probe.slim_info), or None if
+        extraction failed. Raises asyncio.TimeoutError after `timeout` seconds
+        (or at the update's deadline); the worker slot stays taken until the
+        extraction actually ends.
+        """
+        await self._semaphore.acquire()
+        pool = self._get_pool()
+        try:
+            timeout = budget(self.default_timeout if timeout is None else timeout)
+            future = asyncio.get_running_loop().run_in_executor(
+                pool, _extract_job, url, options or {}, timeout
+            )
+        except BaseException:
+            self._semaphore.release()
+            raise
+        future.add_done_callback(lambda _: self._semaphore.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except BrokenProcessPool as e:
+            logger.warning("yt-dlp pool broke while probing %s: %s", url, e)
+            self._reset(pool)
+            return None
+
+    def _abandon(self, pool: ProcessPoolExecutor, future: asyncio.Future, output_dir: str,
+                 cleanup: ScratchDir | str) -> None:
+        """Ask the worker to stop and clean up in the background; the caller doesn't wait."""
+        try:
+            open(os.path.join(output_dir, CANCEL_FLAG), "w").close()
+        except OSError:
+            pass
+        reaper = asyncio.ensure_future(self._reap(pool, future, cleanup))
+        self._reapers.add(reaper)
+        reaper.add_done_callback(self._reapers.discard)
+
+    async def _reap(self, pool: ProcessPoolExecutor, future: asyncio.Future, cleanup: ScratchDir | str) -> None:
+        try:
+            await asyncio.wait_for(asyncio.shield(future), KILL_GRACE)
+        except asyncio.TimeoutError:
+            logger.warning("yt-dlp worker ignored cancellation, restarting the pool")
+            self._reset(pool)
+        except Exception:
+            pass
+        finally:
+            self._semaphore.release()
+            _discard(cleanup)
+
+    def _reset(self, pool: ProcessPoolExecutor) -> None:
+        """Kill every worker of `pool`; the next download starts a fresh pool."""
+        if self._pool is pool:
+            self._pool = None
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            if process.is_alive():
+                process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def close(self) -> None:
+        if self._warmup_task is not None:
+            self._warmup_task.cancel()
+            self._warmup_task = None
+        for reaper in list(self._reapers):
+            reaper.cancel()
+        if self._pool is not None:
+            self._reset(self._pool)
+
+
+ytdlp_pool = YtdlpPool()
@@ -1,4 +1,5 @@
 import pytest
+from aiohttp import web
 from unittest.mock import MagicMock, AsyncMock
 from telegram import Update, Message, Chat
 import os
@@ -8,6 +9,64 @@ import sys
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
+from file_id_cache import file_id_cache
+from backends import backend_registry
+from ytdlp_pool import ytdlp_pool
+from capabilities import capabilities
+from format_probe import format_probe
+from media_cache import media_cache
+from canonical import short_links
+from rate_limiter import rate_limiter
+from scratch import scratch_space
+from passthrough import passthrough
+
+@pytest.fixture(autouse=True)
+def isolated_singletons(tmp_path, monkeypatch):
+    """
+    Start every test with empty shared caches, stats and quotas, with on-disk
+    state under the test's tmp_path, and with nothing reaching the network:
+    short links aren't resolved, formats aren't probed and no direct media URL
+    is offered to Telegram. yt-dlp runs as the (mocked) CLI; tests of the
+    in-process pool raise ytdlp_pool.workers themselves.
+    """
+    monkeypatch.setattr(file_id_cache, "path", str(tmp_path / "file_id_cache.sqlite3"))
+    monkeypatch.setattr(media_cache, "root", str(tmp_path / "media_cache"))
+    monkeypatch.setattr(scratch_space, "root", str(tmp_path / "scratch"))
+    monkeypatch.setattr(capabilities, "path", str(tmp_path / "capabilities.json"))
+    monkeypatch.setattr(short_links, "resolve", AsyncMock(return_value=None))
+    monkeypatch.setattr(format_probe, "enabled", False)
+    monkeypatch.setattr(passthrough, "enabled", False)
+    monkeypatch.setattr(ytdlp_pool, "workers", 0)
+    reset_shared_state()
+    yield
+    reset_shared_state()
+
+def reset_shared_state():
+    file_id_cache.close()
+    media_cache.close()
+    scratch_space.reset()
+    capabilities.clear()
+    short_links.clear()
+    rate_limiter.clear()
+    backend_registry.clear()
+    format_probe.clear()
+    passthrough.clear()
+
+@pytest.fixture
+async def video_server():
+    """Serves /video.mp4 for yt-dlp's generic extractor."""
+    async def video(request):
+        return web.Response(body=b"pooled video data" * 1024, content_type="video/mp4")
+
+    app = web.Application()
+    app.router.add_get("/video.mp4", video)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    yield f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/video.mp4"
+    await runner.cleanup()
+
 @pytest.fixture
 def mock_telegram_update():
     """Create a mock Telegram Update object."""
@@ -16,4 +75,4 @@ def mock_telegram_update():
     update.message.chat = MagicMock(spec=Chat)
     update.message.chat.send_video = AsyncMock()
     update.message.chat.send_message = AsyncMock()
-    return update 
\ No newline at end of file
+    return update
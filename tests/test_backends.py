@@ -0,0 +1,164 @@
+import asyncio
+import pytest
+from src.backends import BackendRegistry, BackendStats
+from src.strategies import run_strategies
+from backends import backend_registry  # the module src.* code imports
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def backend(result, cost=0.0, clock=None):
+    async def run():
+        if clock is not None:
+            clock.now += cost
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return run
+
+
+def names(strategies):
+    return [name for name, _ in strategies]
+
+
+def test_declared_order_kept_without_history():
+    registry = BackendRegistry()
+    arranged = registry.arrange("tiktok", [("a", backend("A")), ("b", backend("B")), ("c", backend("C"))])
+    assert names(arranged) == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_slow_unreliable_backend_is_demoted():
+    clock = FakeClock()
+    registry = BackendRegistry(failure_threshold=100, clock=clock)
+    for _ in range(5):
+        _, slow = registry.arrange("tiktok", [("slow", backend(None, cost=30, clock=clock))])[0]
+        await slow()
+        _, fast = registry.arrange("tiktok", [("fast", backend("F", cost=1, clock=clock))])[0]
+        await fast()
+
+    arranged = registry.arrange("tiktok", [("slow", backend("S")), ("fast", backend("F"))])
+    assert names(arranged) == ["fast", "slow"]
+    assert registry.stats("tiktok", "slow").success_rate == 0
+    assert registry.stats("tiktok", "fast").avg_latency == 1
+
+
+@pytest.mark.asyncio
+async def test_stats_are_per_platform():
+    registry = BackendRegistry(failure_threshold=1)
+    _, fn = registry.arrange("tiktok", [("yt-dlp", backend(None))])[0]
+    await fn()
+    assert names(registry.arrange("facebook", [("yt-dlp", backend("X"))])) == ["yt-dlp"]
+    assert names(registry.arrange("tiktok", [("yt-dlp", backend("X")), ("other", backend("O"))])) == ["other"]
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_half_opens_after_cooldown():
+    clock = FakeClock()
+    registry = BackendRegistry(failure_threshold=2, cooldown=60, clock=clock)
+    for _ in range(2):
+        _, fn = registry.arrange("instagram", [("reelsaver", backend(RuntimeError("down")))])[0]
+        with pytest.raises(RuntimeError):
+            await fn()
+
+    assert registry.stats("instagram", "reelsaver").is_open(clock.now)
+    assert names(registry.arrange("instagram", [("reelsaver", backend("R")), ("yt-dlp", backend("Y"))])) == ["yt-dlp"]
+
+    clock.now += 61
+    release = asyncio.Event()
+
+    async def slow_probe():
+        await release.wait()
+        return "R"
+
+    arranged = registry.arrange("instagram", [("reelsaver", slow_probe), ("yt-dlp", backend("Y"))])
+    assert "reelsaver" in names(arranged)
+    probe = asyncio.ensure_future(dict(arranged)["reelsaver"]())
+    await asyncio.sleep(0)
+    # One probe goes through, a concurrent second call is still skipped
+    assert "reelsaver" not in names(registry.arrange("instagram", [("reelsaver", backend("R")), ("yt-dlp", backend("Y"))]))
+
+    release.set()
+    assert await probe == "R"
+    assert not registry.stats("instagram", "reelsaver").is_open(clock.now)
+    assert registry.stats("instagram", "reelsaver").consecutive_failures == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_probe_reopens_circuit():
+    clock = FakeClock()
+    registry = BackendRegistry(failure_threshold=1, cooldown=10, clock=clock)
+    assert await registry.call("instagram", "ddinstagram", backend(False)) is False
+    assert await registry.call("instagram", "ddinstagram", backend(True)) is None
+
+    clock.now += 11
+    assert await registry.call("instagram", "ddinstagram", backend(False)) is False
+    assert await registry.call("instagram", "ddinstagram", backend(True)) is None
+
+
+@pytest.mark.asyncio
+async def test_unstarted_strategy_does_not_hold_the_probe(monkeypatch):
+    clock = FakeClock()
+    registry = backend_registry
+    monkeypatch.setattr(registry, "clock", clock)
+    for _ in range(registry.failure_threshold):
+        registry.stats("tiktok", "tikwm").record(False, 1, clock.now)
+    clock.now += registry.cooldown + 1
+
+    # The half-open backend ranks behind the winner and never starts
+    strategies = [("yt-dlp", backend("Y")), ("tikwm", backend("T"))]
+    assert await run_strategies(strategies, hedge_delay=1, platform="tiktok") == ("yt-dlp", "Y")
+
+    tikwm = registry.stats("tiktok", "tikwm")
+    assert not tikwm._probing
+    arranged = registry.arrange("tiktok", [("tikwm", backend("T"))])
+    assert await dict(arranged)["tikwm"]() == "T"
+    assert not tikwm.is_open(clock.now)
+
+
+def test_all_open_falls_back_to_declared_order():
+    registry = BackendRegistry(failure_threshold=1)
+    for name in ("a", "b"):
+        registry.stats("tiktok", name).record(False, 1, registry.clock())
+    assert names(registry.arrange("tiktok", [("a", backend("A")), ("b", backend("B"))])) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_cancellation_is_not_recorded():
+    registry = BackendRegistry(failure_threshold=1)
+
+    async def hang():
+        await asyncio.sleep(5)
+
+    _, fn = registry.arrange("twitter", [("yt-dlp", hang)])[0]
+    task = asyncio.create_task(fn())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not registry.stats("twitter", "yt-dlp").results
+
+
+def test_rolling_window_forgets_old_results():
+    stats = BackendStats(window=3, failure_threshold=10)
+    for _ in range(3):
+        stats.record(False, 1, 0)
+    for _ in range(3):
+        stats.record(True, 1, 0)
+    assert stats.success_rate == 1
+
+
+@pytest.mark.asyncio
+async def test_run_strategies_records_outcomes():
+    result = await run_strategies(
+        [("tikwm", backend(None)), ("yt-dlp", backend("Y"))], hedge_delay=1, platform="tiktok"
+    )
+    assert result == ("yt-dlp", "Y")
+    assert backend_registry.stats("tiktok", "tikwm").success_rate == 0
+    assert backend_registry.stats("tiktok", "yt-dlp").success_rate == 1
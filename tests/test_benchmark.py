@@ -0,0 +1,21 @@
+import os
+import sys
+import json
+import subprocess
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "load.py")
+
+
+def test_load_benchmark_smoke():
+    """The benchmark runs offline end to end and every update is delivered."""
+    result = subprocess.run(
+        [sys.executable, BENCHMARK, "--updates", "8", "--ytdlp-latency", "0.05", "--upload-latency", "0",
+         "--video-size", "65536", "--json"],
+        capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout)
+    assert report["delivered"] == 8
+    assert report["uploaded_bytes"] == 8 * 65536
+    assert report["latency_seconds"]["p50"] is not None
+    assert report["peak_rss_kb"] > 0
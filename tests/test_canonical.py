@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from unittest.mock import AsyncMock, patch
+from src.canonical import ShortLinkResolver, canonicalize, is_short_link, media_key, resolve_media_key
+from http_client import http_client  # the instance canonical.get_session uses
+
+@pytest.mark.parametrize("url", [
+    "https://www.instagram.com/reel/C7xYz_1-a/?igsh=MWQ1ZGUxMzBkMA==",
+    "https://instagram.com/reels/C7xYz_1-a/",
+    "https://www.instagram.com/p/C7xYz_1-a/?utm_source=ig_web_copy_link",
+    "https://www.instagram.com/someone/p/C7xYz_1-a/",
+])
+def test_instagram_aliases_share_one_key(url):
+    media = canonicalize(url)
+
+    assert media.key == "instagram:C7xYz_1-a"
+    assert media.url == "https://www.instagram.com/p/C7xYz_1-a/"
+
+def test_tiktok_twitter_facebook_ids():
+    assert canonicalize("https://www.tiktok.com/@user/video/7351234567890?is_from_webapp=1&sender_device=pc").key == "tiktok:7351234567890"
+    assert canonicalize("https://m.tiktok.com/v/7351234567890.html").key == "tiktok:7351234567890"
+    assert canonicalize("https://x.com/user/status/1790000000000000000?s=20&t=abc").key == "twitter:1790000000000000000"
+    assert canonicalize("https://mobile.twitter.com/other/status/1790000000000000000").key == "twitter:1790000000000000000"
+    assert canonicalize("https://www.facebook.com/reel/123456789?mibextid=xyz").key == "facebook:123456789"
+    assert canonicalize("https://www.facebook.com/watch/?v=123456789").key == "facebook:123456789"
+    assert canonicalize("https://example.com/video/1") is None
+
+def test_short_links():
+    assert is_short_link("https://vm.tiktok.com/ZSmCyNC4U/")
+    assert is_short_link("https://vt.tiktok.com/ZSmCyNC4U/")
+    assert is_short_link("https://www.tiktok.com/t/ZSmCyNC4U/")
+    assert is_short_link("https://fb.watch/abc123/")
+    assert is_short_link("https://www.instagram.com/share/reel/BAabc123/")
+    assert not is_short_link("https://www.tiktok.com/@user/video/1")
+    assert canonicalize("https://www.instagram.com/share/reel/BAabc123/") is None
+
+def test_media_key_falls_back_to_canonical_url():
+    assert media_key("https://Example.com/watch/1/?ref=x") == "https://example.com/watch/1"
+    # Unresolved short links are at least stable across trailing slashes and queries
+    assert media_key("https://vm.tiktok.com/abc/") == media_key("https://vm.tiktok.com/abc?x=1")
+
+@pytest.fixture
+async def redirector():
+    """Short-link server: /s/<id> redirects to a TikTok video URL, /dead doesn't redirect."""
+    hits = []
+
+    async def short(request):
+        hits.append(request.method)
+        await asyncio.sleep(0.05)
+        raise web.HTTPMovedPermanently(f"https://www.tiktok.com/@user/video/{request.match_info['id']}?_r=1")
+
+    async def dead(request):
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_route("HEAD", "/s/{id}", short)
+    app.router.add_route("HEAD", "/dead", dead)
+    server = TestServer(app)
+    await server.start_server()
+    yield server, hits
+    await server.close()
+    await http_client.close()
+
+@pytest.mark.asyncio
+async def test_resolves_with_one_cached_head_request(redirector):
+    server, hits = redirector
+    resolver = ShortLinkResolver(ttl=60)
+    url = str(server.make_url("/s/42"))
+
+    results = await asyncio.gather(*(resolver.resolve(url) for _ in range(3)))
+    again = await resolver.resolve(url + "/")
+
+    assert results == [again] * 3 == ["https://www.tiktok.com/@user/video/42?_r=1"] * 3
+    assert hits == ["HEAD"]
+
+@pytest.mark.asyncio
+async def test_resolution_expires(redirector):
+    server, hits = redirector
+    now = [0.0]
+    resolver = ShortLinkResolver(ttl=60, clock=lambda: now[0])
+    url = str(server.make_url("/s/42"))
+
+    await resolver.resolve(url)
+    now[0] = 61
+    assert resolver.cached(url) is None
+    await resolver.resolve(url)
+
+    assert len(hits) == 2
+
+@pytest.mark.asyncio
+async def test_unresolvable_link_is_not_cached(redirector):
+    server, _ = redirector
+    resolver = ShortLinkResolver()
+
+    assert await resolver.resolve(str(server.make_url("/dead"))) is None
+    assert resolver.cached(str(server.make_url("/dead"))) is None
+
+@pytest.mark.asyncio
+async def test_resolve_media_key_maps_short_link_to_video_id():
+    resolver = ShortLinkResolver()
+    resolver._head = AsyncMock(return_value="https://www.tiktok.com/@user/video/7351234567890?_r=1")
+
+    with patch("src.canonical.short_links", resolver):
+        key = await resolve_media_key("https://vm.tiktok.com/ZSmCyNC4U/")
+        # Later synchronous lookups (file_id and media caches) see the same key
+        assert media_key("https://vm.tiktok.com/ZSmCyNC4U") == key
+
+    assert key == "tiktok:7351234567890"
+    assert await resolve_media_key("https://www.tiktok.com/@u/video/7351234567890") == key
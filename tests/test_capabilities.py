@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import pytest
+from src.capabilities import Capabilities
+
+
+def fake_binary(directory, name, exit_code=0):
+    path = directory / name
+    path.write_text(f"#!{sys.executable}\nimport sys\nsys.exit({exit_code})\n")
+    path.chmod(0o755)
+    return path
+
+
+@pytest.fixture
+def bin_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "bin"
+    directory.mkdir()
+    monkeypatch.setenv("PATH", str(directory))
+    return directory
+
+
+@pytest.mark.asyncio
+async def test_probe_result_is_cached_on_disk(bin_dir, tmp_path):
+    fake_binary(bin_dir, "tool")
+    cache_path = str(tmp_path / "caps.json")
+    caps = Capabilities(cache_path, probes={"tool": ["--version"]})
+
+    assert caps.cached("tool") is None
+    assert await caps.available("tool") is True
+
+    entry = json.loads(open(cache_path).read())["tool"]
+    assert entry["available"] is True
+    assert entry["fingerprint"].startswith(str(bin_dir / "tool"))
+
+    # A fresh process trusts the cache without probing
+    assert Capabilities(cache_path).cached("tool") is True
+
+
+@pytest.mark.asyncio
+async def test_changed_binary_is_probed_again(bin_dir, tmp_path):
+    path = fake_binary(bin_dir, "tool")
+    cache_path = str(tmp_path / "caps.json")
+    await Capabilities(cache_path).available("tool")
+
+    fake_binary(bin_dir, "tool", exit_code=1)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    caps = Capabilities(cache_path)
+    assert caps.cached("tool") is None
+    assert await caps.available("tool") is False
+
+
+@pytest.mark.asyncio
+async def test_missing_binary_is_unavailable_without_probe(bin_dir, tmp_path):
+    caps = Capabilities(str(tmp_path / "caps.json"))
+    assert caps.cached("nope") is False
+    assert await caps.available("nope") is False
+
+
+@pytest.mark.asyncio
+async def test_start_probes_in_background_once(bin_dir, tmp_path):
+    fake_binary(bin_dir, "yt-dlp")
+    caps = Capabilities(str(tmp_path / "caps.json"), probes={"yt-dlp": ["--version"], "ffmpeg": ["-version"]})
+    caps.start()
+    task = caps._tasks["yt-dlp"]
+    assert "ffmpeg" not in caps._tasks  # not on PATH, known without probing
+
+    assert await caps.available("yt-dlp") is True
+    assert caps._tasks["yt-dlp"] is task
+    await caps.close()
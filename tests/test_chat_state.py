@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from src.chat_state import ChatStateStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_streak_counts_consecutive_messages_per_user():
+    store = ChatStateStore(snapshot_path="")
+    assert await store.record_message(1, 10) == 1
+    assert await store.record_message(1, 10) == 2
+    assert await store.record_message(1, 20) == 1
+    assert await store.record_message(2, 10) == 1
+
+
+@pytest.mark.asyncio
+async def test_least_recently_active_chat_is_evicted():
+    store = ChatStateStore(max_chats=2, snapshot_path="")
+    await store.record_message(1, 10)
+    await store.record_message(2, 10)
+    await store.record_message(1, 10)
+    await store.record_message(3, 10)
+
+    assert len(store) == 2
+    assert store.get(2) is None
+    assert store.get(1).streak == 2
+
+
+@pytest.mark.asyncio
+async def test_idle_chats_expire():
+    clock = FakeClock()
+    store = ChatStateStore(ttl=60, snapshot_path="", clock=clock)
+    await store.record_message(1, 10)
+    await store.record_message(1, 10)
+    clock.now += 61
+    assert store.get(1) is None
+    assert await store.record_message(1, 10) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_updates_are_not_lost():
+    store = ChatStateStore(snapshot_path="")
+    await asyncio.gather(*(store.record_message(1, 10) for _ in range(50)))
+    assert store.get(1).streak == 50
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("filename", ["chat_state.json", "chat_state.sqlite3"])
+async def test_snapshot_survives_restart(tmp_path, filename):
+    path = str(tmp_path / filename)
+    store = ChatStateStore(snapshot_path=path)
+    await store.record_message(1, 10)
+    await store.record_message(1, 10)
+    await store.record_message(2, 20)
+    await store.close()
+
+    restored = ChatStateStore(snapshot_path=path)
+    restored.start()
+    try:
+        assert restored.get(1).streak == 2
+        assert restored.get(2).last_user == 20
+        assert await restored.record_message(1, 10) == 3
+    finally:
+        await restored.close()
+
+
+@pytest.mark.asyncio
+async def test_load_skips_expired_and_respects_ceiling(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "chat_state.json")
+    store = ChatStateStore(snapshot_path=path, clock=clock)
+    await store.record_message(1, 10)
+    clock.now += 10
+    await store.record_message(2, 10)
+    clock.now += 10
+    await store.record_message(3, 10)
+    await store.snapshot()
+
+    restored = ChatStateStore(max_chats=1, ttl=100, snapshot_path=path, clock=clock)
+    restored.load()
+    assert len(restored) == 1
+    assert restored.get(3) is not None
+
+
+@pytest.mark.asyncio
+async def test_corrupt_snapshot_is_ignored(tmp_path):
+    path = tmp_path / "chat_state.json"
+    path.write_text("{not json")
+    store = ChatStateStore(snapshot_path=str(path))
+    store.load()
+    assert len(store) == 0
@@ -0,0 +1,104 @@
+import sys
+import time
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.downloader import DownloadExecutor
+from src.scheduler import JobScheduler
+from src.handlers import BaseHandler
+from deadline import Deadline, DeadlineExceeded, budget, current_deadline  # the module src.* code imports
+
+def test_clamp_caps_timeouts_to_the_remaining_budget():
+    now = [0.0]
+    deadline = Deadline(10, clock=lambda: now[0])
+
+    assert deadline.clamp(60) == 10
+    assert deadline.clamp(5) == 5
+    now[0] = 8
+    assert deadline.clamp(None) == 2
+    now[0] = 10
+    assert deadline.expired
+    with pytest.raises(DeadlineExceeded):
+        deadline.clamp(5)
+
+@pytest.mark.asyncio
+async def test_budget_follows_the_current_deadline():
+    assert budget(30) == 30
+    assert current_deadline() is None
+
+    async def job():
+        # Tasks started by the job (hedged strategies) see the same deadline
+        return await asyncio.ensure_future(asyncio.sleep(0, result=(budget(30), current_deadline())))
+
+    deadline = Deadline(5)
+    capped, seen = await deadline.run(job())
+
+    assert capped <= 5 and seen is deadline
+    assert current_deadline() is None
+
+@pytest.mark.asyncio
+async def test_run_cancels_work_when_the_budget_runs_out():
+    cancelled = asyncio.Event()
+
+    async def job():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(DeadlineExceeded):
+        await Deadline(0.05).run(job())
+    assert cancelled.is_set()
+
+@pytest.mark.asyncio
+async def test_subprocess_timeout_is_capped_by_the_deadline():
+    executor = DownloadExecutor()
+    start = time.monotonic()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await Deadline(0.2).run(executor.run([sys.executable, "-c", "import time; time.sleep(10)"], timeout=60))
+
+    assert time.monotonic() - start < 5
+
+@pytest.mark.asyncio
+async def test_scheduler_frees_the_slot_of_an_expired_job():
+    scheduler = JobScheduler(workers=1, platform_limits={})
+    log = []
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def quick():
+        log.append("quick")
+
+    stuck = scheduler.submit(1, "tiktok", slow, deadline=Deadline(0.05))
+    # Still queued when its deadline passes, so it never starts
+    stale = scheduler.submit(2, "tiktok", quick, deadline=Deadline(0.01))
+    fresh = scheduler.submit(3, "tiktok", quick, deadline=Deadline(5))
+
+    assert await asyncio.wait_for(stuck, 1) is False
+    assert await stale is False
+    assert await fresh is True
+    assert log == ["quick"]
+    await scheduler.join()
+
+class DummyHandler(BaseHandler):
+    def can_handle(self, message):
+        return True
+
+    async def handle(self, update, message, sender_name):
+        pass
+
+@pytest.mark.asyncio
+async def test_upload_timeouts_follow_the_deadline():
+    update = MagicMock()
+    update.message.chat.send_video = AsyncMock()
+    handler = DummyHandler()
+
+    await handler._send_video(update, b"video", "caption")
+    assert "write_timeout" not in update.message.chat.send_video.call_args.kwargs
+
+    await Deadline(30).run(handler._send_video(update, b"video", "caption"))
+    kwargs = update.message.chat.send_video.call_args.kwargs
+    assert 0 < kwargs["write_timeout"] <= 30 and 0 < kwargs["read_timeout"] <= 30
@@ -0,0 +1,125 @@
+import sys
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+from src.downloader import DownloadExecutor, run_ytdlp
+
+@pytest.mark.asyncio
+async def test_run_captures_output():
+    executor = DownloadExecutor(max_concurrent=2)
+    result = await executor.run([sys.executable, "-c", "import sys; sys.stdout.write('video'); sys.stderr.write('log')"])
+
+    assert result.returncode == 0
+    assert result.stdout == b"video"
+    assert result.stderr == b"log"
+
+@pytest.mark.asyncio
+async def test_run_nonzero_exit():
+    executor = DownloadExecutor()
+    result = await executor.run([sys.executable, "-c", "import sys; sys.exit(3)"])
+
+    assert result.returncode == 3
+    assert result.stdout == b""
+
+@pytest.mark.asyncio
+async def test_run_timeout_raises():
+    executor = DownloadExecutor()
+    with pytest.raises(asyncio.TimeoutError):
+        await executor.run([sys.executable, "-c", "import time; time.sleep(10)"], timeout=0.2)
+
+@pytest.mark.asyncio
+async def test_run_cancel_kills_child():
+    executor = DownloadExecutor()
+    with patch.object(executor, "_kill", wraps=executor._kill) as mock_kill:
+        task = asyncio.create_task(executor.run([sys.executable, "-c", "import time; time.sleep(10)"]))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    mock_kill.assert_called_once()
+    assert mock_kill.call_args[0][0].returncode is not None
+
+@pytest.mark.asyncio
+async def test_jobs_run_concurrently():
+    executor = DownloadExecutor(max_concurrent=3)
+    cmd = [sys.executable, "-c", "import time; time.sleep(0.5)"]
+
+    start = time.monotonic()
+    await asyncio.gather(*(executor.run(cmd) for _ in range(3)))
+
+    assert time.monotonic() - start < 1.4
+
+@pytest.mark.asyncio
+async def test_run_ytdlp_prepends_binary():
+    with patch("src.downloader.executor.run", new_callable=AsyncMock) as mock_run:
+        await run_ytdlp(["--version"], timeout=5)
+
+    mock_run.assert_called_once_with(["yt-dlp", "--version"], timeout=5, stdout=None)
+
+@pytest.mark.asyncio
+async def test_children_run_with_limits():
+    executor = DownloadExecutor(max_memory=2 * 1024 ** 3, max_cpu=30, nice=5)
+    script = (
+        "import os, resource; "
+        "print(resource.getrlimit(resource.RLIMIT_AS)[0], resource.getrlimit(resource.RLIMIT_CPU)[0], "
+        "os.nice(0), os.getpgid(0) == os.getpid())"
+    )
+    result = await executor.run([sys.executable, "-c", script])
+
+    memory, cpu, niceness, group_leader = result.stdout.split()
+    assert int(memory) == 2 * 1024 ** 3
+    assert int(cpu) == 30
+    assert int(niceness) >= 5
+    assert group_leader == b"True"
+
+def running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # A killed orphan may linger as a zombie until init reaps it
+            return f.read().rpartition(")")[2].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+@pytest.mark.asyncio
+async def test_timeout_kills_the_whole_process_tree(tmp_path):
+    executor = DownloadExecutor()
+    pid_file = tmp_path / "grandchild.pid"
+    # Like yt-dlp starting ffmpeg: the grandchild would outlive a plain kill of its parent
+    script = (
+        "import subprocess, sys, time; "
+        "p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); "
+        f"open({str(pid_file)!r}, 'w').write(str(p.pid)); time.sleep(30)"
+    )
+    with pytest.raises(asyncio.TimeoutError):
+        await executor.run([sys.executable, "-c", script], timeout=1)
+
+    await asyncio.sleep(0.1)
+    assert not running(int(pid_file.read_text()))
+
+@pytest.mark.asyncio
+async def test_failing_sink_kills_the_child(tmp_path):
+    executor = DownloadExecutor()
+    pid_file = tmp_path / "child.pid"
+    script = f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); print('x', flush=True); time.sleep(30)"
+
+    class FullDisk:
+        async def read_from(self, reader):
+            await reader.read(1)
+            raise OSError(28, "No space left on device")
+
+    with pytest.raises(OSError):
+        await executor.run([sys.executable, "-c", script], stdout=FullDisk())
+
+    assert not running(int(pid_file.read_text()))
+
+@pytest.mark.asyncio
+async def test_reports_cpu_and_memory_usage():
+    executor = DownloadExecutor()
+    burn = "import time; end = time.process_time() + 0.3\nwhile time.process_time() < end: pass"
+
+    result = await executor.run([sys.executable, "-c", burn])
+
+    assert result.cpu_seconds >= 0.2
+    assert result.max_rss > 1024 ** 2
@@ -24,9 +24,9 @@ async def test_can_handle_valid_facebook_links(facebook_handler):
 
 @pytest.mark.asyncio
 async def test_handle_successful_memory_download(facebook_handler, mock_update):
-    with patch('subprocess.run') as mock_run:
+    with patch('src.handlers.facebook_handler.run_ytdlp', new_callable=AsyncMock) as mock_run:
         # Mock successful yt-dlp output to memory
-        mock_run.return_value.stdout = b"fake video data"
+        mock_run.side_effect = lambda args, stdout=None, **kwargs: stdout.write(b"fake video data")
         mock_run.return_value.returncode = 0
         
         await facebook_handler.handle(
@@ -40,7 +40,7 @@ async def test_handle_successful_memory_download(facebook_handler, mock_update):
 
 @pytest.mark.asyncio
 async def test_handle_successful_file_download(facebook_handler, mock_update):
-    with patch('subprocess.run') as mock_run, \
+    with patch('src.handlers.facebook_handler.run_ytdlp', new_callable=AsyncMock) as mock_run, \
          patch('os.path.exists') as mock_exists, \
          patch('os.path.getsize') as mock_size, \
          patch('builtins.open', new_callable=MagicMock) as mock_open:
@@ -65,7 +65,7 @@ async def test_handle_successful_file_download(facebook_handler, mock_update):
 
 @pytest.mark.asyncio
 async def test_handle_download_failure(facebook_handler, mock_update):
-    with patch('subprocess.run') as mock_run, \
+    with patch('src.handlers.facebook_handler.run_ytdlp', new_callable=AsyncMock) as mock_run, \
          patch('os.path.exists') as mock_exists:
         # Mock failed memory download
         mock_run.return_value.stdout = b""
@@ -86,7 +86,7 @@ async def test_handle_download_failure(facebook_handler, mock_update):
 
 @pytest.mark.asyncio
 async def test_handle_exception_handling(facebook_handler, mock_update):
-    with patch('subprocess.run', side_effect=Exception("Test error")):
+    with patch('src.handlers.facebook_handler.run_ytdlp', new_callable=AsyncMock, side_effect=Exception("Test error")):
         await facebook_handler.handle(
             mock_update,
             "https://www.facebook.com/reel/123456789",
@@ -0,0 +1,74 @@
+import threading
+import pytest
+from unittest.mock import patch
+from src.file_id_cache import FileIdCache
+from src.canonical import canonical_url
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = FileIdCache(path=str(tmp_path / "cache.sqlite3"), ttl=60, max_entries=2)
+    yield cache
+    cache.close()
+
+def test_canonical_url_strips_query_and_trailing_slash():
+    assert canonical_url("https://www.Instagram.com/reel/abc123/?igsh=xyz") == "https://www.instagram.com/reel/abc123"
+    assert canonical_url("http://x.com/user/status/1#frag") == "https://x.com/user/status/1"
+
+@pytest.mark.asyncio
+async def test_set_and_get(cache):
+    await cache.set("https://vm.tiktok.com/abc/", "FILE_ID")
+    assert await cache.get("https://vm.tiktok.com/abc") == "FILE_ID"
+    assert await cache.get("https://vm.tiktok.com/other") is None
+
+@pytest.mark.asyncio
+async def test_expired_entry_is_dropped(cache):
+    with patch("src.file_id_cache.time.time", return_value=1000):
+        await cache.set("https://x.com/a/status/1", "FILE_ID")
+    with patch("src.file_id_cache.time.time", return_value=1061):
+        assert await cache.get("https://x.com/a/status/1") is None
+
+@pytest.mark.asyncio
+async def test_evicts_least_recently_used(cache):
+    cache.ttl = float("inf")
+    with patch("src.file_id_cache.time.time", side_effect=[1, 2, 3, 4]):
+        await cache.set("https://x.com/a/status/1", "ONE")
+        await cache.set("https://x.com/a/status/2", "TWO")
+        await cache.get("https://x.com/a/status/1")
+        await cache.set("https://x.com/a/status/3", "THREE")
+
+    assert await cache.get("https://x.com/a/status/1") == "ONE"
+    assert await cache.get("https://x.com/a/status/2") is None
+    assert await cache.get("https://x.com/a/status/3") == "THREE"
+
+@pytest.mark.asyncio
+async def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    first = FileIdCache(path=path)
+    await first.set("https://fb.watch/abc", "FILE_ID")
+    first.close()
+
+    second = FileIdCache(path=path)
+    assert await second.get("https://fb.watch/abc") == "FILE_ID"
+    second.close()
+
+@pytest.mark.asyncio
+async def test_aliases_of_one_post_share_an_entry(cache):
+    await cache.set("https://www.instagram.com/reel/abc123/?igsh=xyz", "FILE_ID")
+    assert await cache.get("https://instagram.com/p/abc123") == "FILE_ID"
+    assert await cache.get("https://www.instagram.com/reels/abc123/") == "FILE_ID"
+
+@pytest.mark.asyncio
+async def test_sqlite_work_runs_off_the_event_loop(cache):
+    threads = []
+    connect = cache._connect
+    def recording_connect():
+        threads.append(threading.current_thread())
+        return connect()
+    cache._connect = recording_connect
+
+    await cache.set("https://x.com/a/status/1", "FILE_ID")
+    assert await cache.get("https://x.com/a/status/1") == "FILE_ID"
+    await cache.delete("https://x.com/a/status/1")
+
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
@@ -0,0 +1,160 @@
+import json
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from src.downloader import ProcessResult
+from deadline import Deadline, DeadlineExceeded, budget  # the module src.* code imports
+from src.format_probe import FormatProbe, passthrough_url, select_format, slim_info
+
+MB = 1024 * 1024
+
+def fmt(format_id, size=None, height=None, vcodec=None, acodec=None, approx=False):
+    return {
+        "format_id": format_id,
+        "height": height,
+        "vcodec": vcodec,
+        "acodec": acodec,
+        "filesize": None if approx else size,
+        "filesize_approx": size if approx else None,
+    }
+
+INFO = {"formats": [
+    fmt("360", 5 * MB, 360, "avc1", "mp4a"),
+    fmt("720", 20 * MB, 720, "avc1", "mp4a"),
+    fmt("1080", 80 * MB, 1080, "avc1", "mp4a"),
+    fmt("v1080", 40 * MB, 1080, "avc1", "none"),
+    fmt("a-hi", 8 * MB, vcodec="none", acodec="mp4a"),
+    fmt("a-lo", 2 * MB, vcodec="none", acodec="mp4a"),
+]}
+
+def test_picks_best_muxed_format_that_fits():
+    assert select_format(INFO, 50 * MB, muxed_only=True) == "720"
+
+def test_pairs_video_only_with_largest_fitting_audio():
+    assert select_format(INFO, 50 * MB) == "v1080+a-hi"
+    assert select_format(INFO, 45 * MB) == "v1080+a-lo"
+
+def test_uses_approximate_size_and_unset_codecs():
+    info = {"formats": [fmt("sd", 3 * MB, 540, approx=True), fmt("hd", 9 * MB, 1080, approx=True)]}
+
+    assert select_format(info, 10 * MB, muxed_only=True) == "hd"
+
+def test_smallest_variant_when_nothing_fits():
+    assert select_format(INFO, 1 * MB, muxed_only=True) == "360"
+
+def test_none_without_sizes():
+    assert select_format({"formats": [fmt("best", height=720)]}, 50 * MB) is None
+
+def test_slim_info_keeps_only_selection_fields():
+    info = slim_info({"id": "x", "duration": 12, "title": "t", "formats": [
+        {"format_id": "a", "url": "https://cdn", "fragments": [1, 2], "filesize": 10},
+    ]})
+
+    assert info == {"id": "x", "duration": 12, "formats": [
+        {**fmt("a"), "ext": None, "tbr": None, "filesize": 10, "url": "https://cdn", "protocol": None},
+    ]}
+
+def test_passthrough_url_picks_a_progressive_mp4_that_fits():
+    def variant(format_id, size, height, protocol="https", ext="mp4"):
+        return {**fmt(format_id, size, height), "url": f"https://video.example/{format_id}.{ext}",
+                "protocol": protocol, "ext": ext}
+
+    info = {"formats": [
+        variant("hls-720", 8 * MB, 720, protocol="m3u8_native"),
+        variant("360", 3 * MB, 360),
+        variant("720", 9 * MB, 720),
+        variant("1080", 30 * MB, 1080),
+        variant("webm", 5 * MB, 1080, ext="webm"),
+        fmt("unsized", height=1080),
+    ]}
+
+    assert passthrough_url(info, 20 * MB) == "https://video.example/720.mp4"
+    assert passthrough_url(info, 1 * MB) is None
+
+def ytdlp_json(info):
+    return AsyncMock(return_value=ProcessResult(0, json.dumps(info).encode(), b""))
+
+@pytest.mark.asyncio
+async def test_metadata_is_cached_per_url():
+    probe = FormatProbe(enabled=True)
+    with patch("src.format_probe.ytdlp_pool") as pool, patch("src.format_probe.run_ytdlp", ytdlp_json(INFO)) as run:
+        pool.enabled = False
+        first = await probe.selector("https://x/1", muxed_only=True)
+        second = await probe.selector("https://x/1", muxed_only=True)
+        await probe.metadata("https://x/2")
+
+    assert first == second == "720/best"
+    assert run.await_count == 2
+    assert run.await_args_list[0][0][0][0] == "-J"
+
+@pytest.mark.asyncio
+async def test_concurrent_probes_share_one_extraction():
+    probe = FormatProbe(enabled=True)
+
+    async def slow(*args, **kwargs):
+        await asyncio.sleep(0.05)
+        return ProcessResult(0, json.dumps(INFO).encode(), b"")
+
+    with patch("src.format_probe.ytdlp_pool") as pool, patch("src.format_probe.run_ytdlp", AsyncMock(side_effect=slow)) as run:
+        pool.enabled = False
+        results = await asyncio.gather(*(probe.metadata("https://x/1") for _ in range(5)))
+
+    assert run.await_count == 1
+    assert all(result is results[0] for result in results)
+
+@pytest.mark.asyncio
+async def test_failed_extraction_falls_back_and_expires():
+    now = [0.0]
+    probe = FormatProbe(enabled=True, clock=lambda: now[0])
+    failing = AsyncMock(return_value=ProcessResult(1, b"", b"ERROR: private"))
+    with patch("src.format_probe.ytdlp_pool") as pool, patch("src.format_probe.run_ytdlp", failing):
+        pool.enabled = False
+        assert await probe.selector("https://x/1") == "best"
+        assert await probe.selector("https://x/1") == "best"
+        assert failing.await_count == 1
+        now[0] = 61
+        await probe.selector("https://x/1")
+        assert failing.await_count == 2
+
+@pytest.mark.asyncio
+async def test_running_out_of_deadline_is_not_cached_as_a_failure():
+    probe = FormatProbe(enabled=True)
+    calls = []
+
+    async def run(args, timeout=None):
+        calls.append(args)
+        if len(calls) == 1:
+            # The first extraction is cut short by the budget of the update that started it
+            await asyncio.sleep(budget(timeout))
+            raise asyncio.TimeoutError
+        return ProcessResult(0, json.dumps(INFO).encode(), b"")
+
+    with patch("src.format_probe.ytdlp_pool") as pool, patch("src.format_probe.run_ytdlp", AsyncMock(side_effect=run)):
+        pool.enabled = False
+        hurried = asyncio.ensure_future(Deadline(0.05).run(probe.metadata("https://x/1")))
+        await asyncio.sleep(0)
+        patient = asyncio.ensure_future(Deadline(5).run(probe.metadata("https://x/1")))
+
+        with pytest.raises(DeadlineExceeded):
+            await hurried
+        info = await patient
+
+    assert info is not None and info["formats"]
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_lru_bound():
+    probe = FormatProbe(enabled=True, max_entries=2)
+    with patch("src.format_probe.ytdlp_pool") as pool, patch("src.format_probe.run_ytdlp", ytdlp_json(INFO)):
+        pool.enabled = False
+        for n in range(3):
+            await probe.metadata(f"https://x/{n}")
+
+    assert [url for url, _ in probe._cache] == ["https://x/1", "https://x/2"]
+
+@pytest.mark.asyncio
+async def test_disabled_probe_keeps_fallback():
+    probe = FormatProbe(enabled=False)
+    with patch("src.format_probe.run_ytdlp") as run:
+        assert await probe.selector("https://x/1") == "best"
+    run.assert_not_called()
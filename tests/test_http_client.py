@@ -0,0 +1,57 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from src.http_client import HttpClient
+
+@pytest.fixture
+async def server():
+    hits = []
+
+    async def handle(request):
+        hits.append(request.method)
+        return web.Response(text="ok")
+
+    app = web.Application()
+    app.router.add_route("*", "/", handle)
+    server = TestServer(app)
+    await server.start_server()
+    server.hits = hits
+    yield server
+    await server.close()
+
+@pytest.mark.asyncio
+async def test_session_is_reused():
+    client = HttpClient(warmup_urls=[])
+    first = await client.session()
+    second = await client.session()
+
+    assert first is second
+    assert first.connector.limit_per_host == client.limit_per_host
+    await client.close()
+    assert first.closed
+
+@pytest.mark.asyncio
+async def test_session_recreated_after_close():
+    client = HttpClient(warmup_urls=[])
+    first = await client.session()
+    await client.close()
+    second = await client.session()
+
+    assert second is not first
+    assert not second.closed
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_warm_up_opens_connections(server):
+    client = HttpClient(warmup_urls=[])
+    await client.warm_up([str(server.make_url("/"))])
+
+    assert server.hits == ["HEAD"]
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_warm_up_ignores_unreachable_hosts():
+    client = HttpClient(warmup_urls=[])
+    # Should not raise
+    await client.warm_up(["http://127.0.0.1:1/"])
+    await client.close()
@@ -1,7 +1,12 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from telegram import Update, Message, Chat
 from src.handlers.instagram_handler import InstagramHandler
+from src.media_buffer import MediaBuffer
+from src.ytdlp_pool import YtdlpPool
+from ytdlp_pool import ytdlp_pool  # the module src.handlers imports
+from scratch import scratch_space
 
 @pytest.fixture
 def instagram_handler():
@@ -36,7 +41,7 @@ async def test_handle_no_url_in_message(instagram_handler, mock_update):
 
 @pytest.mark.asyncio
 async def test_handle_successful_reelsaver_download(instagram_handler, mock_update):
-    with patch.object(instagram_handler, "_download_via_reelsaver", new_callable=AsyncMock, return_value=b"fake_video"):
+    with patch.object(instagram_handler, "_download_via_reelsaver", new_callable=AsyncMock, return_value=MediaBuffer.from_bytes(b"fake_video")):
         await instagram_handler.handle(
             mock_update,
             "https://www.instagram.com/reel/abc123/",
@@ -50,10 +55,27 @@ async def test_handle_successful_reelsaver_download(instagram_handler, mock_upda
 @pytest.mark.asyncio
 async def test_handle_all_methods_fail(instagram_handler, mock_update):
     with patch.object(instagram_handler, "_download_via_reelsaver", new_callable=AsyncMock, return_value=None):
-        with patch.object(instagram_handler, "yt_dlp_available", False):
+        with patch.object(instagram_handler, "yt_dlp_available", False), \
+                patch.object(instagram_handler, "is_dd_link_working", new_callable=AsyncMock, return_value=False):
             await instagram_handler.handle(
                 mock_update,
                 "https://www.instagram.com/reel/abc123/",
                 "Test User",
             )
-    mock_update.message.chat.send_video.assert_not_called() 
\ No newline at end of file
+    mock_update.message.chat.send_video.assert_not_called() 
+
+@pytest.mark.skipif(YtdlpPool(workers=1).enabled is False, reason="yt-dlp not installed")
+@pytest.mark.asyncio
+async def test_pool_download_fits_in_a_quota_of_one_job(instagram_handler, video_server, monkeypatch):
+    monkeypatch.setattr(ytdlp_pool, "workers", 1)
+    # Room for the Instagram job's own directory and nothing else
+    monkeypatch.setattr(scratch_space, "quota", scratch_space.reserve)
+
+    try:
+        media = await asyncio.wait_for(instagram_handler._download_via_ytdlp(video_server), 60)
+        with media:
+            assert media.input_file().input_file_content.read() == b"pooled video data" * 1024
+            assert scratch_space.reserved == scratch_space.reserve
+    finally:
+        await ytdlp_pool.close()
+    assert scratch_space.reserved == 0
@@ -2,7 +2,9 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from telegram import Update, Message, User, Chat
 from telegram.ext import ContextTypes
-from src.main import handler, main
+from src.main import handler, main, on_startup, on_shutdown
+from src.router import Router
+from src.scheduler import JobScheduler
 
 @pytest.mark.asyncio
 async def test_handler_no_message():
@@ -30,7 +32,7 @@ async def test_handler_no_text():
 async def test_handler_success():
     # Test successful message handling
     mock_message = MagicMock(spec=Message)
-    mock_message.text = "test message"
+    mock_message.text = "test message https://example.com/video/1"
     mock_message.from_user = MagicMock(spec=User)
     mock_message.from_user.full_name = "Test User"
     mock_message.chat_id = 123
@@ -41,21 +43,36 @@ async def test_handler_success():
     
     # Mock the handlers
     mock_handler = MagicMock()
-    mock_handler.can_handle.return_value = True
+    mock_handler.URL_PATTERN = r"https://example\.com/\S+"
     mock_handler.handle = AsyncMock()
     
-    with patch('src.main.all_handlers', [mock_handler]):
+    scheduler = JobScheduler()
+    with patch('src.main.router', Router([mock_handler])), patch('src.main.scheduler', scheduler):
         await handler(mock_update, mock_context)
+        await scheduler.join()
         
-        # Verify handler was called
-        mock_handler.can_handle.assert_called_once_with("test message")
+        # Verify handler was called with the extracted URL
         mock_handler.handle.assert_called_once()
+        assert mock_handler.handle.call_args[0][1] == "https://example.com/video/1"
+
+@pytest.mark.asyncio
+async def test_handler_skips_messages_without_links():
+    mock_message = MagicMock(spec=Message)
+    mock_message.text = "just chatting"
+    mock_update = MagicMock(spec=Update)
+    mock_update.message = mock_message
+    mock_context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+
+    with patch('src.main.randomize_status', new_callable=AsyncMock) as mock_status:
+        await handler(mock_update, mock_context)
+
+        mock_status.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_handler_exception():
     # Test exception handling
     mock_message = MagicMock(spec=Message)
-    mock_message.text = "test message"
+    mock_message.text = "https://example.com/video/1"
     mock_message.from_user = MagicMock(spec=User)
     mock_message.from_user.full_name = "Test User"
     mock_message.chat_id = 123
@@ -66,22 +83,74 @@ async def test_handler_exception():
     
     # Mock a handler that raises an exception
     mock_handler = MagicMock()
-    mock_handler.can_handle.return_value = True
+    mock_handler.URL_PATTERN = r"https://example\.com/\S+"
     mock_handler.handle = AsyncMock(side_effect=Exception("Test error"))
     
-    with patch('src.main.all_handlers', [mock_handler]):
+    scheduler = JobScheduler()
+    with patch('src.main.router', Router([mock_handler])), patch('src.main.scheduler', scheduler):
         # Should not raise an exception
         await handler(mock_update, mock_context)
+        await scheduler.join()
 
 def test_main():
     # Test the main function
     with patch('src.main.ApplicationBuilder') as mock_builder:
         mock_app = MagicMock()
-        mock_builder.return_value.token.return_value.build.return_value = mock_app
+        mock_builder.return_value.token.return_value.post_init.return_value.post_shutdown.return_value.build.return_value = mock_app
         
         main()
         
         # Verify the application was built and started
         mock_builder.return_value.token.assert_called_once()
         mock_app.add_handler.assert_called_once()
-        mock_app.run_polling.assert_called_once() 
\ No newline at end of file
+        mock_app.run_polling.assert_called_once() 
+
+@pytest.mark.asyncio
+async def test_lifecycle_hooks_start_and_stop_shared_services():
+    with patch('src.main.http_client') as mock_client, patch('src.main.scheduler') as mock_scheduler, \
+         patch('src.main.metrics_server') as mock_metrics, patch('src.main.ytdlp_pool') as mock_pool, \
+         patch('src.main.capabilities') as mock_capabilities, patch('src.main.chat_states') as mock_chat_states, \
+         patch('src.main.scratch_space') as mock_scratch:
+        mock_capabilities.close = AsyncMock()
+        mock_scratch.close = AsyncMock()
+        mock_chat_states.close = AsyncMock()
+        mock_client.start = AsyncMock()
+        mock_pool.start = AsyncMock()
+        mock_pool.close = AsyncMock()
+        mock_client.close = AsyncMock()
+        mock_scheduler.stop = AsyncMock()
+        mock_metrics.start = AsyncMock()
+        mock_metrics.stop = AsyncMock()
+
+        await on_startup(MagicMock())
+        await on_shutdown(MagicMock())
+
+        mock_client.start.assert_called_once()
+        mock_client.close.assert_called_once()
+        mock_scheduler.stop.assert_called_once()
+        mock_metrics.start.assert_called_once()
+        mock_metrics.stop.assert_called_once()
+        mock_pool.start.assert_called_once()
+        mock_pool.close.assert_called_once()
+        mock_capabilities.start.assert_called_once()
+        mock_capabilities.close.assert_called_once()
+        mock_chat_states.start.assert_called_once()
+        mock_chat_states.close.assert_called_once()
+        mock_scratch.start.assert_called_once()
+        mock_scratch.close.assert_called_once()
+
+
+def test_main_webhook_mode():
+    with patch('src.main.ApplicationBuilder') as mock_builder, \
+         patch('src.main.BOT_MODE', 'webhook'), \
+         patch('src.main.run_webhook', new_callable=AsyncMock) as mock_run_webhook:
+        mock_app = MagicMock()
+        builder = mock_builder.return_value.token.return_value.post_init.return_value.post_shutdown.return_value
+        builder.concurrent_updates.return_value.build.return_value = mock_app
+
+        main()
+
+        builder.concurrent_updates.assert_called_once()
+        mock_app.add_handler.assert_called_once()
+        mock_run_webhook.assert_awaited_once_with(mock_app)
+        mock_app.run_polling.assert_not_called()
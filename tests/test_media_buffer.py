@@ -0,0 +1,58 @@
+import sys
+import pytest
+from src.media_buffer import MediaBuffer
+from src.downloader import DownloadExecutor
+
+class FakeReader:
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    async def read(self, n):
+        return self.chunks.pop(0) if self.chunks else b""
+
+@pytest.mark.asyncio
+async def test_read_from_streams_chunks():
+    with MediaBuffer() as buffer:
+        written = await buffer.read_from(FakeReader([b"abc", b"def"]))
+
+        assert written == 6
+        assert buffer.size == 6
+        assert buffer.getvalue() == b"abcdef"
+        assert not buffer.on_disk
+
+@pytest.mark.asyncio
+async def test_spills_to_disk_above_threshold():
+    with MediaBuffer(max_memory=4) as buffer:
+        await buffer.read_from(FakeReader([b"abc", b"def"]))
+
+        assert buffer.on_disk
+        assert buffer.getvalue() == b"abcdef"
+
+def test_empty_buffer_is_falsy():
+    with MediaBuffer() as buffer:
+        assert not buffer
+        buffer.write(b"x")
+        assert buffer
+
+def test_input_file_wraps_handle_without_reading():
+    with MediaBuffer.from_bytes(b"video") as buffer:
+        input_file = buffer.input_file()
+
+        assert input_file.filename == "video.mp4"
+        assert input_file.mimetype == "video/mp4"
+        assert input_file.input_file_content.read() == b"video"
+
+@pytest.mark.asyncio
+async def test_executor_streams_stdout_into_buffer():
+    executor = DownloadExecutor()
+    with MediaBuffer(max_memory=1024) as buffer:
+        result = await executor.run(
+            [sys.executable, "-c", "import sys; sys.stdout.buffer.write(b'x' * 100000); sys.stderr.write('done')"],
+            stdout=buffer,
+        )
+
+        assert result.returncode == 0
+        assert result.stdout == b""
+        assert result.stderr == b"done"
+        assert buffer.size == 100000
+        assert buffer.on_disk
@@ -0,0 +1,155 @@
+import os
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from telegram import Update, Message, Chat
+from src.media_buffer import MediaBuffer, MediaFile
+from src.media_cache import MediaCache, STALE_TMP_AGE
+from src.handlers.tiktok_handler import TikTokHandler
+from media_cache import media_cache  # the module src.* code imports
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = MediaCache(root=str(tmp_path / "cache"), max_bytes=100)
+    yield cache
+    cache.close()
+
+def blobs(cache):
+    return sorted(os.listdir(os.path.join(cache.root, "blobs")))
+
+@pytest.mark.asyncio
+async def test_put_and_get_by_canonical_url(cache):
+    with MediaBuffer.from_bytes(b"video") as media:
+        await cache.put("https://www.tiktok.com/@u/video/1?is_from_webapp=1", media)
+
+    cached = await cache.get("https://WWW.tiktok.com/@u/video/1/")
+    assert cached is not None
+    assert cached.input_file().input_file_content.read() == b"video"
+    cached.close()
+    # Closing a cached file leaves the blob for the next hit
+    assert await cache.get("https://www.tiktok.com/@u/video/1") is not None
+    assert await cache.get("https://www.tiktok.com/@u/video/2") is None
+
+@pytest.mark.asyncio
+async def test_identical_content_is_stored_once(cache, tmp_path):
+    source = tmp_path / "a.mp4"
+    source.write_bytes(b"same")
+    with MediaFile(source) as media:
+        await cache.put("https://x.com/a/status/1", media)
+    with MediaBuffer.from_bytes(b"same") as media:
+        await cache.put("https://x.com/b/status/2", media)
+
+    assert len(blobs(cache)) == 1
+    assert (await cache.get("https://x.com/a/status/1")).path == (await cache.get("https://x.com/b/status/2")).path
+    # The source MediaFile removed its own path, the cached copy survives
+    assert not source.exists()
+
+@pytest.mark.asyncio
+async def test_evicts_least_recently_used_over_quota(cache):
+    for n in range(3):
+        with MediaBuffer.from_bytes(bytes([n]) * 40) as media:
+            await cache.put(f"https://x.com/u/status/{n}", media)
+        time.sleep(0.01)
+        if n == 1:
+            # Touch the first video so the second becomes least recently used
+            (await cache.get("https://x.com/u/status/0")).close()
+
+    assert await cache.get("https://x.com/u/status/0") is not None
+    assert await cache.get("https://x.com/u/status/1") is None
+    assert await cache.get("https://x.com/u/status/2") is not None
+    assert len(blobs(cache)) == 2
+
+@pytest.mark.asyncio
+async def test_skips_media_larger_than_quota(cache):
+    with MediaBuffer.from_bytes(b"x" * 101) as media:
+        await cache.put("https://x.com/u/status/1", media)
+
+    assert await cache.get("https://x.com/u/status/1") is None
+
+@pytest.mark.asyncio
+async def test_shared_between_instances(cache):
+    other = MediaCache(root=cache.root, max_bytes=cache.max_bytes)
+    try:
+        with MediaBuffer.from_bytes(b"video") as media:
+            await other.put("https://x.com/u/status/1", media)
+
+        cached = await cache.get("https://x.com/u/status/1")
+        assert cached is not None and len(cached) == 5
+        # A blob removed by another process is a miss, not an error
+        os.remove(cached.path)
+        cached.close()
+        assert await cache.get("https://x.com/u/status/1") is None
+    finally:
+        other.close()
+
+@pytest.mark.asyncio
+async def test_open_handle_survives_eviction(cache):
+    with MediaBuffer.from_bytes(b"a" * 60) as media:
+        await cache.put("https://x.com/u/status/1", media)
+    reader = await cache.get("https://x.com/u/status/1")
+    with MediaBuffer.from_bytes(b"b" * 60) as media:
+        await cache.put("https://x.com/u/status/2", media)
+
+    assert not os.path.exists(reader.path)
+    assert reader.input_file().input_file_content.read() == b"a" * 60
+    reader.close()
+
+@pytest.mark.asyncio
+async def test_sweeps_stale_temporary_files(cache):
+    tmp_dir = os.path.join(cache.root, "tmp")
+    os.makedirs(tmp_dir)
+    stale, fresh = os.path.join(tmp_dir, "stale"), os.path.join(tmp_dir, "fresh")
+    for path in (stale, fresh):
+        open(path, "w").close()
+    old = time.time() - STALE_TMP_AGE - 1
+    os.utime(stale, (old, old))
+
+    await cache.get("https://x.com/u/status/1")
+
+    assert os.listdir(tmp_dir) == ["fresh"]
+
+@pytest.mark.asyncio
+async def test_disabled_without_quota(tmp_path):
+    cache = MediaCache(root=str(tmp_path / "cache"), max_bytes=0)
+
+    assert await cache.get("https://x.com/u/status/1") is None
+    assert not os.path.exists(tmp_path / "cache")
+
+@pytest.mark.asyncio
+async def test_handler_sends_cached_media_without_download():
+    update = MagicMock(spec=Update)
+    update.message = MagicMock(spec=Message)
+    update.message.chat = MagicMock(spec=Chat)
+    update.message.chat.send_video = AsyncMock(side_effect=[Exception("upload failed"), MagicMock()])
+    handler = TikTokHandler()
+    url = "https://www.tiktok.com/@u/video/1"
+
+    with patch.object(handler, "_download_via_api", new_callable=AsyncMock,
+                      side_effect=lambda _: MediaBuffer.from_bytes(b"video")) as download, \
+            patch("src.handlers.delete_message", new_callable=AsyncMock):
+        # The first upload fails after the download; the retry is served from disk
+        await handler.handle(update, url, "User ")
+        await handler.handle(update, url, "User ")
+
+    assert download.await_count == 1
+    assert update.message.chat.send_video.await_count == 2
+
+@pytest.mark.asyncio
+async def test_media_is_cached_after_the_upload():
+    update = MagicMock(spec=Update)
+    update.message = MagicMock(spec=Message)
+    update.message.chat = MagicMock(spec=Chat)
+    url = "https://www.tiktok.com/@u/video/1"
+    cached_during_upload = []
+
+    async def send_video(**kwargs):
+        cached_during_upload.append(await media_cache.get(url))
+
+    update.message.chat.send_video = AsyncMock(side_effect=send_video)
+    with patch("src.handlers.delete_message", new_callable=AsyncMock):
+        assert await TikTokHandler()._send_media(update, MediaBuffer.from_bytes(b"video"), "caption", url)
+
+    # Storing (copy and hash) didn't delay the upload, but still happened
+    assert cached_during_upload == [None]
+    with await media_cache.get(url) as cached:
+        assert len(cached) == 5
@@ -0,0 +1,111 @@
+import asyncio
+import aiohttp
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.metrics import MetricsRegistry, MetricsServer, _Metric
+from src.backends import BackendRegistry
+import metrics
+
+
+def test_counter_renders_with_labels():
+    registry = MetricsRegistry()
+    jobs = registry.counter("bot_jobs", "Jobs", ("platform", "outcome"))
+    jobs.inc(platform="tiktok", outcome="queued")
+    jobs.inc(2, platform="tiktok", outcome="queued")
+
+    assert jobs.value(platform="tiktok", outcome="queued") == 3
+    text = registry.render()
+    assert "# TYPE bot_jobs counter" in text
+    assert 'bot_jobs_total{platform="tiktok",outcome="queued"} 3' in text
+
+
+def test_metric_types_must_render_their_series():
+    class Gauge(_Metric):
+        type = "gauge"
+
+    with pytest.raises(TypeError):
+        Gauge("bot_gauge", "Gauge")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("bot_upload_seconds", "Upload", ("platform",), buckets=(0.1, 1))
+    latency.observe(0.05, platform="x")
+    latency.observe(0.5, platform="x")
+    latency.observe(5, platform="x")
+
+    text = registry.render()
+    assert 'bot_upload_seconds_bucket{platform="x",le="0.1"} 1' in text
+    assert 'bot_upload_seconds_bucket{platform="x",le="1"} 2' in text
+    assert 'bot_upload_seconds_bucket{platform="x",le="+Inf"} 3' in text
+    assert 'bot_upload_seconds_count{platform="x"} 3' in text
+    assert 'bot_upload_seconds_sum{platform="x"} 5.55' in text
+
+
+@pytest.mark.asyncio
+async def test_histogram_time_spans_awaits():
+    registry = MetricsRegistry()
+    dispatch = registry.histogram("bot_dispatch_seconds", "Dispatch")
+    with dispatch.time():
+        await asyncio.sleep(0.02)
+    assert dispatch.count() == 1
+    assert dispatch.sum() >= 0.02
+
+
+def test_label_values_are_escaped_and_checked():
+    registry = MetricsRegistry()
+    counter = registry.counter("c", "C", ("name",))
+    counter.inc(name='a"b\\c')
+    assert 'c_total{name="a\\"b\\\\c"} 1' in registry.render()
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+    with pytest.raises(ValueError):
+        registry.counter("c", "again")
+
+
+@pytest.mark.asyncio
+async def test_backend_attempts_and_download_size_are_recorded():
+    registry = BackendRegistry()
+    media = MagicMock()
+    media.size = 2048
+    media.__bool__.return_value = True
+    before = metrics.download_bytes.count(platform="metrics-test", backend="tikwm")
+
+    [(_, ok)] = registry.arrange("metrics-test", [("tikwm", AsyncMock(return_value=media))])
+    await ok()
+    [(_, failed)] = registry.arrange("metrics-test", [("yt-dlp", AsyncMock(side_effect=RuntimeError("boom")))])
+    with pytest.raises(RuntimeError):
+        await failed()
+
+    assert metrics.backend_attempt_seconds.count(platform="metrics-test", backend="tikwm", outcome="success") == 1
+    assert metrics.backend_attempt_seconds.count(platform="metrics-test", backend="yt-dlp", outcome="error") == 1
+    assert metrics.download_bytes.count(platform="metrics-test", backend="tikwm") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_server_serves_text_format():
+    registry = MetricsRegistry()
+    registry.counter("bot_updates", "Updates", ("routed",)).inc(routed="true")
+    server = MetricsServer(registry, listen="127.0.0.1", port=0)
+    app = server.make_app()
+    runner = aiohttp.web.AppRunner(app)
+    await runner.setup()
+    site = aiohttp.web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://127.0.0.1:{port}/metrics") as resp:
+                assert resp.status == 200
+                assert resp.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+                assert 'bot_updates_total{routed="true"} 1' in await resp.text()
+    finally:
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_disabled_server_does_not_listen():
+    server = MetricsServer(MetricsRegistry(), port=0)
+    await server.start()
+    assert server._runner is None
+    await server.stop()
@@ -0,0 +1,80 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from telegram.error import BadRequest, TimedOut
+from src.passthrough import PassthroughDomains
+from src.handlers.twitter_handler import TwitterHandler
+from passthrough import passthrough  # the instance src.handlers uses
+from file_id_cache import file_id_cache
+
+MB = 1024 * 1024
+TWEET = "https://x.com/user/status/123"
+MP4 = "https://video.twimg.com/ext_tw_video/1/pu/vid/avc1/720x1280/abc.mp4?tag=12"
+INFO = {"formats": [
+    {"format_id": "hls-832", "url": "https://video.twimg.com/1.m3u8", "protocol": "m3u8_native", "ext": "mp4",
+     "height": 720, "filesize_approx": 4 * MB},
+    {"format_id": "http-2176", "url": MP4, "protocol": "https", "ext": "mp4", "height": 720, "filesize_approx": 5 * MB},
+]}
+
+def test_rejected_domains_are_skipped_until_retry():
+    now = [0.0]
+    domains = PassthroughDomains(enabled=True, retry_after=60, clock=lambda: now[0])
+
+    assert domains.allowed(MP4)
+    domains.reject(MP4)
+    assert not domains.allowed("https://VIDEO.twimg.com/other.mp4")
+    assert domains.allowed("https://cdn.example/video.mp4")
+    now[0] = 61
+    assert domains.allowed(MP4)
+
+def test_a_safe_domain_survives_one_rejection():
+    domains = PassthroughDomains(enabled=True, retry_after=60)
+
+    domains.accept(MP4)
+    domains.reject(MP4)
+    assert domains.allowed(MP4)
+    domains.reject(MP4)
+    assert not domains.allowed(MP4)
+
+@pytest.fixture
+def probed():
+    passthrough.enabled = True
+    with patch("src.handlers.twitter_handler.format_probe") as probe:
+        probe.metadata = AsyncMock(return_value=INFO)
+        probe.selector = AsyncMock(return_value="best")
+        yield probe
+
+@pytest.mark.asyncio
+async def test_telegram_fetches_the_video_by_url(mock_telegram_update, probed):
+    mock_telegram_update.message.chat.send_video.return_value = MagicMock(video=MagicMock(file_id="fetched"))
+
+    with patch("src.handlers.twitter_handler.run_ytdlp", new_callable=AsyncMock) as run:
+        await TwitterHandler().handle(mock_telegram_update, TWEET, "Test User ")
+
+    run.assert_not_called()
+    assert mock_telegram_update.message.chat.send_video.call_args.kwargs["video"] == MP4
+    assert await file_id_cache.get(TWEET) == "fetched"
+
+@pytest.mark.asyncio
+async def test_rejected_url_falls_back_to_downloading(mock_telegram_update, probed):
+    send_video = mock_telegram_update.message.chat.send_video
+    send_video.side_effect = [BadRequest("Wrong file identifier/http url specified"), MagicMock()]
+
+    with patch("src.handlers.twitter_handler.run_ytdlp", new_callable=AsyncMock) as run:
+        run.side_effect = lambda args, stdout=None, **kwargs: stdout.write(b"fake video data")
+        await TwitterHandler().handle(mock_telegram_update, TWEET, "Test User ")
+
+    assert send_video.call_count == 2
+    assert send_video.call_args_list[0].kwargs["video"] == MP4
+    assert send_video.call_args_list[1].kwargs["video"] != MP4
+    assert not passthrough.allowed(MP4)
+
+@pytest.mark.asyncio
+async def test_network_errors_do_not_blame_the_domain(mock_telegram_update, probed):
+    mock_telegram_update.message.chat.send_video.side_effect = [TimedOut(), MagicMock()]
+
+    with patch("src.handlers.twitter_handler.run_ytdlp", new_callable=AsyncMock) as run:
+        run.side_effect = lambda args, stdout=None, **kwargs: stdout.write(b"fake video data")
+        await TwitterHandler().handle(mock_telegram_update, TWEET, "Test User ")
+
+    assert mock_telegram_update.message.chat.send_video.call_count == 2
+    assert passthrough.allowed(MP4)
@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from src.rate_limiter import RateLimiter, TokenBucket, parse_rate_limits
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+
+    async def sleep(delay):
+        clock.now += delay
+
+    monkeypatch.setattr("src.rate_limiter.asyncio.sleep", sleep)
+    return clock
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("instagram.com=0.5/3, tikwm.com=2,bad,x.com=fast") == {
+        "instagram.com": (0.5, 3.0),
+        "tikwm.com": (2.0, 1.0),
+    }
+
+@pytest.mark.asyncio
+async def test_no_delay_with_spare_capacity(clock):
+    bucket = TokenBucket(rate=1, burst=3, clock=clock)
+
+    waits = [await bucket.acquire() for _ in range(3)]
+
+    assert waits == [0, 0, 0]
+    assert clock.now == 0
+
+@pytest.mark.asyncio
+async def test_waits_for_refill_when_empty(clock):
+    bucket = TokenBucket(rate=2, burst=1, clock=clock)
+
+    await bucket.acquire()
+    waited = await bucket.acquire()
+
+    assert waited == pytest.approx(0.5)
+
+@pytest.mark.asyncio
+async def test_throttling_pauses_with_exponential_backoff(clock):
+    bucket = TokenBucket(rate=10, burst=5, backoff=30, max_backoff=100, clock=clock)
+
+    assert bucket.throttled() == 30
+    assert await bucket.acquire() == pytest.approx(30)
+    assert bucket.throttled() == 60
+    assert bucket.throttled() == 100
+    bucket.succeeded()
+    assert bucket.throttled(retry_after=45) == 45
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_in_order():
+    bucket = TokenBucket(rate=50, burst=1)
+    order = []
+
+    async def request(n):
+        await bucket.acquire()
+        order.append(n)
+
+    await asyncio.gather(*(request(n) for n in range(4)))
+
+    assert order == [0, 1, 2, 3]
+
+@pytest.mark.asyncio
+async def test_limiter_matches_subdomains_and_skips_unlisted_hosts(clock):
+    limiter = RateLimiter({"instagram.com": (1, 1)}, clock=clock)
+
+    assert limiter.bucket("https://www.instagram.com/reel/abc/") is limiter.bucket("instagram.com")
+    assert limiter.bucket("https://scontent.cdninstagram.com/v.mp4") is None
+    await limiter.acquire("https://example.com/video.mp4")
+    await limiter.acquire("https://example.com/video.mp4")
+    assert clock.now == 0
+
+@pytest.mark.asyncio
+async def test_report_backs_off_host_on_429_and_403(clock):
+    limiter = RateLimiter({"instagram.com": (100, 10)}, clock=clock)
+
+    limiter.report("https://www.instagram.com/p/abc/", 429, retry_after="120")
+    await limiter.acquire("https://www.instagram.com/p/def/")
+    assert clock.now == pytest.approx(120)
+
+    limiter.report("https://www.instagram.com/p/abc/", 200)
+    limiter.report("https://www.instagram.com/p/abc/", 403)
+    # A success in between resets the backoff to its first step
+    assert limiter.bucket("instagram.com").paused_until == pytest.approx(clock.now + 30)
+    # Unlisted hosts are never paused
+    limiter.report("https://cdn.example.com/v.mp4", 403)
+    assert limiter.bucket("cdn.example.com") is None
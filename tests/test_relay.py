@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from unittest.mock import AsyncMock, MagicMock
+from src.handlers import BaseHandler
+from relay import MediaStream, fetch_media  # the module src.handlers imports
+from media_buffer import MediaBuffer
+from http_client import http_client
+from file_id_cache import file_id_cache
+from media_cache import media_cache
+
+VIDEO = bytes(range(256)) * 4096  # 1 MiB
+
+@pytest.fixture
+async def servers():
+    """A CDN serving VIDEO (/video with a Content-Length, /chunked without) and a Bot API stub."""
+    uploads = []
+    state = {"reject": False}
+
+    async def video(request):
+        resp = web.StreamResponse()
+        if request.path == "/video":
+            resp.content_length = len(VIDEO)
+        await resp.prepare(request)
+        for i in range(0, len(VIDEO), 64 * 1024):
+            await resp.write(VIDEO[i:i + 64 * 1024])
+            await asyncio.sleep(0.005)
+        await resp.write_eof()
+        return resp
+
+    async def send_video(request):
+        post = await request.post()
+        fields = {key: value for key, value in post.items() if not isinstance(value, web.FileField)}
+        uploads.append((post["video"].file.read(), fields, request.content_length))
+        if state["reject"]:
+            return web.json_response({"ok": False, "error_code": 400, "description": "Bad Request: wrong file"})
+        return web.json_response({"ok": True, "result": {
+            "message_id": 7, "date": 0, "chat": {"id": 1, "type": "group"},
+            "video": {"file_id": "relayed", "file_unique_id": "u", "width": 1, "height": 1, "duration": 1},
+        }})
+
+    cdn = web.Application()
+    cdn.router.add_get("/video", video)
+    cdn.router.add_get("/chunked", video)
+    telegram = web.Application(client_max_size=64 * 1024 ** 2)
+    telegram.router.add_post("/bot123:abc/sendVideo", send_video)
+    cdn_server, telegram_server = TestServer(cdn), TestServer(telegram)
+    await cdn_server.start_server()
+    await telegram_server.start_server()
+    yield cdn_server, telegram_server, uploads, state
+    await cdn_server.close()
+    await telegram_server.close()
+    await http_client.close()
+
+class DummyHandler(BaseHandler):
+    def can_handle(self, message):
+        return True
+
+    async def handle(self, update, message, sender_name):
+        pass
+
+def make_update(telegram_server):
+    update = MagicMock()
+    update.message.chat_id = 1
+    update.message.get_bot.return_value.base_url = str(telegram_server.make_url("/bot123:abc"))
+    update.message.delete = AsyncMock()
+    update.message.chat.send_video = AsyncMock()
+    return update
+
+@pytest.mark.asyncio
+async def test_video_is_uploaded_while_it_downloads(servers):
+    cdn, telegram, uploads, _ = servers
+    update = make_update(telegram)
+    url = "https://www.tiktok.com/@u/video/1"
+
+    stream = await fetch_media(str(cdn.make_url("/video")), {}, "CDN")
+    assert isinstance(stream, MediaStream) and len(stream) == len(VIDEO)
+    assert await DummyHandler()._send_media(update, stream, "caption", url, supports_streaming=True)
+
+    body, fields, content_length = uploads[0]
+    assert body == VIDEO
+    assert fields == {"chat_id": "1", "caption": "caption", "parse_mode": "HTML", "supports_streaming": "true"}
+    # The relayed body is sent with its size, not chunked
+    assert content_length is not None
+    assert await file_id_cache.get(url) == "relayed"
+    with await media_cache.get(url) as cached:
+        assert len(cached) == len(VIDEO)
+    update.message.chat.send_video.assert_not_called()
+    update.message.delete.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_unknown_or_oversized_downloads_are_buffered(servers):
+    cdn, _, _, _ = servers
+
+    unknown = await fetch_media(str(cdn.make_url("/chunked")), {}, "CDN")
+    oversized = await fetch_media(str(cdn.make_url("/video")), {}, "CDN", max_size=len(VIDEO) - 1)
+
+    for media in (unknown, oversized):
+        assert isinstance(media, MediaBuffer)
+        assert media.getvalue() == VIDEO
+        media.close()
+
+@pytest.mark.asyncio
+async def test_rejected_relay_falls_back_to_a_buffered_upload(servers):
+    cdn, telegram, uploads, state = servers
+    state["reject"] = True
+    update = make_update(telegram)
+    retried = []
+    update.message.chat.send_video.side_effect = lambda video, **kwargs: retried.append(video.input_file_content.read())
+
+    stream = await fetch_media(str(cdn.make_url("/video")), {}, "CDN")
+    assert await DummyHandler()._send_media(update, stream, "caption", "https://www.tiktok.com/@u/video/2")
+
+    assert len(uploads) == 1
+    assert retried == [VIDEO]
+
+class SlowContent:
+    """An aiohttp-like body that counts how far it has been read."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.read_count = 0
+
+    async def read(self, n):
+        if not self.chunks:
+            return b""
+        self.read_count += 1
+        return self.chunks.pop(0)
+
+@pytest.mark.asyncio
+async def test_download_waits_for_a_slow_upload():
+    response = MagicMock()
+    response.content = SlowContent([b"x" * 10] * 100)
+    stream = MediaStream(response, 1000)
+    queue = asyncio.Queue(4)
+
+    pump = asyncio.ensure_future(stream._pump(queue))
+    await asyncio.sleep(0.01)
+    # Nobody consumes the queue: reading stops once it is full
+    assert response.content.read_count == 5
+    while (await queue.get()) is not None:
+        pass
+    await pump
+
+    assert stream.complete and response.content.read_count == 100
+    stream.close()
@@ -0,0 +1,52 @@
+import pytest
+from unittest.mock import MagicMock
+from src.router import Router
+from src.handlers.facebook_handler import FacebookHandler
+from src.handlers.instagram_handler import InstagramHandler
+from src.handlers.tiktok_handler import TikTokHandler
+from src.handlers.twitter_handler import TwitterHandler
+
+@pytest.fixture(scope="module")
+def handlers():
+    return [FacebookHandler(), InstagramHandler(), TikTokHandler(), TwitterHandler()]
+
+@pytest.fixture(scope="module")
+def router(handlers):
+    return Router(handlers)
+
+def test_rejects_messages_without_links(router):
+    assert router.route("hello there") == []
+    assert router.route("") == []
+
+def test_routes_each_platform(router, handlers):
+    facebook, instagram, tiktok, twitter = handlers
+    assert router.route("https://www.facebook.com/reel/123") == [(facebook, "https://www.facebook.com/reel/123")]
+    assert router.route("look https://www.instagram.com/reel/abc123/?igsh=x") == [(instagram, "https://www.instagram.com/reel/abc123/?igsh=x")]
+    assert router.route("https://VM.tiktok.com/ZSmCyNC4U/") == [(tiktok, "https://VM.tiktok.com/ZSmCyNC4U/")]
+    assert router.route("(https://x.com/user/status/1)") == [(twitter, "https://x.com/user/status/1")]
+
+def test_ignores_unknown_links(router):
+    assert router.route("https://example.com/video") == []
+
+def test_returns_all_pairs_in_one_pass(router, handlers):
+    facebook, _, tiktok, _ = handlers
+    message = "https://vm.tiktok.com/a/ and https://fb.watch/b, https://vm.tiktok.com/a/"
+
+    assert router.route(message) == [
+        (tiktok, "https://vm.tiktok.com/a/"),
+        (facebook, "https://fb.watch/b"),
+    ]
+
+def test_handlers_without_pattern_use_can_handle():
+    legacy = MagicMock(spec=["can_handle", "handle"])
+    legacy.can_handle.return_value = True
+    router = Router([legacy])
+
+    assert router.route("https://youtu.be/abc") == [(legacy, "https://youtu.be/abc")]
+
+def test_accepts_string_patterns():
+    handler = MagicMock()
+    handler.URL_PATTERN = r"https://youtu\.be/\S+"
+    router = Router([handler])
+
+    assert router.route("see https://youtu.be/abc!") == [(handler, "https://youtu.be/abc")]
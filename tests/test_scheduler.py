@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from src.scheduler import JobScheduler, QueueFullError, parse_platform_limits
+
+def recorder(log, name, delay=0.01):
+    async def job():
+        log.append(name)
+        await asyncio.sleep(delay)
+    return job
+
+def test_parse_platform_limits():
+    assert parse_platform_limits("instagram=2, tiktok=4") == {"instagram": 2, "tiktok": 4}
+    assert parse_platform_limits("") == {}
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        JobScheduler(overflow="explode")
+
+@pytest.mark.asyncio
+async def test_global_worker_limit():
+    scheduler = JobScheduler(workers=2, platform_limits={})
+    log = []
+    for i in range(5):
+        scheduler.submit(1, "tiktok", recorder(log, i, delay=0.05))
+
+    assert scheduler.running == 2
+    assert scheduler.queued == 3
+    await scheduler.join()
+    assert sorted(log) == [0, 1, 2, 3, 4]
+
+@pytest.mark.asyncio
+async def test_round_robin_across_chats():
+    scheduler = JobScheduler(workers=1, platform_limits={})
+    log = []
+    # Chat 1 floods the queue before chat 2 posts a single link
+    for i in range(3):
+        scheduler.submit(1, "tiktok", recorder(log, f"a{i}"))
+    scheduler.submit(2, "tiktok", recorder(log, "b0"))
+
+    await scheduler.join()
+    assert log == ["a0", "b0", "a1", "a2"]
+
+@pytest.mark.asyncio
+async def test_platform_limit_lets_other_platforms_through():
+    scheduler = JobScheduler(workers=4, platform_limits={"instagram": 1})
+    log = []
+    scheduler.submit(1, "instagram", recorder(log, "ig0", delay=0.05))
+    scheduler.submit(1, "instagram", recorder(log, "ig1"))
+    scheduler.submit(1, "tiktok", recorder(log, "tt0"))
+
+    assert log == [] and scheduler.running == 2
+    await asyncio.sleep(0)
+    assert log == ["ig0", "tt0"]
+    await scheduler.join()
+    assert log[-1] == "ig1"
+
+@pytest.mark.asyncio
+async def test_reject_when_full():
+    scheduler = JobScheduler(workers=1, platform_limits={}, max_queue=1, overflow="reject")
+    scheduler.submit(1, "tiktok", recorder(log := [], "running", delay=0.05))
+    scheduler.submit(1, "tiktok", recorder(log, "queued"))
+
+    with pytest.raises(QueueFullError):
+        scheduler.submit(2, "tiktok", recorder(log, "rejected"))
+    await scheduler.join()
+    assert log == ["running", "queued"]
+
+@pytest.mark.asyncio
+async def test_drop_oldest_when_full():
+    scheduler = JobScheduler(workers=1, platform_limits={}, max_queue=1, overflow="drop_oldest")
+    log = []
+    scheduler.submit(1, "tiktok", recorder(log, "running", delay=0.05))
+    dropped = scheduler.submit(1, "tiktok", recorder(log, "dropped"))
+    scheduler.submit(2, "tiktok", recorder(log, "newest"))
+
+    await scheduler.join()
+    assert dropped.cancelled()
+    assert log == ["running", "newest"]
+
+@pytest.mark.asyncio
+async def test_failed_job_resolves_false():
+    scheduler = JobScheduler(workers=1, platform_limits={})
+
+    async def boom():
+        raise RuntimeError("upstream down")
+
+    assert await scheduler.submit(1, "tiktok", boom) is False
+
+@pytest.mark.asyncio
+async def test_stop_cancels_running_and_queued():
+    scheduler = JobScheduler(workers=1, platform_limits={})
+    running = scheduler.submit(1, "tiktok", recorder([], "slow", delay=10))
+    queued = scheduler.submit(1, "tiktok", recorder([], "queued"))
+    await asyncio.sleep(0)
+
+    await scheduler.stop()
+    assert running.cancelled()
+    assert queued.cancelled()
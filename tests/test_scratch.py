@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+import subprocess
+import pytest
+from unittest.mock import AsyncMock, patch
+from src.scratch import ScratchSpace
+from src.media_buffer import MediaFile
+from src.handlers.twitter_handler import TwitterHandler
+from scratch import scratch_space  # the module src.* code imports
+
+@pytest.fixture
+def space(tmp_path):
+    return ScratchSpace(root=str(tmp_path / "scratch"), quota=100, reserve=60)
+
+@pytest.mark.asyncio
+async def test_directories_are_removed_and_released_on_close(space):
+    scratch = await space.acquire("tiktok-")
+
+    assert os.path.dirname(scratch.path) == space.root
+    assert os.path.basename(scratch.path).startswith(f"tiktok-{os.getpid()}-")
+    assert space.reserved == 60
+    with open(os.path.join(scratch.path, "video.mp4"), "wb") as f:
+        f.write(b"video")
+    scratch.close()
+    scratch.close()
+
+    assert os.listdir(space.root) == []
+    assert space.reserved == 0
+
+@pytest.mark.asyncio
+async def test_quota_blocks_new_jobs_until_space_frees(space):
+    first = await space.acquire()
+    second = asyncio.ensure_future(space.acquire())
+    third = asyncio.ensure_future(space.acquire(reserve=10))
+    await asyncio.sleep(0.01)
+
+    # The small job would fit, but waits its turn behind the second
+    assert not second.done() and not third.done()
+    first.close()
+    second_dir = await asyncio.wait_for(second, 1)
+    third_dir = await asyncio.wait_for(third, 1)
+
+    assert space.reserved == 70
+    second_dir.close()
+    third_dir.close()
+
+@pytest.mark.asyncio
+async def test_oversized_job_runs_alone(space):
+    big = await space.acquire(reserve=500)
+    waiting = asyncio.ensure_future(space.acquire())
+    await asyncio.sleep(0.01)
+
+    assert not waiting.done()
+    big.close()
+    (await asyncio.wait_for(waiting, 1)).close()
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_block_the_queue(space):
+    first = await space.acquire()
+    cancelled = asyncio.ensure_future(space.acquire())
+    waiting = asyncio.ensure_future(space.acquire())
+    await asyncio.sleep(0.01)
+
+    cancelled.cancel()
+    first.close()
+
+    (await asyncio.wait_for(waiting, 1)).close()
+    assert space.reserved == 0
+
+@pytest.mark.asyncio
+async def test_media_file_releases_its_scratch_directory(space):
+    scratch = await space.acquire()
+    path = os.path.join(scratch.path, "video.mp4")
+    with open(path, "wb") as f:
+        f.write(b"video")
+
+    with MediaFile(path, cleanup_dir=scratch):
+        pass
+
+    assert not os.path.exists(scratch.path)
+    assert space.reserved == 0
+
+def test_sweep_removes_only_orphans(space):
+    dead = subprocess.Popen(["true"])
+    dead.wait()
+    os.makedirs(space.root)
+    names = {
+        "crashed": f"ytdlp-{dead.pid}-abc123",
+        "other_process": f"ytdlp-{os.getppid()}-abc123",
+        "earlier_life": f"tiktok-{os.getpid()}-old123",
+        "current": f"tiktok-{os.getpid()}-new123",
+        "unrelated": "notes",
+    }
+    for name in names.values():
+        os.mkdir(os.path.join(space.root, name))
+    old = time.time() - 3600
+    os.utime(os.path.join(space.root, names["earlier_life"]), (old, old))
+
+    assert space.sweep() == 2
+    assert sorted(os.listdir(space.root)) == sorted([names["other_process"], names["current"], names["unrelated"]])
+
+@pytest.mark.asyncio
+async def test_sweep_keeps_directories_in_use(space):
+    scratch = await space.acquire("tiktok-")
+    # However its timestamp reads, a directory this process still holds isn't an orphan
+    old = time.time() - 3600
+    os.utime(scratch.path, (old, old))
+
+    assert space.sweep() == 0
+    assert os.path.isdir(scratch.path)
+    scratch.close()
+
+@pytest.mark.asyncio
+async def test_failed_download_leaves_no_scratch_directory():
+    handler = TwitterHandler()
+
+    with patch("src.handlers.twitter_handler.run_ytdlp", new_callable=AsyncMock, side_effect=RuntimeError("boom")):
+        assert await handler._download_via_ytdlp_file("https://x.com/u/status/1") is None
+
+    assert os.listdir(scratch_space.root) == []
+    assert scratch_space.reserved == 0
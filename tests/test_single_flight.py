@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.single_flight import SingleFlight
+from src.handlers.tiktok_handler import TikTokHandler
+from src.media_buffer import MediaBuffer
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "video"
+
+    results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert calls == 1
+    assert [r for r, _ in results] == ["video"] * 5
+    assert sum(1 for _, shared in results if not shared) == 1
+    assert not flight.in_flight("key")
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately():
+    flight = SingleFlight()
+    work = AsyncMock(return_value=True)
+
+    await asyncio.gather(flight.do("a", work), flight.do("b", work))
+
+    assert work.call_count == 2
+
+@pytest.mark.asyncio
+async def test_exception_is_shared():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(flight.do("key", work), flight.do("key", work), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_when_leader_cancelled():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast():
+        return "video"
+
+    leader = asyncio.create_task(flight.do("key", slow))
+    await started.wait()
+    follower = asyncio.create_task(flight.do("key", fast))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == ("video", False)
+
+@pytest.mark.asyncio
+async def test_concurrent_handlers_download_once():
+    handler = TikTokHandler()
+    updates = []
+    for _ in range(3):
+        update = MagicMock()
+        update.message.chat.send_video = AsyncMock(return_value=MagicMock(video=MagicMock(file_id="FILE_ID")))
+        update.message.delete = AsyncMock()
+        updates.append(update)
+
+    async def download(url):
+        await asyncio.sleep(0.05)
+        return MediaBuffer.from_bytes(b"fake_video_bytes")
+
+    with patch.object(handler, "_download_via_api", side_effect=download) as mock_api:
+        await asyncio.gather(*(handler.handle(u, "https://vm.tiktok.com/ZSmCyNC4U/", "Test User") for u in updates))
+
+    assert mock_api.call_count == 1
+    sent_videos = [u.message.chat.send_video.call_args[1]["video"] for u in updates]
+    assert sent_videos.count("FILE_ID") == 2
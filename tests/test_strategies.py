@@ -0,0 +1,90 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import MagicMock
+from src.strategies import run_strategies
+
+def strategy(result, delay=0.0, log=None, name=None):
+    async def run():
+        if log is not None:
+            log.append(("start", name))
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(("cancelled", name))
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return run
+
+@pytest.mark.asyncio
+async def test_first_success_wins():
+    result = await run_strategies([("a", strategy("A")), ("b", strategy("B"))], hedge_delay=1)
+    assert result == ("a", "A")
+
+@pytest.mark.asyncio
+async def test_failures_fall_through_immediately():
+    start = time.monotonic()
+    result = await run_strategies([
+        ("a", strategy(None)),
+        ("b", strategy(RuntimeError("boom"))),
+        ("c", strategy("C")),
+    ], hedge_delay=10)
+
+    assert result == ("c", "C")
+    assert time.monotonic() - start < 1
+
+@pytest.mark.asyncio
+async def test_all_fail_returns_none():
+    assert await run_strategies([("a", strategy(None)), ("b", strategy(b""))], hedge_delay=0) is None
+
+@pytest.mark.asyncio
+async def test_hedge_starts_next_and_cancels_loser():
+    log = []
+    start = time.monotonic()
+    result = await run_strategies([
+        ("slow", strategy("SLOW", delay=5, log=log, name="slow")),
+        ("fast", strategy("FAST", delay=0.05, log=log, name="fast")),
+    ], hedge_delay=0.1)
+
+    assert result == ("fast", "FAST")
+    assert time.monotonic() - start < 1
+    assert ("cancelled", "slow") in log
+
+@pytest.mark.asyncio
+async def test_parallel_mode_starts_everything():
+    log = []
+    await run_strategies([
+        ("a", strategy("A", delay=0.1, log=log, name="a")),
+        ("b", strategy("B", delay=0.2, log=log, name="b")),
+    ], hedge_delay=0)
+
+    assert ("start", "b") in log
+
+@pytest.mark.asyncio
+async def test_simultaneous_loser_results_are_closed():
+    loser = MagicMock()
+    loser.__bool__.return_value = True
+    winner = MagicMock()
+    winner.__bool__.return_value = True
+
+    name, result = await run_strategies(
+        [("a", strategy(winner, delay=0.05)), ("b", strategy(loser, delay=0.05))], hedge_delay=0
+    )
+
+    assert result in (winner, loser)
+    other = loser if result is winner else winner
+    other.close.assert_called_once()
+    result.close.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_cancelling_runner_cancels_strategies():
+    log = []
+    task = asyncio.create_task(run_strategies([("a", strategy("A", delay=5, log=log, name="a"))], hedge_delay=1))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert ("cancelled", "a") in log
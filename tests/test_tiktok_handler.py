@@ -2,6 +2,8 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from telegram import Update, Message, Chat
 from src.handlers.tiktok_handler import TikTokHandler
+from src.media_buffer import MediaBuffer
+from file_id_cache import file_id_cache  # the module src.* code imports
 
 @pytest.fixture
 def tiktok_handler():
@@ -31,8 +33,8 @@ async def test_extract_url_from_message(tiktok_handler):
 @pytest.mark.asyncio
 async def test_handle_successful_api_download(tiktok_handler, mock_update):
     """Test successful flow when _download_via_api returns video bytes."""
-    with patch.object(tiktok_handler, "_download_via_api", new_callable=AsyncMock, return_value=b"fake_video_bytes"):
-        with patch.object(tiktok_handler, "_download_via_ytdlp", return_value=None):
+    with patch.object(tiktok_handler, "_download_via_api", new_callable=AsyncMock, return_value=MediaBuffer.from_bytes(b"fake_video_bytes")):
+        with patch.object(tiktok_handler, "_download_via_ytdlp", new_callable=AsyncMock, return_value=None):
             await tiktok_handler.handle(
                 mock_update,
                 "https://vm.tiktok.com/ZSmCyNC4U/",
@@ -46,7 +48,7 @@ async def test_handle_successful_api_download(tiktok_handler, mock_update):
 async def test_handle_successful_ytdlp_fallback(tiktok_handler, mock_update):
     """Test yt-dlp fallback when API download fails."""
     with patch.object(tiktok_handler, "_download_via_api", return_value=None):
-        with patch.object(tiktok_handler, "_download_via_ytdlp", return_value=b"fake_video"):
+        with patch.object(tiktok_handler, "_download_via_ytdlp", new_callable=AsyncMock, return_value=MediaBuffer.from_bytes(b"fake_video")):
             await tiktok_handler.handle(
                 mock_update,
                 "https://vm.tiktok.com/ZSmCyNC4U/",
@@ -66,12 +68,48 @@ async def test_handle_no_url_in_message(tiktok_handler, mock_update):
 async def test_handle_all_methods_fail(tiktok_handler, mock_update):
     """When all download methods fail, no video is sent (silent failure)."""
     with patch.object(tiktok_handler, "_download_via_api", return_value=None):
-        with patch.object(tiktok_handler, "_download_via_ytdlp", return_value=None):
-            with patch("subprocess.run", return_value=MagicMock(returncode=1)):
+        with patch.object(tiktok_handler, "_download_via_ytdlp", new_callable=AsyncMock, return_value=None):
+            with patch("src.handlers.tiktok_handler.run_ytdlp", new_callable=AsyncMock, return_value=MagicMock(returncode=1)):
                 await tiktok_handler.handle(
                     mock_update,
                     "https://vm.tiktok.com/ZSmCyNC4U/",
                     "Test User",
                 )
 
-    mock_update.message.chat.send_video.assert_not_called() 
\ No newline at end of file
+    mock_update.message.chat.send_video.assert_not_called() 
+@pytest.mark.asyncio
+async def test_handle_cached_file_id_skips_download(tiktok_handler, mock_update):
+    """A cached file_id is re-sent without touching any download backend."""
+    await file_id_cache.set("https://vm.tiktok.com/ZSmCyNC4U/", "CACHED_FILE_ID")
+    with patch.object(tiktok_handler, "_download_via_api", new_callable=AsyncMock) as mock_api:
+        await tiktok_handler.handle(mock_update, "https://vm.tiktok.com/ZSmCyNC4U/", "Test User")
+
+    mock_api.assert_not_called()
+    assert mock_update.message.chat.send_video.call_args[1]["video"] == "CACHED_FILE_ID"
+
+@pytest.mark.asyncio
+async def test_handle_stores_file_id_after_upload(tiktok_handler, mock_update):
+    mock_update.message.chat.send_video.return_value = MagicMock(video=MagicMock(file_id="NEW_FILE_ID"))
+    with patch.object(tiktok_handler, "_download_via_api", new_callable=AsyncMock, return_value=MediaBuffer.from_bytes(b"fake_video_bytes")):
+        await tiktok_handler.handle(mock_update, "https://vm.tiktok.com/ZSmCyNC4U/", "Test User")
+
+    assert await file_id_cache.get("https://vm.tiktok.com/ZSmCyNC4U/") == "NEW_FILE_ID"
+
+@pytest.mark.asyncio
+async def test_file_fallback_uses_warm_ytdlp_pool(tiktok_handler):
+    media = MediaBuffer.from_bytes(b"pooled video")
+    with patch('src.handlers.tiktok_handler.ytdlp_pool') as mock_pool, \
+         patch('src.handlers.tiktok_handler.run_ytdlp', new_callable=AsyncMock) as mock_run:
+        mock_pool.enabled = True
+        mock_pool.download = AsyncMock(return_value=media)
+        result = await tiktok_handler._download_via_ytdlp_file("https://www.tiktok.com/@user/video/123")
+
+    assert result is media
+    mock_pool.download.assert_called_once_with("https://www.tiktok.com/@user/video/123", {"format": "best"}, timeout=90)
+    mock_run.assert_not_called()
+
+def test_pick_play_url_prefers_hd_that_fits():
+    data = {"play": "https://cdn/sd.mp4", "hdplay": "https://cdn/hd.mp4", "hd_size": 10 * 1024 * 1024}
+    assert TikTokHandler._pick_play_url(data) == "https://cdn/hd.mp4"
+    assert TikTokHandler._pick_play_url({**data, "hd_size": 500 * 1024 * 1024}) == "https://cdn/sd.mp4"
+    assert TikTokHandler._pick_play_url({"play": "https://cdn/sd.mp4"}) == "https://cdn/sd.mp4"
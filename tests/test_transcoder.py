@@ -0,0 +1,147 @@
+import os
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from telegram import Update, Message, Chat
+from src.downloader import ProcessResult
+from src.media_buffer import MediaBuffer, MediaFile
+from src.transcoder import fit_to_size, ffmpeg_command, height_for, video_bitrate_for, MIN_VIDEO_BITRATE
+from src.handlers.tiktok_handler import TikTokHandler
+from scratch import scratch_space  # the module src.* code imports
+
+def fake_tools(duration="60.0", output_size=1000, ffmpeg_returncode=0):
+    """executor.run stand-in answering ffprobe with `duration` and writing ffmpeg's output file."""
+    commands = []
+
+    async def run(cmd, timeout=None, stdout=None):
+        commands.append(cmd)
+        if cmd[0] == "ffprobe":
+            return ProcessResult(0, duration.encode(), b"")
+        if ffmpeg_returncode == 0:
+            with open(cmd[-1], "wb") as f:
+                f.write(b"\0" * output_size)
+        return ProcessResult(ffmpeg_returncode, b"", b"encoder error")
+
+    return run, commands
+
+def test_video_bitrate_fills_target_size():
+    bitrate = video_bitrate_for(60, 10_000_000)
+
+    # Video plus 64k audio for 60s stays under the target
+    assert (bitrate + 64_000) * 60 / 8 <= 10_000_000
+    assert bitrate > 1_000_000
+
+def test_video_bitrate_none_when_too_long():
+    assert video_bitrate_for(3 * 3600, 1_000_000) is None
+    assert video_bitrate_for(1, 1_000_000) >= MIN_VIDEO_BITRATE
+
+def test_height_follows_bitrate():
+    assert height_for(5_000_000) == 1080
+    assert height_for(1_500_000) == 720
+    assert height_for(700_000) == 480
+    assert height_for(150_000) == 360
+
+def test_ffmpeg_command_is_single_pass_at_target_bitrate():
+    cmd = ffmpeg_command("in.mp4", "out.mp4", 1_500_000, threads=3)
+
+    assert cmd.count("-i") == 1 and "-pass" not in cmd
+    assert cmd[cmd.index("-b:v") + 1] == "1500k"
+    assert cmd[cmd.index("-maxrate") + 1] == "1500k"
+    assert cmd[cmd.index("-preset") + 1] == "veryfast"
+    assert "min(720,ih)" in cmd[cmd.index("-vf") + 1]
+    assert cmd[cmd.index("-threads") + 1] == "3"
+    assert cmd[-1] == "out.mp4"
+
+@pytest.mark.asyncio
+async def test_fit_to_size_transcodes_buffer():
+    run, commands = fake_tools(duration="0.01", output_size=500)
+    with patch("src.transcoder.executor") as executor, MediaBuffer.from_bytes(b"x" * 2000) as media:
+        executor.run = AsyncMock(side_effect=run)
+        output = await fit_to_size(media, target_size=1000)
+
+    assert [cmd[0] for cmd in commands] == ["ffprobe", "ffmpeg"]
+    # The in-memory input was spilled to a file ffmpeg can seek in
+    assert commands[1][commands[1].index("-i") + 1].endswith("input.mp4")
+    assert len(output) == 500
+    work_dir = output.cleanup_dir.path
+    assert os.listdir(work_dir) == ["output.mp4"]
+    output.close()
+    assert not os.path.exists(work_dir)
+
+@pytest.mark.asyncio
+async def test_fit_to_size_rejects_video_too_long_to_fit():
+    run, commands = fake_tools(duration="36000")
+    with patch("src.transcoder.executor") as executor, MediaBuffer.from_bytes(b"x" * 2000) as media:
+        executor.run = AsyncMock(side_effect=run)
+        assert await fit_to_size(media, target_size=1000) is None
+
+    assert [cmd[0] for cmd in commands] == ["ffprobe"]
+
+@pytest.mark.asyncio
+async def test_fit_to_size_returns_none_when_ffmpeg_fails():
+    run, _ = fake_tools(duration="0.01", ffmpeg_returncode=1)
+    with patch("src.transcoder.executor") as executor:
+        executor.run = AsyncMock(side_effect=run)
+        with MediaBuffer.from_bytes(b"x" * 2000) as media:
+            assert await fit_to_size(media, target_size=1000) is None
+
+    assert os.listdir(scratch_space.root) == []
+    assert scratch_space.reserved == 0
+
+@pytest.mark.asyncio
+async def test_downloads_at_quota_transcode_in_their_own_directories(monkeypatch):
+    monkeypatch.setattr(scratch_space, "quota", 120)
+    run, _ = fake_tools(duration="0.01", output_size=500)
+    inputs = []
+    for _ in range(2):
+        scratch = await scratch_space.acquire("ytdlp-", reserve=60)
+        path = os.path.join(scratch.path, "video.mp4")
+        with open(path, "wb") as f:
+            f.write(b"x" * 2000)
+        inputs.append(MediaFile(path, cleanup_dir=scratch))
+
+    with patch("src.transcoder.executor") as executor:
+        executor.run = AsyncMock(side_effect=run)
+        # Both jobs hold their share of a full quota; neither may wait for more
+        outputs = await asyncio.wait_for(asyncio.gather(*(fit_to_size(media, target_size=1000) for media in inputs)), 1)
+
+    for media, output in zip(inputs, outputs):
+        assert os.path.dirname(output.path) == os.path.dirname(media.path)
+        media.close()
+        assert os.listdir(os.path.dirname(output.path)) == ["output.mp4"]
+        output.close()
+    assert os.listdir(scratch_space.root) == []
+    assert scratch_space.reserved == 0
+
+@pytest.mark.asyncio
+async def test_send_media_transcodes_oversized_download():
+    update = MagicMock(spec=Update)
+    update.message = MagicMock(spec=Message)
+    update.message.chat = MagicMock(spec=Chat)
+    update.message.chat.send_video = AsyncMock()
+    handler = TikTokHandler()
+    transcoded = MediaBuffer.from_bytes(b"small")
+
+    with patch("src.handlers.MAX_UPLOAD_SIZE", 10), \
+            patch("src.handlers.fit_to_size", new_callable=AsyncMock, return_value=transcoded) as fit, \
+            patch("src.handlers.delete_message", new_callable=AsyncMock):
+        sent = await handler._send_media(update, MediaBuffer.from_bytes(b"x" * 100), "caption", "https://x")
+
+    assert sent
+    fit.assert_awaited_once()
+    assert fit.call_args[0][1] == 10
+    update.message.chat.send_video.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_send_media_gives_up_when_transcode_fails():
+    update = MagicMock(spec=Update)
+    update.message = MagicMock(spec=Message)
+    update.message.chat = MagicMock(spec=Chat)
+    update.message.chat.send_video = AsyncMock()
+
+    with patch("src.handlers.MAX_UPLOAD_SIZE", 10), \
+            patch("src.handlers.fit_to_size", new_callable=AsyncMock, return_value=None):
+        sent = await TikTokHandler()._send_media(update, MediaBuffer.from_bytes(b"x" * 100), "caption", "https://x")
+
+    assert not sent
+    update.message.chat.send_video.assert_not_called()
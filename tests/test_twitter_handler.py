@@ -5,6 +5,8 @@ from unittest.mock import AsyncMock, MagicMock, patch
 from telegram import Update, Message, Chat
 
 from src.handlers.twitter_handler import TwitterHandler
+from src.ytdlp_pool import YtdlpPool
+from ytdlp_pool import ytdlp_pool  # the module src.handlers imports
 
 @pytest.fixture
 def twitter_handler():
@@ -21,9 +23,9 @@ async def test_handle_twitter_link_success(mock_telegram_update, twitter_handler
     message = "https://twitter.com/user/status/123"
     sender_name = "Test User"
     
-    with patch('subprocess.run') as mock_run:
+    with patch('src.handlers.twitter_handler.run_ytdlp', new_callable=AsyncMock) as mock_run:
         # Mock successful video download
-        mock_run.return_value.stdout = b"fake video data"
+        mock_run.side_effect = lambda args, stdout=None, **kwargs: stdout.write(b"fake video data")
         mock_run.return_value.stderr = b""
         
         await twitter_handler.handle(mock_telegram_update, message, sender_name)
@@ -40,7 +42,7 @@ async def test_handle_twitter_link_failure(mock_telegram_update, twitter_handler
     message = "https://twitter.com/user/status/123"
     sender_name = "Test User"
     
-    with patch('subprocess.run') as mock_run:
+    with patch('src.handlers.twitter_handler.run_ytdlp', new_callable=AsyncMock) as mock_run:
         # Mock failed video download
         mock_run.side_effect = Exception("Download failed")
         
@@ -55,4 +57,23 @@ async def test_handle_twitter_link_failure(mock_telegram_update, twitter_handler
         message_text = args[0]  # The message text is the first positional argument
         assert "Test User" in message_text
         assert "Failed to automatically download the video" in message_text
-        assert kwargs['parse_mode'] == "HTML" 
\ No newline at end of file
+        assert kwargs['parse_mode'] == "HTML" 
+@pytest.mark.skipif(YtdlpPool(workers=1).enabled is False, reason="yt-dlp not installed")
+@pytest.mark.asyncio
+async def test_handle_downloads_through_the_ytdlp_pool(mock_telegram_update, twitter_handler, video_server, monkeypatch):
+    monkeypatch.setattr(ytdlp_pool, "workers", 1)
+    uploaded = []
+    mock_telegram_update.message.chat.send_video.side_effect = (
+        lambda video, **kwargs: uploaded.append(video.input_file_content.read())
+    )
+
+    try:
+        with patch('src.handlers.twitter_handler.run_ytdlp', new_callable=AsyncMock) as mock_run:
+            # The CLI strategy fails; the file strategy goes through the pool, not the CLI
+            mock_run.side_effect = Exception("Download failed")
+            await twitter_handler.handle(mock_telegram_update, video_server, "Test User")
+
+        assert mock_run.await_count == 1
+        assert uploaded == [b"pooled video data" * 1024]
+    finally:
+        await ytdlp_pool.close()
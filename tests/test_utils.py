@@ -97,4 +97,16 @@ def test_load_handlers():
     # Check that all items in the list are handler instances
     for handler in handlers:
         assert hasattr(handler, 'can_handle')
-        assert hasattr(handler, 'handle') 
\ No newline at end of file
+        assert hasattr(handler, 'handle') 
+def test_load_handlers_lazy_defers_construction():
+    handlers = load_handlers(lazy=True)
+
+    assert handlers
+    for handler in handlers:
+        assert handler._instance is None
+        assert handler.platform == type(handler.instance).__name__.removesuffix("Handler").lower()
+        assert handler.URL_PATTERN is getattr(handler.cls, "URL_PATTERN", None)
+
+    # Attribute access is delegated to the instance built on first use
+    tiktok = next(h for h in handlers if h.platform == "tiktok")
+    assert tiktok.can_handle("https://vm.tiktok.com/abc/")
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from telegram import Bot, Update
+from src.webhook import WebhookServer, SECRET_TOKEN_HEADER
+
+FAKE_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 10,
+        "date": 1700000000,
+        "chat": {"id": 123, "type": "group", "title": "garage"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+        "text": "https://vm.tiktok.com/ZSmCyNC4U/",
+    },
+}
+
+@pytest.fixture
+def queue():
+    return asyncio.Queue()
+
+@pytest.fixture
+async def fake_telegram(queue):
+    """Acts as Telegram: posts updates to the webhook server."""
+    server = WebhookServer(Bot("123:ABC"), queue, path="secret-path", secret_token="s3cret")
+    client = TestClient(TestServer(server.make_app()))
+    await client.start_server()
+    yield client
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_update_is_queued(fake_telegram, queue):
+    resp = await fake_telegram.post("/secret-path", json=FAKE_UPDATE, headers={SECRET_TOKEN_HEADER: "s3cret"})
+
+    assert resp.status == 200
+    update = queue.get_nowait()
+    assert isinstance(update, Update)
+    assert update.message.text == "https://vm.tiktok.com/ZSmCyNC4U/"
+    assert update.message.chat_id == 123
+
+@pytest.mark.asyncio
+async def test_wrong_secret_is_rejected(fake_telegram, queue):
+    resp = await fake_telegram.post("/secret-path", json=FAKE_UPDATE, headers={SECRET_TOKEN_HEADER: "nope"})
+
+    assert resp.status == 403
+    assert queue.empty()
+
+@pytest.mark.asyncio
+async def test_unknown_path_is_not_found(fake_telegram, queue):
+    resp = await fake_telegram.post("/telegram", json=FAKE_UPDATE, headers={SECRET_TOKEN_HEADER: "s3cret"})
+
+    assert resp.status == 404
+    assert queue.empty()
+
+@pytest.mark.asyncio
+async def test_invalid_payload(fake_telegram, queue):
+    resp = await fake_telegram.post("/secret-path", data=b"not json", headers={SECRET_TOKEN_HEADER: "s3cret"})
+
+    assert resp.status == 400
+    assert queue.empty()
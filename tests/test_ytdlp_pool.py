@@ -0,0 +1,116 @@
+import os
+import asyncio
+import pytest
+from aiohttp import web
+from src.ytdlp_pool import YtdlpPool
+
+pytestmark = pytest.mark.skipif(YtdlpPool(workers=1).enabled is False, reason="yt-dlp not installed")
+
+FILE_URLS = {"enable_file_urls": True}
+
+
+@pytest.fixture
+async def pool():
+    pool = YtdlpPool(workers=1, max_jobs_per_worker=10)
+    await pool.warm_up()
+    yield pool
+    await pool.close()
+
+
+@pytest.fixture
+async def slow_server():
+    """Serves a video that trickles out over ~20 seconds."""
+    async def video(request):
+        resp = web.StreamResponse(headers={"Content-Type": "video/mp4"})
+        resp.content_length = 200 * 1024
+        await resp.prepare(request)
+        for _ in range(200):
+            await resp.write(b"\0" * 1024)
+            await asyncio.sleep(0.1)
+        return resp
+
+    app = web.Application()
+    app.router.add_get("/slow.mp4", video)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    yield f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/slow.mp4"
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_download_returns_file_and_cleans_up(pool, tmp_path):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"x" * 5000)
+
+    media = await pool.download(f"file://{source}", FILE_URLS, timeout=30)
+
+    assert media is not None and media.size == 5000
+    scratch = media.cleanup_dir.path
+    assert os.path.dirname(media.path) == scratch
+    media.close()
+    assert not os.path.exists(scratch)
+
+
+@pytest.mark.asyncio
+async def test_failed_download_returns_none(pool, tmp_path):
+    assert await pool.download(f"file://{tmp_path}/missing.mp4", FILE_URLS, timeout=30) is None
+
+
+@pytest.mark.asyncio
+async def test_timeout_is_enforced_in_the_worker(pool, slow_server):
+    with pytest.raises(asyncio.TimeoutError):
+        await pool.download(slow_server, timeout=1)
+    # The worker stopped on its own, so the pool survives
+    assert pool._pool is not None
+
+
+@pytest.mark.asyncio
+async def test_cancellation_stops_the_worker(pool, slow_server, tmp_path):
+    task = asyncio.create_task(pool.download(slow_server, timeout=60))
+    await asyncio.sleep(2)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    await asyncio.wait_for(asyncio.gather(*pool._reapers), 10)
+    assert pool._pool is not None
+    # The freed slot is usable straight away
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"x" * 10)
+    media = await asyncio.wait_for(pool.download(f"file://{source}", FILE_URLS, timeout=30), 10)
+    assert media is not None
+    media.close()
+
+
+@pytest.mark.asyncio
+async def test_workers_are_recycled(tmp_path):
+    pool = YtdlpPool(workers=1, max_jobs_per_worker=1)
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"x" * 10)
+    try:
+        for _ in range(2):
+            media = await pool.download(f"file://{source}", FILE_URLS, timeout=30)
+            assert media is not None
+            media.close()
+    finally:
+        await pool.close()
+
+
+def test_disabled_without_workers():
+    assert not YtdlpPool(workers=0).enabled
+
+
+@pytest.mark.asyncio
+async def test_extract_info_returns_slim_metadata(pool, tmp_path):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"x" * 5000)
+
+    info = await pool.extract_info(f"file://{source}", FILE_URLS, timeout=30)
+
+    assert info["id"] == "clip"
+    assert [f["format_id"] for f in info["formats"]] == ["mp4"]
+    assert set(info["formats"][0]) == {"format_id", "ext", "vcodec", "acodec", "height", "tbr", "filesize", "filesize_approx",
+                                          "url", "protocol"}
+    assert not list(tmp_path.glob("*.part"))